@@ -1,7 +1,20 @@
-from attackcti import attack_client
-import json, sys, argparse, traceback
+import json, sys, os, argparse, traceback, time, re, copy
+from contextlib import nullcontext
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
 from lib.jirahandler import JiraHandler
+from lib.attackdata import AttackKnowledgeBase
+from lib.sync import compute_sync_changes
+from lib.snapshot import MaturitySnapshot
+from lib.journal import StateJournal
+from lib.batch import load_inventory, run_batch, print_batch_summary
+from lib.layerserver import LayerServer
+from lib.metrics import RunMetrics
+from lib.analytics import analyze, write_reports, print_report
+from lib.rules import read_rules, count_rules, diff_maturity
+from lib.history import MaturityHistory, compute_trend, compute_delta, write_trend, print_trend, format_time, parse_date, PERIODS
+from lib.plan import load_state, save_state, load_plan, save_plan, plan_issue_operations, plan_missing_options, technique_from_operation, map_custom_fields, count_operations, PLAN_FORMAT
 from argparse import RawTextHelpFormatter
 import logging
 
@@ -18,32 +31,76 @@ logging.basicConfig(
 class Attack2Jira:
 
     jirahandler = None
+    knowledge_base = None
 
-    def __init__(self, url, username, password):
+    SNAPSHOT_OVERLAP_MINUTES = 5
 
-        jirahandler = JiraHandler(url, username, password)
-        self.jirahandler = jirahandler
+    # Each tracked ATT&CK domain gets its own project; Enterprise keeps the given
+    # key and name, the other domains append these.
+    DOMAIN_KEY_SUFFIXES = {'enterprise': "", 'mobile': "MOB", 'ics': "ICS"}
+    DOMAIN_PROJECT_SUFFIXES = {'enterprise': "", 'mobile': " (Mobile)", 'ics': " (ICS)"}
+    # Navigator layer format of the exported layers; its domain ids are the STIX
+    # ones: enterprise-attack, mobile-attack, ics-attack
+    LAYER_VERSION = "4.5"
+    NAVIGATOR_VERSION = "4.9.1"
+
+    def __init__(self, url, username, password, field_cache=None, concurrency=1, knowledge_base=None, journal=None, knowledge_bases=None, metrics=None, history=None):
+
+        # optional RunMetrics timing the phases and every Jira request of the run
+        self.metrics = metrics
+        # without a url nothing talks to Jira, e.g. the offline 'webhook' action
+        if url:
+            with self.phase('login'):
+                self.jirahandler = JiraHandler(url, username, password, field_cache, pool_size=max(10, concurrency), metrics=metrics)
+        # ATT&CK is loaded lazily and only once, whatever number of consumers.
+        # knowledge_bases maps 'enterprise'/'mobile'/'ics' to the domains tracked
+        # in this run; without it only Enterprise (or knowledge_base) is tracked.
+        if knowledge_bases:
+            self.knowledge_bases = knowledge_bases
+            self.knowledge_base = knowledge_base or list(knowledge_bases.values())[0]
+        else:
+            self.knowledge_base = knowledge_base or AttackKnowledgeBase()
+            self.knowledge_bases = {'enterprise': self.knowledge_base}
+        # optional StateJournal making reruns resumable without API calls
+        self.journal = journal
+        # optional MaturityHistory every export appends a snapshot to
+        self.history = history
+
+    def phase(self, name):
+        return self.metrics.phase(name) if self.metrics else nullcontext()
+
+    def for_domain(self, domain):
+
+        # same Jira session and journal, techniques of another domain
+        attack2jira = copy.copy(self)
+        attack2jira.knowledge_base = self.knowledge_bases[domain]
+        return attack2jira
+
+    def get_domain_keys(self, key):
+        return {domain: key + self.DOMAIN_KEY_SUFFIXES[domain] for domain in self.knowledge_bases}
+
+    def get_domain_projects(self, project):
+        return {domain: project + self.DOMAIN_PROJECT_SUFFIXES[domain] for domain in self.knowledge_bases}
+
+    def get_project_index(self, key, detailed=False):
+        # With a journal that knows every issue of the project as of less than
+        # -full-every hours ago the scan is skipped; otherwise (and always for the
+        # detailed index of 'sync') the project is scanned and the journal reseeded.
+        if self.journal and not detailed and self.journal.is_index_synced(key):
+            print("[*] Using the journaled index of the " + key + " project...")
+            return self.journal.get_index(key)
+        index = self.jirahandler.get_project_index(key, detailed)
+        if self.journal:
+            self.journal.replace_index(key, index)
+            return self.journal.wrap_index(key, index)
+        return index
 
     def get_attack_techniques(self):
-    # Deprecated, keeping just in case
 
-        try:
-            print ("[*] Obtaining ATT&CK's techniques...")
-            client = attack_client()
-            all_enterprise = client.get_enterprise()
-            techniques = []
-            for technique in all_enterprise['techniques']:
-                tech= json.loads(technique.serialize())
-                # avoid bringing in the revoked techniques
-                if not 'revoked' in tech.keys():
-                    techniques.append(tech)
-            print ("[!] Done!")
-            return techniques
-
-        except:
-            traceback.print_exc(file=sys.stdout)
-            print ("[!] Error connecting to Att&ck's API !")
-            return
+        print ("[*] Obtaining ATT&CK's techniques...")
+        techniques = self.knowledge_base.get_techniques()
+        print ("[!] Done!")
+        return techniques
 
 
     def create_attack_techniques(self, key):
@@ -57,18 +114,14 @@ class Attack2Jira:
 
                 custom_fields=self.jirahandler.get_custom_fields()
 
-                name = technique['name']
-                id = technique['external_references'][0]['external_id']
-                url = technique['external_references'][0]['url']
-                tactic = technique['kill_chain_phases'][0]['phase_name']
-                description = technique['description']
-
-                # some techniques dont have the field populated
-                if 'x_mitre_data_sources' in technique.keys(): datasources = technique['x_mitre_data_sources']
-                else: datasources = []
+                name = technique.name
+                id = technique.ttp_id
+                url = technique.url
+                tactic = technique.tactic
+                description = technique.description
 
                 ds_payload=[]
-                for ds in datasources: ds_payload.append({'value':ds.title()})
+                for ds in technique.datasources: ds_payload.append({'value':ds})
 
                 issue_dict = {
                     "fields": {
@@ -98,73 +151,69 @@ class Attack2Jira:
 
         print ("[*] Done!")
 
-    def create_attack_techniques_and_subtechniques(self, key):
+    def build_issue_dict(self, technique, key, custom_fields, parent_issue=None):
+
+        issue_dict = {
+            "fields": {
+                "project": {"key": key},
+                "summary": technique.name,
+                "description": technique.description,
+                "issuetype": {"name": "Task"},
+                custom_fields['Id']: technique.ttp_id,
+                custom_fields['Tactic']: {'value': technique.tactic},
+                custom_fields['Maturity']: {'value': 'Not Tracked'},
+                custom_fields['Url']: technique.url,
+                custom_fields['Datasources']: [{'value': ds} for ds in technique.datasources],
+            }
+        }
+        # Sub-techniques are created as sub-tasks of their parent technique.
+        if parent_issue:
+            issue_dict['fields']['parent'] = {"id": parent_issue['id']}
+            issue_dict['fields']['issuetype'] = {"name": "Sub-task"}
+            issue_dict['fields'][custom_fields['Sub-Technique of']] = self.jirahandler.url + "/browse/" + parent_issue['key']
+        return issue_dict
+
+    def create_attack_techniques_and_subtechniques(self, key, index=None):
         jiraclient = self.jirahandler
         techniques = self.get_attack_techniques()
-        sorted_techniques = sorted(techniques, key=lambda k: k['external_references'][0]['external_id'])
+        sorted_techniques = sorted(techniques, key=lambda t: t.ttp_id)
+        if index is None:
+            index = self.get_project_index(key)
+        created = {}
+        failed = {}
         print("[*] Creating Jira issues for ATT&CK's techniques...")
         for technique in sorted_techniques:
             try:
                 custom_fields = self.jirahandler.get_custom_fields()
-                name = technique['name']
-                ttp_id = technique['external_references'][0]['external_id']
-                url = technique['external_references'][0]['url']
-                tactic = technique['kill_chain_phases'][0]['phase_name']
-                description = technique['description']
-                datasources = technique.get('x_mitre_data_sources', [])
-                ds_payload = [{'value': ds.title()} for ds in datasources]
-
-                if self.jirahandler.issue_exists(ttp_id, key):
+                ttp_id = technique.ttp_id
+
+                if ttp_id in index:
                     logging.info(f"Skipping technique {ttp_id} as it already exists.")
                     continue
                 else:
                     # Branch between techniques and sub-techniques
-                    if not technique['x_mitre_is_subtechnique']:
-                        issue_dict = {
-                            "fields": {
-                                "project": {"key": key},
-                                "summary": name,
-                                "description": description,
-                                "issuetype": {"name": "Task"},
-                                custom_fields['Id']: ttp_id,
-                                custom_fields['Tactic']: {'value': tactic},
-                                custom_fields['Maturity']: {'value': 'Not Tracked'},
-                                custom_fields['Url']: url,
-                                custom_fields['Datasources']: ds_payload,
-                            }
-                        }
+                    if not technique.is_subtechnique:
+                        issue_dict = self.build_issue_dict(technique, key, custom_fields)
                         parent_id = jiraclient.create_issue(issue_dict, ttp_id)
-                        # Optionally store parent_id mapping if needed for sub-techniques
+                        if parent_id:
+                            created[ttp_id] = parent_id
+                            index[ttp_id] = {'key': parent_id['key'], 'id': parent_id['id'], 'maturity': 'Not Tracked'}
                     else:
                         # For sub-techniques, you may also want to check existence or
                         # associate with an already existing parent
-                        parent_ttp_id = ttp_id.split('.')[0]
+                        parent_ttp_id = technique.parent_id
                         logging.info(f"Derived parent TTP id: {parent_ttp_id} for sub-technique {ttp_id}")
-                        parent_issue = self.jirahandler.get_issue_by_ttp(parent_ttp_id, key)
+                        parent_issue = index.get(parent_ttp_id)
                         if not parent_issue:
                             logging.error(f"Parent issue for TTP {parent_ttp_id} not found. Skipping sub-technique {ttp_id}.")
                             continue
                         parent_issue_key = parent_issue['key']
                         logging.info(f"Found parent issue: {parent_issue_key} for sub-technique {ttp_id}")
-                        issue_dict = {
-                            "fields": {
-                                #"parent": {"id": parent_id['id']},
-                                "parent": {"id": parent_issue['id']},
-                                "project": {"key": key},
-                                "summary": name,
-                                "description": description,
-                                "issuetype": {"name": "Sub-task"},
-                                custom_fields['Id']: ttp_id,
-                                custom_fields['Tactic']: {'value': tactic},
-                                custom_fields['Maturity']: {'value': 'Not Tracked'},
-                                custom_fields['Url']: url,
-                                custom_fields['Datasources']: ds_payload,
-                                #custom_fields['Sub-Technique of']: jiraclient.url + "/browse/" + parent_id['key'],
-                                custom_fields['Sub-Technique of']: jiraclient.url + "/browse/" + parent_issue_key,
-                            }
-                        }
+                        issue_dict = self.build_issue_dict(technique, key, custom_fields, parent_issue)
                         ret_id = jiraclient.create_issue(issue_dict, ttp_id)
                         if ret_id:
+                            created[ttp_id] = ret_id
+                            index[ttp_id] = {'key': ret_id['key'], 'id': ret_id['id'], 'maturity': 'Not Tracked'}
                             logging.info(f"Successfully created Jira issue for sub-technique {ttp_id}")
                         else:
                             logging.error(f"Failed to create Jira issue for sub-technique {ttp_id}")
@@ -172,27 +221,302 @@ class Attack2Jira:
                 logging.error(f"Error creating Jira issue for {ttp_id}: {str(ex)}", exc_info=True)
                 print(ex)
                 traceback.print_exc(file=sys.stdout)
-                pass
+                failed[ttp_id] = str(ex)
+        print("[*] Done!")
+        return created, failed
+
+    def create_attack_techniques_and_subtechniques_bulk(self, key, index=None, techniques=None, workers=1):
+        # Same result as create_attack_techniques_and_subtechniques() but issues are sent
+        # through Jira's bulk endpoint in two waves: parent techniques first, then the
+        # sub-techniques wired to the ids returned for their parents. techniques
+        # defaults to the loaded ATT&CK release; workers bulk requests run at a time.
+        jiraclient = self.jirahandler
+        if techniques is None:
+            techniques = self.get_attack_techniques()
+        sorted_techniques = sorted(techniques, key=lambda t: t.ttp_id)
+        custom_fields = jiraclient.get_custom_fields()
+        if index is None:
+            index = self.get_project_index(key)
+        failed = {}
+
+        parents = []
+        subtechniques = []
+        for technique in sorted_techniques:
+            ttp_id = technique.ttp_id
+            if ttp_id in index:
+                logging.info(f"Skipping technique {ttp_id} as it already exists.")
+                continue
+            if technique.is_subtechnique:
+                subtechniques.append(technique)
+            else:
+                parents.append(technique)
+
+        print("[*] Creating Jira issues for ATT&CK's techniques in bulk...")
+        parent_ids = [t.ttp_id for t in parents]
+        issue_dicts = [self.build_issue_dict(t, key, custom_fields) for t in parents]
+        created, errors = jiraclient.create_issues_bulk(issue_dicts, parent_ids, workers)
+        failed.update(errors)
+        for ttp_id, issue in created.items():
+            index[ttp_id] = {'key': issue['key'], 'id': issue['id'], 'maturity': 'Not Tracked'}
+
+        print("[*] Creating Jira issues for ATT&CK's sub-techniques in bulk...")
+        sub_ids = []
+        issue_dicts = []
+        for technique in subtechniques:
+            ttp_id = technique.ttp_id
+            parent_ttp_id = technique.parent_id
+            parent_issue = index.get(parent_ttp_id)
+            if not parent_issue:
+                logging.error(f"Parent issue for TTP {parent_ttp_id} not found. Skipping sub-technique {ttp_id}.")
+                failed[ttp_id] = f"parent {parent_ttp_id} not found"
+                continue
+            sub_ids.append(ttp_id)
+            issue_dicts.append(self.build_issue_dict(technique, key, custom_fields, parent_issue))
+        sub_created, errors = jiraclient.create_issues_bulk(issue_dicts, sub_ids, workers)
+        created.update(sub_created)
+        failed.update(errors)
+        for ttp_id, issue in sub_created.items():
+            index[ttp_id] = {'key': issue['key'], 'id': issue['id'], 'maturity': 'Not Tracked'}
+
+        print("[!] Created " + str(len(created)) + " issues, " + str(len(failed)) + " failed.")
+        for ttp_id in sorted(failed):
+            print("\t[!] " + ttp_id + ": " + failed[ttp_id])
+        print("[*] Done!")
+        return created, failed
+
+    def create_attack_techniques_and_subtechniques_concurrent(self, key, concurrency, index=None):
+        return asyncio.run(self.create_issues_concurrently(key, concurrency, index))
+
+    async def create_issues_concurrently(self, key, concurrency, index=None):
+        # Creates issues concurrently with at most `concurrency` requests in flight.
+        # Each sub-technique awaits its parent's creation to get the parent issue id.
+        # Failures are collected and reported at the end instead of stopping the run.
+        jiraclient = self.jirahandler
+        techniques = self.get_attack_techniques()
+        sorted_techniques = sorted(techniques, key=lambda t: t.ttp_id)
+        custom_fields = jiraclient.get_custom_fields()
+        if index is None:
+            index = self.get_project_index(key)
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        created = {}
+        failed = {}
+        parent_tasks = {}
+
+        async def create(technique, parent_issue=None):
+            ttp_id = technique.ttp_id
+            issue_dict = self.build_issue_dict(technique, key, custom_fields, parent_issue)
+            async with semaphore:
+                issue, error = await loop.run_in_executor(executor, jiraclient.try_create_issue, issue_dict, ttp_id)
+            if issue:
+                created[ttp_id] = issue
+                index[ttp_id] = {'key': issue['key'], 'id': issue['id'], 'maturity': 'Not Tracked'}
+                if len(created) % 50 == 0:
+                    print("[*] Created " + str(len(created)) + " issues so far...")
+            else:
+                failed[ttp_id] = error
+            return issue
+
+        async def create_subtechnique(technique):
+            ttp_id = technique.ttp_id
+            parent_ttp_id = technique.parent_id
+            parent_issue = index.get(parent_ttp_id)
+            if not parent_issue and parent_ttp_id in parent_tasks:
+                parent_issue = await parent_tasks[parent_ttp_id]
+            if not parent_issue:
+                logging.error(f"Parent issue for TTP {parent_ttp_id} not found. Skipping sub-technique {ttp_id}.")
+                failed[ttp_id] = f"parent {parent_ttp_id} not found"
+                return None
+            return await create(technique, parent_issue)
+
+        print("[*] Creating Jira issues for ATT&CK's techniques with concurrency " + str(concurrency) + "...")
+        start = time.time()
+        tasks = []
+        for technique in sorted_techniques:
+            ttp_id = technique.ttp_id
+            if ttp_id in index:
+                logging.info(f"Skipping technique {ttp_id} as it already exists.")
+                continue
+            if technique.is_subtechnique:
+                tasks.append(create_subtechnique(technique))
+            else:
+                task = asyncio.ensure_future(create(technique))
+                parent_tasks[ttp_id] = task
+                tasks.append(task)
+        await asyncio.gather(*tasks)
+        executor.shutdown()
+
+        print("[!] Created " + str(len(created)) + " issues, " + str(len(failed)) + " failed in " + str(round(time.time() - start, 1)) + "s.")
+        for ttp_id in sorted(failed):
+            print("\t[!] " + ttp_id + ": " + failed[ttp_id])
         print("[*] Done!")
+        return created, failed
+
+    def create_attack_issues(self, key, bulk=False, concurrency=1, index=None):
+        # index lets a caller that already scanned the project skip the scan
+        # ATT&CK is loaded up front so its time is not counted as issue creation
+        with self.phase('attack_load'):
+            self.knowledge_base.load()
+        with self.phase('creation'):
+            if bulk:
+                return self.create_attack_techniques_and_subtechniques_bulk(key, index, workers=concurrency)
+            elif concurrency > 1:
+                return self.create_attack_techniques_and_subtechniques_concurrent(key, concurrency, index)
+            else:
+                return self.create_attack_techniques_and_subtechniques(key, index)
+
+    def sync_custom_field_options(self, disable_stale=False, key="ATTACK"):
+
+        # New tactics and data sources of an ATT&CK upgrade must exist as options
+        # before issues can use them; only the missing ones are added.
+        if disable_stale:
+            # the options are global: those of a domain that has a project but is
+            # not loaded in this run would all look stale
+            untracked = [key + suffix for domain, suffix in self.DOMAIN_KEY_SUFFIXES.items()
+                         if domain not in self.knowledge_bases and self.jirahandler.get_project_id(key + suffix)]
+            if untracked:
+                print("[!] -disable-stale-options would disable the options used by the " + ", ".join(untracked) + " project(s): add their domains to -domains")
+                sys.exit(1)
+        with self.phase('attack_load'):
+            for knowledge_base in self.knowledge_bases.values():
+                knowledge_base.load()
+        with self.phase('options'):
+            print("[*] Synchronizing custom field options with ATT&CK...")
+            self.jirahandler.add_custom_field_options(list(self.knowledge_bases.values()), disable_stale)
+
+    def sync_attack_techniques(self, key, bulk=False, concurrency=1, retire_transition=None):
+        # Brings an existing project up to date with the loaded ATT&CK release: only
+        # the fields MITRE changed are PUT, revoked/deprecated techniques get a label
+        # (and optionally a workflow transition) and new techniques are created.
+        # Maturity values set by analysts are never touched.
+        with self.phase('attack_load'):
+            self.knowledge_base.load()
+        with self.phase('sync'):
+            jiraclient = self.jirahandler
+            techniques = self.get_attack_techniques()
+            retired = self.knowledge_base.get_retired()
+            custom_fields = jiraclient.get_custom_fields()
+            index = self.get_project_index(key, detailed=True)
+
+            print("[*] Comparing ATT&CK " + str(self.knowledge_base.version) + " with the " + key + " project...")
+            changes = compute_sync_changes(techniques, retired, index, custom_fields)
+            for change in changes:
+                if change['retired'] and retire_transition:
+                    change['transition'] = retire_transition
+            failed = self.update_issues(changes, concurrency)
+
+            # drop the detailed fields, the creation paths only need key/id/maturity
+            for entry in index.values():
+                entry.pop('fields', None)
+
+        created, create_failed = self.create_attack_issues(key, bulk, concurrency, index)
+        failed.update(create_failed)
+
+        counts = {}
+        for change in changes:
+            for name in change['changed']:
+                counts[name] = counts.get(name, 0) + 1
+        print("[*] Sync summary for " + key + ":")
+        print("\t[*] " + str(len(changes) - len([c for c in changes if c['retired']])) + " issues updated, " + str(len([c for c in changes if c['retired']])) + " retired, " + str(len(created)) + " created, " + str(len(failed)) + " failed")
+        for name in sorted(counts):
+            print("\t[*] " + name + ": " + str(counts[name]))
+        return changes, created, failed
+
+    def update_issues(self, changes, concurrency=1):
+
+        # PUTs each change ({'ttp_id', 'key', 'changed', 'payload', optional
+        # 'transition'}) with `concurrency` requests in flight; returns the failures
+        jiraclient = self.jirahandler
+        failed = {}
+
+        def apply_change(change):
+            ok, error = jiraclient.update_issue(change['key'], change['payload'])
+            if ok and change.get('transition'):
+                ok, error = jiraclient.transition_issue(change['key'], change['transition'])
+            return change, ok, error
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for change, ok, error in executor.map(apply_change, changes):
+                if ok:
+                    print("\t[!] Updated " + change['key'] + " (" + change['ttp_id'] + "): " + ", ".join(change['changed']))
+                else:
+                    print("\t[!] Error updating " + change['key'] + " (" + change['ttp_id'] + "): " + error)
+                    failed[change['ttp_id']] = error
+        return failed
+
+    def get_maturity(self, key, snapshot_path=None, full_every=24):
+        return self.get_maturity_by_project([key], snapshot_path, full_every)[key]
+
+    def get_maturity_by_project(self, keys, snapshot_path=None, full_every=24):
+        # Without a snapshot the projects are read in full, with a single search for
+        # all of them. With one (the journal when there is one), only the issues
+        # updated since the previous run are fetched and merged; a full reconcile
+        # runs every `full_every` hours to drop deleted issues.
+        snapshots = self.open_snapshots(keys, snapshot_path, full_every)
+        if not snapshots:
+            return self.jirahandler.get_technique_maturity_by_project(keys)
+        return self.refresh_snapshots(snapshots)
+
+    def open_snapshots(self, keys, snapshot_path=None, full_every=24, in_memory=False):
 
+        # project key -> snapshot; empty when nothing is snapshotted
+        snapshots = {}
+        for key in keys:
+            if self.journal:
+                snapshots[key] = self.journal.get_snapshot(key, full_every * 3600)
+            elif snapshot_path:
+                # one snapshot file per project: attack2jira_snapshot-ATTACKMOB.json
+                path = snapshot_path
+                if len(keys) > 1:
+                    root, ext = os.path.splitext(snapshot_path)
+                    path = root + "-" + key + ext
+                snapshots[key] = MaturitySnapshot(path, key, full_every * 3600)
+            elif in_memory:
+                snapshots[key] = MaturitySnapshot(None, key, full_every * 3600)
+        return snapshots
 
-    def generate_json_layer(self, hideDisabled):
-        VERSION = "2.2"
+    def refresh_snapshots(self, snapshots):
+
+        keys = list(snapshots.keys())
+        started = time.time()
+        if any(snapshot.needs_full_sync(started) for snapshot in snapshots.values()):
+            res_dict = self.jirahandler.get_technique_maturity_by_project(keys)
+            for key, snapshot in snapshots.items():
+                snapshot.replace(res_dict[key], started)
+                print("[!] Full sync: " + str(len(snapshot.items)) + " techniques in the " + key + " snapshot.")
+        else:
+            # a few minutes of overlap cover clock skew; merging is idempotent
+            last_sync = min(snapshot.last_sync for snapshot in snapshots.values())
+            minutes = int((started - last_sync) / 60) + self.SNAPSHOT_OVERLAP_MINUTES
+            res_dict = self.jirahandler.get_technique_maturity_by_project(keys, minutes)
+            for key, snapshot in snapshots.items():
+                changed = snapshot.merge(res_dict[key], started)
+                print("[!] Incremental sync: " + str(changed) + " techniques changed in " + key + ".")
+        for snapshot in snapshots.values():
+            snapshot.save()
+        return {key: snapshot.items for key, snapshot in snapshots.items()}
+
+    def build_json_layer(self, res_dict, hideDisabled, domain="enterprise-attack", attack_version=None):
         NAME = "Attack2Jira"
         DESCRIPTION = "Attack2Jira"
-        DOMAIN = "mitre-enterprise"
         GRADIENT = {
                 "colors": [
                     "#DCDCDC",
                     "#03ad03"],
             }
 
+        versions = {"layer": self.LAYER_VERSION, "navigator": self.NAVIGATOR_VERSION}
+        if attack_version:
+            # Navigator names ATT&CK releases by their major version
+            versions["attack"] = str(attack_version).split(".")[0]
+
         layer_json = {
-            "domain": DOMAIN,
             "name": NAME,
+            "versions": versions,
+            "domain": domain,
             "description": DESCRIPTION,
             "gradient": GRADIENT,
-            "version": VERSION,
             "hideDisabled": hideDisabled,
             "techniques": [ ]
         }
@@ -205,7 +529,6 @@ class Attack2Jira:
         shade_3_color = "#03ad03" # darker green
 
 
-        res_dict=self.jirahandler.get_technique_maturity()
         for key in res_dict.keys():
             enabled = True
             #print (key +" "+ res_dict[key]['value'])
@@ -228,19 +551,372 @@ class Attack2Jira:
             }
             layer_json["techniques"].append(technique)
 
-        print ("[*] Outputting JSON layer attack2jira.json")
-        with open('attack2jira.json', 'w', encoding='utf-8') as f:
+        return layer_json
+
+    def write_json_layer(self, layer_json, output):
+
+        print ("[*] Outputting JSON layer " + output)
+        with open(output, 'w', encoding='utf-8') as f:
             json.dump(layer_json, f, ensure_ascii=False, indent=4)
-        
 
-    def set_up_jira_automated(self, project, key):
+    def generate_json_layer(self, hideDisabled, key="ATTACK", snapshot_path=None, full_every=24, output="attack2jira.json"):
+
+        with self.phase('export'):
+            res_dict = self.get_maturity(key, snapshot_path, full_every)
+            self.write_json_layer(self.build_json_layer(res_dict, hideDisabled, self.knowledge_base.domain, self.knowledge_base.version), output)
+            self.record_history({key: res_dict})
+
+    def generate_json_layers(self, hideDisabled, key="ATTACK", snapshot_path=None, full_every=24, output="attack2jira.json"):
+
+        # One layer per tracked domain, all read with a single Jira scan:
+        # attack2jira-enterprise.json, attack2jira-mobile.json, ...
+        domain_keys = self.get_domain_keys(key)
+        with self.phase('export'):
+            res_dicts = self.get_maturity_by_project(list(domain_keys.values()), snapshot_path, full_every)
+            root, ext = os.path.splitext(output)
+            for domain, domain_key in domain_keys.items():
+                knowledge_base = self.knowledge_bases[domain]
+                layer_json = self.build_json_layer(res_dicts[domain_key], hideDisabled, knowledge_base.domain, knowledge_base.version)
+                self.write_json_layer(layer_json, root + "-" + domain + ext)
+            self.record_history(res_dicts)
+
+    def record_history(self, res_dicts):
 
-        self.jirahandler.create_project(project, key)
-        self.jirahandler.create_custom_fields()
-        self.jirahandler.add_custom_field_options()
-        self.jirahandler.add_custom_fields_to_screen(key)
-        self.jirahandler.hide_unwanted_fields(key)
-        self.create_attack_techniques_and_subtechniques(key)
+        if not self.history:
+            return
+        for key, res_dict in res_dicts.items():
+            if self.history.append(key, res_dict):
+                print("[*] Maturity snapshot of " + key + " added to the history.")
+            else:
+                print("[*] Maturity of " + key + " unchanged since the last history snapshot.")
+
+    def backfill_history(self, key="ATTACK"):
+
+        # One-time reconstruction of the history preceding the first export from
+        # the Maturity changelog of every issue, read with a single search.
+        domain_keys = self.get_domain_keys(key)
+        with self.phase('backfill'):
+            changelogs = self.jirahandler.get_maturity_changelog(list(domain_keys.values()))
+            for domain_key, changelog in changelogs.items():
+                changes = sum(len(issue['changes']) for issue in changelog.values())
+                snapshots = self.history.backfill(domain_key, changelog)
+                print("[!] " + str(changes) + " Maturity changes of " + str(len(changelog)) + " issues backfilled as " + str(snapshots) + " snapshots of " + domain_key + ".")
+
+    def report_trend(self, key="ATTACK", period="quarter", since=None, report="attack2jira_report", output="attack2jira.json", hideDisabled=False):
+
+        # Offline: <report>-trend.json/.csv with the maturity at the end of every
+        # period and, with a -since date, a layer of the techniques that improved
+        # since then (<output root>-improved.json), suffixed with the domain when
+        # there are several.
+        domain_keys = self.get_domain_keys(key)
+        root, ext = os.path.splitext(output)
+        for domain, domain_key in domain_keys.items():
+            ttp_ids, series = self.history.get_series(domain_key)
+            if not series:
+                print("[!] No history for the " + domain_key + " project: run 'export' with -history, or 'backfill'.")
+                continue
+            suffix = "" if len(domain_keys) == 1 else "-" + domain
+            rows = compute_trend(series, period)
+            print("[*] Maturity of the " + domain_key + " project per " + period + " (" + str(len(series)) + " snapshots since " + format_time(series[0][0]) + "):")
+            print_trend(rows)
+            for path in write_trend(rows, report + suffix + "-trend"):
+                print("[*] Trend report written to " + path)
+            if since is None:
+                continue
+            delta = compute_delta(ttp_ids, series, since)
+            print("[*] " + str(len(delta)) + " techniques of " + domain_key + " improved since " + format_time(since))
+            knowledge_base = self.knowledge_bases[domain]
+            self.write_json_layer(self.build_delta_layer(delta, since, hideDisabled, knowledge_base.domain, knowledge_base.version), root + suffix + "-improved" + ext)
+
+    def build_delta_layer(self, delta, since, hideDisabled, domain="enterprise-attack", attack_version=None):
+
+        # improved techniques colored by their current maturity, with the level
+        # they came from as comment
+        layer_json = self.build_json_layer({ttp_id: {'value': change['to']} for ttp_id, change in sorted(delta.items())}, hideDisabled, domain, attack_version)
+        layer_json['name'] = "Attack2Jira: improved since " + format_time(since)[:10]
+        for technique in layer_json['techniques']:
+            technique['comment'] = delta[technique['techniqueID']]['from'] + " -> " + delta[technique['techniqueID']]['to']
+        return layer_json
+
+    def analyze_coverage(self, key="ATTACK", snapshot_path=None, full_every=24, report="attack2jira_report"):
+
+        # Coverage reports of every tracked domain (see lib.analytics): <report>.json
+        # and one CSV per report, suffixed with the domain when there are several.
+        # Offline, the -snapshot/-journal maturity map is used as it is.
+        domain_keys = self.get_domain_keys(key)
+        with self.phase('attack_load'):
+            for knowledge_base in self.knowledge_bases.values():
+                knowledge_base.load()
+        with self.phase('maturity'):
+            if self.jirahandler:
+                res_dicts = self.get_maturity_by_project(list(domain_keys.values()), snapshot_path, full_every)
+            else:
+                snapshots = self.open_snapshots(list(domain_keys.values()), snapshot_path, full_every)
+                res_dicts = {domain_key: snapshot.items for domain_key, snapshot in snapshots.items()}
+                for domain_key, items in res_dicts.items():
+                    if not items:
+                        print("[!] No maturity values of the " + domain_key + " project in the -snapshot/-journal, every technique counts as Not Tracked.")
+        with self.phase('analyze'):
+            for domain, domain_key in domain_keys.items():
+                start = time.perf_counter()
+                result = analyze(self.knowledge_bases[domain].get_techniques(), res_dicts[domain_key])
+                elapsed = time.perf_counter() - start
+                root = report if len(domain_keys) == 1 else report + "-" + domain
+                print("[*] Coverage of the " + domain_key + " project (analyzed in " + "%.3f" % elapsed + "s):")
+                print_report(result)
+                for path in write_reports(result, root):
+                    print("[*] Report written to " + path)
+
+    def import_rules(self, rules_path, key="ATTACK", snapshot_path=None, full_every=24, concurrency=1):
+
+        # Raises the Maturity of the techniques a detection rule repository covers
+        # (see lib.rules). One search reads the current values of every tracked
+        # project, then the changes go out as one bulk edit per maturity level, or
+        # as `concurrency` PUTs at a time where bulk edit is not available.
+        domain_keys = self.get_domain_keys(key)
+        with self.phase('rules'):
+            print("[*] Reading detection rules from " + rules_path + "...")
+            rules = read_rules(rules_path)
+            counts = count_rules(rules)
+            print("[!] " + str(len(rules)) + " rules tag " + str(len(counts)) + " techniques.")
+        with self.phase('maturity'):
+            res_dicts = self.get_maturity_by_project(list(domain_keys.values()), snapshot_path, full_every)
+
+        changes = []
+        tracked = set()
+        for domain_key in domain_keys.values():
+            project_changes, missing = diff_maturity(counts, res_dicts[domain_key])
+            changes += project_changes
+            tracked.update(ttp_id for ttp_id in counts if ttp_id not in missing)
+        untracked = sorted(set(counts) - tracked)
+        if untracked:
+            print("[!] " + str(len(untracked)) + " tagged techniques have no issue: " + ", ".join(untracked[:20]) + (", ..." if len(untracked) > 20 else ""))
+        if not changes:
+            print("[!] Maturity already matches the rules, nothing to import.")
+            return {}
+
+        with self.phase('import'):
+            for change in changes:
+                print("\t[*] " + change['key'] + " (" + change['ttp_id'] + "): " + change['from'] + " -> " + change['to'] + " (" + str(change['rules']) + " rules)")
+            issue_ids = {}
+            for change in changes:
+                issue_ids.setdefault(change['to'], []).append(change['id'] or change['key'])
+            print("[*] Raising the maturity of " + str(len(changes)) + " techniques...")
+            failed_ids = self.jirahandler.bulk_edit_select_field('Maturity', issue_ids)
+            if failed_ids is None:
+                print("[*] Bulk edit is not available, updating the issues one by one...")
+                maturity_field = self.jirahandler.get_custom_fields()['Maturity']
+                failed = self.update_issues([{'ttp_id': change['ttp_id'], 'key': change['key'], 'changed': ['maturity'],
+                                              'payload': {'fields': {maturity_field: {'value': change['to']}}}} for change in changes], concurrency)
+            else:
+                failed = {change['ttp_id']: failed_ids[str(change['id'] or change['key'])] for change in changes if str(change['id'] or change['key']) in failed_ids}
+                for ttp_id, error in failed.items():
+                    print("\t[!] Error updating " + ttp_id + ": " + error)
+        print("[!] Maturity of " + str(len(changes) - len(failed)) + " techniques raised, " + str(len(failed)) + " failed.")
+        return failed
+
+    def set_up_jira_automated(self, project, key, bulk=False, concurrency=1):
+
+        # One project per tracked domain; custom fields and their options are global
+        # and set up once for all of them. With a journal, steps completed by a
+        # previous (interrupted) run are skipped.
+        domain_keys = self.get_domain_keys(key)
+        domain_projects = self.get_domain_projects(project)
+        steps = []
+        for domain, domain_key in domain_keys.items():
+            steps.append((domain_key, 'project', lambda p=domain_projects[domain], k=domain_key: self.jirahandler.create_project(p, k)))
+        steps.append((key, 'fields', lambda: self.jirahandler.create_custom_fields()))
+        steps.append((key, 'options', lambda: self.jirahandler.add_custom_field_options(list(self.knowledge_bases.values()))))
+        for domain_key in domain_keys.values():
+            steps.append((domain_key, 'screens', lambda k=domain_key: self.jirahandler.add_custom_fields_to_screen(k)))
+            steps.append((domain_key, 'layout', lambda k=domain_key: self.jirahandler.hide_unwanted_fields(k)))
+
+        # the options step reads the tactics and data sources of every domain
+        with self.phase('attack_load'):
+            for knowledge_base in self.knowledge_bases.values():
+                knowledge_base.load()
+        with self.phase('setup'):
+            for step_key, step, run in steps:
+                if self.journal and self.journal.is_step_done(step_key, step):
+                    print("[*] Skipping '" + step + "' setup step of " + step_key + ", already completed.")
+                    continue
+                run()
+                if self.journal:
+                    self.journal.mark_step_done(step_key, step)
+                    # a project we just created is empty, so the journal knows all its issues
+                    if step == 'project':
+                        self.journal.mark_index_synced(step_key)
+        for domain, domain_key in domain_keys.items():
+            self.for_domain(domain).create_attack_issues(domain_key, bulk, concurrency)
+
+    # plan operation -> setup step of set_up_jira_automated(), as journaled
+    PLAN_SETUP_STEPS = {'create_project': 'project', 'create_fields': 'fields', 'add_options': 'options', 'configure_screens': 'screens', 'configure_layout': 'layout'}
+
+    def capture_project_state(self, key, state_path):
+
+        # Custom field ids and one detailed scan of every domain project, for the
+        # offline 'plan' action. Projects that do not exist are recorded as None.
+        custom_fields = self.jirahandler.get_custom_fields()
+        projects = {}
+        options = None
+        with self.phase('capture'):
+            if self.jirahandler.do_custom_fields_exist():
+                options = self.jirahandler.get_custom_field_options()
+            for domain_key in self.get_domain_keys(key).values():
+                if not self.jirahandler.get_project_id(domain_key):
+                    print("[!] The " + domain_key + " project does not exist yet.")
+                    projects[domain_key] = None
+                elif not self.jirahandler.do_custom_fields_exist():
+                    # without the Id field no issue can be an ATT&CK technique
+                    projects[domain_key] = {}
+                else:
+                    projects[domain_key] = self.jirahandler.get_project_index(domain_key, detailed=True)
+        save_state(state_path, self.jirahandler.url, custom_fields, projects, options)
+        print("[*] Project state written to " + state_path)
+
+    def plan_jira_changes(self, project, key, state=None, setup=True, retire_transition=None):
+
+        # Ordered operations of an 'initialize' (setup=False: -update) followed by a
+        # 'sync', computed from the captured state and the cached ATT&CK bundles
+        # only: no Jira request is made. Setup steps are planned for the projects
+        # and custom fields missing from the state.
+        state = state or {'url': None, 'captured': None, 'custom_fields': {}, 'projects': {}}
+        domain_keys = self.get_domain_keys(key)
+        domain_projects = self.get_domain_projects(project)
+        with self.phase('attack_load'):
+            for knowledge_base in self.knowledge_bases.values():
+                knowledge_base.load()
+
+        operations = []
+        skipped = {}
+        missing_fields = []
+        with self.phase('plan'):
+            if setup:
+                new_keys = [domain_key for domain_key in domain_keys.values() if state['projects'].get(domain_key) is None]
+                for domain, domain_key in domain_keys.items():
+                    if domain_key in new_keys:
+                        operations.append({'op': 'create_project', 'project': domain_key, 'name': domain_projects[domain]})
+                missing_fields = [name for name in JiraHandler.CUSTOM_FIELD_NAMES if name not in state['custom_fields']]
+                if missing_fields:
+                    operations.append({'op': 'create_fields', 'project': key, 'names': missing_fields})
+
+            # tactics and data sources of an ATT&CK upgrade must be options before
+            # any issue uses them, with -update too
+            knowledge_bases = list(self.knowledge_bases.values())
+            missing_options = plan_missing_options({
+                'Maturity': JiraHandler.MATURITY_OPTIONS,
+                'Tactic': [option['name'] for option in JiraHandler.get_attack_tactics(knowledge_bases)],
+                'Datasources': [option['name'] for option in JiraHandler.get_attack_datasources(knowledge_bases)],
+            }, None if missing_fields else state.get('options'))
+            if missing_options:
+                operations.append({'op': 'add_options', 'project': key, 'options': missing_options})
+
+            if setup:
+                for domain_key in new_keys:
+                    operations.append({'op': 'configure_screens', 'project': domain_key})
+                    operations.append({'op': 'configure_layout', 'project': domain_key})
+
+            for domain, domain_key in domain_keys.items():
+                knowledge_base = self.knowledge_bases[domain]
+                index = state['projects'].get(domain_key) or {}
+                print("[*] Comparing ATT&CK " + str(knowledge_base.version) + " with the captured " + domain_key + " project...")
+                issue_operations, issue_skipped = plan_issue_operations(domain_key, knowledge_base.get_techniques(), knowledge_base.get_retired(), index, retire_transition)
+                operations += issue_operations
+                skipped.update(issue_skipped)
+
+        return {
+            'format': PLAN_FORMAT,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'url': state['url'],
+            'state_captured': state['captured'],
+            'attack': {domain: knowledge_base.version for domain, knowledge_base in self.knowledge_bases.items()},
+            'operations': operations,
+            'skipped': skipped,
+        }
+
+    def print_plan(self, plan):
+
+        print("[*] Plan against " + (plan['url'] or "new projects") + ", state captured " + str(plan['state_captured']) + ":")
+        for name, count in count_operations(plan['operations']).items():
+            print("\t[*] " + name + ": " + str(count))
+        fields = {}
+        for operation in plan['operations']:
+            for name in operation.get('changed', []):
+                fields[name] = fields.get(name, 0) + 1
+        for name in sorted(fields):
+            print("\t\t[*] " + name + ": " + str(fields[name]))
+        for ttp_id in sorted(plan['skipped']):
+            print("\t[!] Skipping " + ttp_id + ": " + plan['skipped'][ttp_id])
+
+    def apply_plan(self, plan, concurrency=1):
+
+        # Setup steps run in plan order (journaled like 'initialize'); then, per
+        # project, updates are PUT `concurrency` at a time and issues are created
+        # through the bulk endpoint, parents first, `concurrency` requests at a time.
+        # Issues that exist by now (e.g. a previous apply) are not created again.
+        jiraclient = self.jirahandler
+        if plan['url'] and plan['url'].rstrip('/') != jiraclient.url.rstrip('/'):
+            print("[!] The plan was made for " + plan['url'] + ", not " + jiraclient.url)
+            sys.exit(1)
+
+        operations = plan['operations']
+        with self.phase('setup'):
+            for operation in operations:
+                step = self.PLAN_SETUP_STEPS.get(operation['op'])
+                if not step:
+                    continue
+                step_key = operation['project']
+                # options are synced whatever the journal says: the plan only lists
+                # the missing ones, and adding them is idempotent
+                if self.journal and step != 'options' and self.journal.is_step_done(step_key, step):
+                    print("[*] Skipping '" + step + "' setup step of " + step_key + ", already completed.")
+                    continue
+                if step == 'project':
+                    jiraclient.create_project(operation['name'], step_key)
+                elif step == 'fields':
+                    jiraclient.create_custom_fields()
+                elif step == 'options':
+                    jiraclient.get_custom_fields()
+                    with ThreadPoolExecutor(max_workers=len(operation['options'])) as executor:
+                        list(executor.map(lambda item: jiraclient.sync_field_options(item[0], item[1]), operation['options'].items()))
+                elif step == 'screens':
+                    jiraclient.add_custom_fields_to_screen(step_key)
+                else:
+                    jiraclient.hide_unwanted_fields(step_key)
+                if self.journal:
+                    self.journal.mark_step_done(step_key, step)
+                    if step == 'project':
+                        self.journal.mark_index_synced(step_key)
+
+        failed = {}
+        created = {}
+        updated = 0
+        projects = []
+        for operation in operations:
+            if operation['op'] in ('update_issue', 'create_issue') and operation['project'] not in projects:
+                projects.append(operation['project'])
+        for key in projects:
+            updates = [operation for operation in operations if operation['op'] == 'update_issue' and operation['project'] == key]
+            creates = [operation for operation in operations if operation['op'] == 'create_issue' and operation['project'] == key]
+            if updates:
+                with self.phase('sync'):
+                    print("[*] Updating " + str(len(updates)) + " issues of the " + key + " project...")
+                    custom_fields = jiraclient.get_custom_fields()
+                    changes = [{'ttp_id': operation['ttp_id'], 'key': operation['issue'], 'changed': operation['changed'],
+                                'payload': map_custom_fields(operation['payload'], custom_fields), 'transition': operation.get('transition')}
+                               for operation in updates]
+                    update_failed = self.update_issues(changes, concurrency)
+                    updated += len(changes) - len(update_failed)
+                    failed.update(update_failed)
+            if creates:
+                with self.phase('creation'):
+                    techniques = [technique_from_operation(operation) for operation in creates]
+                    project_created, project_failed = self.create_attack_techniques_and_subtechniques_bulk(key, None, techniques, concurrency)
+                    created.update(project_created)
+                    failed.update(project_failed)
+
+        print("[*] Applied plan: " + str(updated) + " issues updated, " + str(len(created)) + " created, " + str(len(failed)) + " failed")
+        return created, failed
 
 
 def main():
@@ -248,38 +924,229 @@ def main():
     parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
     parser.add_argument('-url', dest = 'url', type=str, help= 'Url of Jira instance', default="")
     parser.add_argument('-u', dest = 'user', type=str, help='Username', default="")
-    parser.add_argument('-a', dest='action', type=str, default="", help='action to execute\nTwo supported:\n\'initialize\' will create the JIRA entities. \n\'export\' will export the JSON layer.')
+    parser.add_argument('-a', dest='action', type=str, default="", help='action to execute\nSupported:\n\'initialize\' will create the JIRA entities. \n\'sync\' will update existing issues with ATT&CK changes and create new ones. \n\'export\' will export the JSON layer.\n\'serve\' will serve the JSON layer over HTTP, refreshed in the background.\n\'webhook\' will update the -snapshot/-journal maturity map and the JSON layer from Jira webhooks, without calling Jira.\n\'capture\' will save the custom fields and issues of the project(s) to the -state file.\n\'plan\' will write the operations of an initialize (or -update) and sync to the -plan file, offline from the -state file.\n\'apply\' will execute the -plan file.\n\'analyze\' will write coverage reports per tactic, data source and sub-technique (needs numpy).\n\'backfill\' will rebuild the -history of past maturity values from the issue changelogs.\n\'trend\' will write a maturity trend report and, with -since, a layer of the improved techniques, offline from the -history file.\n\'import\' will raise the Maturity of the techniques covered by the Sigma/YAML rules of the -rules directory.')
     parser.add_argument('-p', dest = 'project', type=str, help='Name of the Jira project to create.', default="Mitre Attack Framework")
     parser.add_argument('-k', dest = 'key', type=str, help='Project Key.(default=\'ATTACK\')', default="ATTACK")
     parser.add_argument('-hide', help='If set, \'Not Tracked\' techniques will be hidden',action='store_true')
     parser.add_argument('-update', dest = 'update', action='store_true', help='Skip project creation and only update with new TTPs.')
+    parser.add_argument('-fieldcache', dest = 'field_cache', type=str, nargs='?', const='attack2jira_fields.json', default=None, help='Cache custom field ids on disk, keyed by Jira url.\n(default file=\'attack2jira_fields.json\')')
+    parser.add_argument('--attack-bundle', dest = 'attack_bundle', type=str, default=None, help='Read ATT&CK from a local STIX bundle instead of the cache/network.\nWith -domains, one bundle per domain: \'enterprise=e.json,mobile=m.json\'.')
+    parser.add_argument('--attack-version', dest = 'attack_version', type=str, default=None, help='ATT&CK version to use.(default=latest cached)')
+    parser.add_argument('--attack-refresh', dest = 'attack_refresh', action='store_true', help='Check for a newer ATT&CK release than the cached one.')
+    parser.add_argument('--attack-cache', dest = 'attack_cache', type=str, default=None, help='Directory caching ATT&CK bundles.(default=\'~/.cache/attack2jira\')')
+    parser.add_argument('-domains', dest = 'domains', type=str, default=None, help='Comma separated ATT&CK domains to track: enterprise, mobile, ics.\nEach domain gets its own project (key suffix MOB/ICS) and export writes one layer per domain.')
+    parser.add_argument('-retire-transition', dest = 'retire_transition', type=str, default=None, help='With \'sync\', workflow transition applied to revoked/deprecated techniques (e.g. \'Done\').')
+    parser.add_argument('-disable-stale-options', dest = 'disable_stale_options', action='store_true', help='With \'sync\'/-update, disable Tactic/Datasources options that none of the tracked domains use anymore.')
+    parser.add_argument('-snapshot', dest = 'snapshot', type=str, nargs='?', const='attack2jira_snapshot.json', default=None, help='With \'export\', keep a local maturity snapshot and only fetch issues updated since the last run.\n(default file=\'attack2jira_snapshot.json\')')
+    parser.add_argument('-full-every', dest = 'full_every', type=float, default=24, help='With -snapshot/-journal, hours between full reconciles of the snapshot and of the journaled issue index.(default=24)')
+    parser.add_argument('-journal', dest = 'journal', type=str, nargs='?', const='attack2jira.db', default=None, help='SQLite journal of completed setup steps, created issues and maturity values.\nReruns resume from it without querying Jira.(default file=\'attack2jira.db\')')
+    parser.add_argument('-bulk', dest = 'bulk', action='store_true', help='Create issues through Jira\'s bulk endpoint (50 issues per request).')
+    parser.add_argument('-concurrency', dest = 'concurrency', type=int, default=1, help='Number of issues to create in parallel.(default=1)')
+    parser.add_argument('-o', dest = 'output', type=str, default='attack2jira.json', help='File the \'export\' JSON layer is written to.(default=\'attack2jira.json\')')
+    parser.add_argument('-state', dest = 'state', type=str, default='attack2jira_state.json', help='Project state written by \'capture\' and read by \'plan\'.(default=\'attack2jira_state.json\')')
+    parser.add_argument('-plan', dest = 'plan', type=str, default='attack2jira_plan.json', help='Plan written by \'plan\' and executed by \'apply\'.(default=\'attack2jira_plan.json\')')
+    parser.add_argument('-report', dest = 'report', type=str, default='attack2jira_report', help='With \'analyze\', reports are written to <report>.json and <report>-<name>.csv.(default=\'attack2jira_report\')')
+    parser.add_argument('-history', dest = 'history', type=str, nargs='?', const='attack2jira_history.db', default=None, help='SQLite maturity history: every \'export\' appends a snapshot to it, read by \'trend\'.\n(default file=\'attack2jira_history.db\')')
+    parser.add_argument('-since', dest = 'since', type=str, default=None, help='With \'trend\', date (YYYY-MM-DD) the improved techniques layer is compared to.')
+    parser.add_argument('-period', dest = 'period', type=str, choices=PERIODS, default='quarter', help='With \'trend\', period of the trend report rows.(default=\'quarter\')')
+    parser.add_argument('-rules', dest = 'rules', type=str, default=None, help='With \'import\', directory of Sigma/YAML detection rules tagged attack.tXXXX.')
+    parser.add_argument('-listen', dest = 'listen', type=str, default='127.0.0.1:8080', help='With \'serve\', address the layer is served on.(default=\'127.0.0.1:8080\')')
+    parser.add_argument('-refresh', dest = 'refresh', type=float, default=300, help='With \'serve\', seconds between maturity refreshes.(default=300)')
+    parser.add_argument('-webhook-secret', dest = 'webhook_secret', type=str, default=None, help='With \'serve\'/\'webhook\', secret the Jira webhook was registered with.\nUnsigned payloads are rejected.')
+    parser.add_argument('-metrics', '--metrics', dest = 'metrics', type=str, nargs='?', const='attack2jira_metrics.json', default=None, help='Print per-endpoint request latencies (p50/p95), retries and sizes and the time of each phase\nat the end of the run, and write them to a file: JSON, or Prometheus text for .prom/.txt.\n(default file=\'attack2jira_metrics.json\')')
+    parser.add_argument('-batch', dest = 'batch', type=str, default=None, help='YAML/JSON inventory of Jira targets (url, user, token_env, project, key, action)\nto run the action against concurrently. Tokens are read from the token_env variables.')
+    parser.add_argument('-per-host', dest = 'per_host', type=int, default=1, help='With -batch, targets run at the same time against one Jira host.(default=1)')
+    parser.add_argument('-batch-workers', dest = 'batch_workers', type=int, default=4, help='With -batch, targets run at the same time overall.(default=4)')
     results = parser.parse_args()
 
-    url= results.url
-    user= results.user
-    action = results.action
-    hideDisabled = results.hide
-    project = results.project
-    key = results.key
-
-    if (url and user and action):
-        pswd = getpass('Jira API Token for '+user+":")
-
-        if (action == "initialize"):
-            attack2jira = Attack2Jira(url, user, pswd)
-            if results.update:
-                # Skip project creation; update with new TTPs only
-                logging.info("Update mode enabled: Skipping project creation.")
-                attack2jira.create_attack_techniques_and_subtechniques(key)
-            else:
-                attack2jira.set_up_jira_automated(project, key)
-
-        if (action == "export"):
-            attack2jira = Attack2Jira(url, user, pswd)
-            attack2jira.generate_json_layer(hideDisabled)
+    if results.batch:
+        run_batch_inventory(results)
+    elif is_offline(results):
+        # work from local files only, no Jira credentials needed; -url only
+        # selects the instance of the -journal
+        run_action(results, None, load_knowledge_bases(results))
+    elif (results.url and results.user and results.action):
+        pswd = getpass('Jira API Token for '+results.user+":")
+        run_action(results, pswd, load_knowledge_bases(results))
     else:
         parser.print_help()
 
+
+def is_offline(options):
+    # 'analyze' is offline from the -snapshot/-journal unless credentials are given
+    return options.action in ("webhook", "plan", "trend") or (options.action == "analyze" and not options.user and (options.snapshot or options.journal))
+
+
+def load_knowledge_bases(options):
+
+    # domain -> AttackKnowledgeBase of every domain given with -domains (Enterprise by default)
+    if not options.domains:
+        return {'enterprise': AttackKnowledgeBase(options.attack_bundle, options.attack_cache, options.attack_version, options.attack_refresh)}
+
+    domains = [domain.strip().lower() for domain in options.domains.split(",") if domain.strip()]
+    for domain in domains:
+        if domain not in AttackKnowledgeBase.DOMAINS:
+            print("[!] Unsupported ATT&CK domain '" + domain + "'")
+            sys.exit(1)
+    bundles = {}
+    if options.attack_bundle:
+        for entry in options.attack_bundle.split(","):
+            domain, sep, path = entry.partition("=")
+            if not sep:
+                print("[!] With -domains, --attack-bundle takes domain=file pairs")
+                sys.exit(1)
+            bundles[domain.strip().lower()] = path.strip()
+    return {domain: AttackKnowledgeBase(bundles.get(domain), options.attack_cache, options.attack_version, options.attack_refresh, domain) for domain in domains}
+
+
+def run_action(options, pswd, knowledge_bases):
+
+    url = options.url
+    user = options.user
+    action = options.action
+    key = options.key
+
+    if action not in ("initialize", "sync", "export", "serve", "webhook", "capture", "plan", "apply", "analyze", "backfill", "trend", "import"):
+        print("[!] Unsupported action '" + str(action) + "'")
+        return
+
+    if action == "webhook" and not (options.snapshot or options.journal):
+        print("[!] The 'webhook' action needs the maturity map of a previous export: use -snapshot or -journal")
+        return
+    if action in ("backfill", "trend") and not options.history:
+        print("[!] The '" + action + "' action needs a maturity history file: use -history")
+        return
+    if action == "import" and not (options.rules and os.path.isdir(options.rules)):
+        print("[!] The 'import' action needs a directory of detection rules: use -rules")
+        return
+    offline = is_offline(options)
+    if offline and (options.journal or options.history) and not url:
+        # journal and history rows are keyed by the Jira instance they were read from
+        print("[!] Reading the -journal or -history offline needs the -url of its Jira instance")
+        return
+    journal = StateJournal(options.journal, url, options.full_every * 3600) if options.journal else None
+    history = MaturityHistory(options.history, url) if options.history else None
+    metrics = RunMetrics() if options.metrics else None
+    attack2jira = Attack2Jira(url if not offline else None, user, pswd, options.field_cache, options.concurrency, journal=journal, knowledge_bases=knowledge_bases, metrics=metrics, history=history)
+    try:
+        run_attack2jira_action(attack2jira, options)
+    finally:
+        if journal:
+            journal.close()
+        if history:
+            history.close()
+        if metrics:
+            metrics.print_summary()
+            metrics.dump(options.metrics)
+
+
+def run_attack2jira_action(attack2jira, options):
+
+    action = options.action
+    key = options.key
+    domain_keys = attack2jira.get_domain_keys(key)
+
+    if (action == "initialize"):
+        if options.update:
+            # Skip project creation; update with new TTPs only
+            logging.info("Update mode enabled: Skipping project creation.")
+            attack2jira.sync_custom_field_options(options.disable_stale_options, key)
+            for domain, domain_key in domain_keys.items():
+                attack2jira.for_domain(domain).create_attack_issues(domain_key, options.bulk, options.concurrency)
+        else:
+            attack2jira.set_up_jira_automated(options.project, key, options.bulk, options.concurrency)
+
+    if (action == "sync"):
+        attack2jira.sync_custom_field_options(options.disable_stale_options, key)
+        for domain, domain_key in domain_keys.items():
+            attack2jira.for_domain(domain).sync_attack_techniques(domain_key, options.bulk, options.concurrency, options.retire_transition)
+
+    if (action == "export"):
+        if options.domains:
+            attack2jira.generate_json_layers(options.hide, key, options.snapshot, options.full_every, options.output)
+        else:
+            attack2jira.generate_json_layer(options.hide, key, options.snapshot, options.full_every, options.output)
+
+    if (action == "serve"):
+        host, _, port = options.listen.rpartition(":")
+        layer_server = LayerServer(attack2jira, key, options.hide, options.snapshot, options.full_every, options.refresh, webhook_secret=options.webhook_secret)
+        layer_server.serve(host or '127.0.0.1', int(port))
+
+    if (action == "webhook"):
+        host, _, port = options.listen.rpartition(":")
+        layer_server = LayerServer(attack2jira, key, options.hide, options.snapshot, options.full_every, output=options.output, webhook_secret=options.webhook_secret)
+        layer_server.serve(host or '127.0.0.1', int(port))
+
+
+    if (action == "analyze"):
+        attack2jira.analyze_coverage(key, options.snapshot, options.full_every, options.report)
+
+    if (action == "backfill"):
+        attack2jira.backfill_history(key)
+
+    if (action == "trend"):
+        try:
+            since = parse_date(options.since) if options.since else None
+        except ValueError:
+            print("[!] Invalid -since date '" + options.since + "', expected YYYY-MM-DD")
+            sys.exit(1)
+        attack2jira.report_trend(key, options.period, since, options.report, options.output, options.hide)
+
+    if (action == "import"):
+        attack2jira.import_rules(options.rules, key, options.snapshot, options.full_every, options.concurrency)
+
+    if (action == "capture"):
+        attack2jira.capture_project_state(key, options.state)
+
+    if (action == "plan"):
+        state = load_state(options.state)
+        if state is None:
+            print("[!] No project state in " + options.state + ", planning for new projects. Run 'capture' first for existing ones.")
+        plan = attack2jira.plan_jira_changes(options.project, key, state, not options.update, options.retire_transition)
+        save_plan(options.plan, plan)
+        attack2jira.print_plan(plan)
+        print("[*] Plan written to " + options.plan)
+
+    if (action == "apply"):
+        plan = load_plan(options.plan)
+        if plan is None:
+            print("[!] No plan in " + options.plan + ", run 'plan' first.")
+            sys.exit(1)
+        attack2jira.apply_plan(plan, options.concurrency)
+
+
+# options naming files a run writes; -fieldcache is shared, keyed by Jira url
+BATCH_TARGET_PATHS = ('output', 'snapshot', 'journal', 'history', 'state', 'plan', 'report', 'metrics')
+
+
+def run_batch_inventory(results):
+
+    # ATT&CK is loaded once up front and shared by every target
+    targets = load_inventory(results.batch)
+    knowledge_bases = load_knowledge_bases(results)
+    for knowledge_base in knowledge_bases.values():
+        knowledge_base.load()
+
+    def run_target(target, token):
+        options = argparse.Namespace(**vars(results))
+        for name, value in target.items():
+            setattr(options, name, value)
+        options.action = target.get('action') or results.action
+        # the files of different targets must not overwrite each other: paths
+        # given on the command line get the target name, the inventory's are kept
+        suffix = '-' + re.sub(r'[^A-Za-z0-9_.@-]', '_', target['name'])
+        for name in BATCH_TARGET_PATHS:
+            if name not in target and getattr(options, name):
+                root, ext = os.path.splitext(getattr(options, name))
+                setattr(options, name, root + suffix + ext)
+        run_action(options, token, knowledge_bases)
+
+    for target in targets:
+        target.setdefault('action', results.action)
+    print("[*] Running against " + str(len(targets)) + " targets...")
+    print_batch_summary(run_batch(targets, run_target, results.batch_workers, results.per_host))
+
+
 if __name__ == '__main__':
 
     try:
@@ -0,0 +1,73 @@
+import json, os, random
+
+# Deterministic ATT&CK-sized STIX bundles for the benchmarks, so every run measures
+# the same catalogue without downloading MITRE's data. Release "1.0" has roughly
+# Enterprise's shape (200 techniques, ~420 sub-techniques, 14 tactics); release
+# "2.0" renames, retags, revokes and adds techniques so that sync has work to do.
+
+TACTICS = ['reconnaissance', 'resource-development', 'initial-access', 'execution', 'persistence',
+           'privilege-escalation', 'defense-evasion', 'credential-access', 'discovery', 'lateral-movement',
+           'collection', 'command-and-control', 'exfiltration', 'impact']
+
+DATASOURCES = [component + ": " + detail for component in ['Process', 'Command', 'File', 'Network Traffic', 'Windows Registry', 'Module', 'Logon Session', 'User Account', 'Script', 'Service', 'Scheduled Job', 'Driver', 'Firewall', 'Cloud Service', 'Application Log']
+               for detail in ['Creation', 'Modification', 'Access', 'Metadata', 'Deletion']]
+
+
+def technique_object(ttp_id, name, description, tactic, datasources, subtechnique=False):
+
+    return {
+        'type': 'attack-pattern',
+        'id': 'attack-pattern--' + ttp_id.lower().replace('.', '-'),
+        'spec_version': '2.1',
+        'created': '2020-01-01T00:00:00.000Z',
+        'modified': '2024-01-01T00:00:00.000Z',
+        'name': name,
+        'description': description,
+        'kill_chain_phases': [{'kill_chain_name': 'mitre-attack', 'phase_name': tactic}],
+        'external_references': [{'source_name': 'mitre-attack', 'external_id': ttp_id, 'url': 'https://attack.mitre.org/techniques/' + ttp_id.replace('.', '/')}],
+        'x_mitre_data_sources': datasources,
+        'x_mitre_is_subtechnique': subtechnique,
+        'x_mitre_platforms': ['Windows', 'Linux', 'macOS'],
+        'x_mitre_version': '1.0',
+    }
+
+
+def build_bundle(version="1.0", techniques=200, seed=1):
+
+    rng = random.Random(seed)
+    objects = [{'type': 'x-mitre-collection', 'id': 'x-mitre-collection--bench', 'name': "Enterprise ATT&CK", 'x_mitre_version': version}]
+    for tactic in TACTICS:
+        objects.append({'type': 'x-mitre-tactic', 'id': 'x-mitre-tactic--' + tactic, 'name': tactic.replace('-', ' ').title(), 'x_mitre_shortname': tactic})
+
+    upgraded = version != "1.0"
+    count = techniques + (10 if upgraded else 0)
+    for i in range(count):
+        ttp_id = 'T%04d' % (1001 + i)
+        tactic = TACTICS[i % len(TACTICS)]
+        datasources = sorted(rng.sample(DATASOURCES, 1 + i % 4))
+        name = 'Technique %d' % i
+        description = ('Adversaries may perform technique %d. ' % i) * 20
+        if upgraded and i % 25 == 0:
+            name += ' (renamed)'
+        if upgraded and i % 30 == 0:
+            datasources = sorted(set(datasources + [DATASOURCES[-1]]))
+        technique = technique_object(ttp_id, name, description, tactic, datasources)
+        if upgraded and i % 40 == 7:
+            technique['revoked'] = True
+        objects.append(technique)
+        for j in range(i % 5):
+            sub_id = '%s.%03d' % (ttp_id, j + 1)
+            objects.append(technique_object(sub_id, 'Sub-technique %d.%d' % (i, j), ('Variant %d of technique %d. ' % (j, i)) * 10, tactic, datasources, True))
+        # relationships make up most of the real bundle and are skipped by the loader
+        for k in range(3):
+            objects.append({'type': 'relationship', 'id': 'relationship--%d-%d' % (i, k), 'relationship_type': 'uses', 'source_ref': 'intrusion-set--%d' % k, 'target_ref': technique['id'], 'description': 'Group %d has used technique %d.' % (k, i)})
+
+    return {'type': 'bundle', 'id': 'bundle--bench-' + version, 'objects': objects}
+
+
+def write_bundle(directory, version="1.0", techniques=200):
+
+    path = os.path.join(directory, 'bench-enterprise-attack-' + version + '.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(build_bundle(version, techniques), f)
+    return path
@@ -0,0 +1,513 @@
+import json, re, time, threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from lib.metrics import endpoint_template
+
+# Local stand-in for the Jira Cloud REST endpoints JiraHandler uses, so runs can
+# be measured without a tenant. Latency, search page size and throttling (429
+# with Retry-After) are configurable, and every request is counted per endpoint
+# template together with the bytes sent and received.
+
+
+# histories embedded per issue by a search with expand=changelog
+CHANGELOG_SEARCH_LIMIT = 100
+
+
+def format_time(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime(ts))
+
+
+class MockJiraConfig:
+
+    def __init__(self, latency=0.0, page_size=100, rate_limit=0, burst=None, retry_after=1, fail_every=0):
+
+        self.latency = latency          # seconds added to every response
+        self.page_size = page_size      # max issues per search page
+        self.rate_limit = rate_limit    # requests per second, 0 = unlimited
+        self.burst = burst or max(1, int(rate_limit))
+        self.retry_after = retry_after  # Retry-After of throttled responses
+        self.fail_every = fail_every    # throttle every Nth request, 0 = never
+
+
+class MockJiraState:
+
+    CUSTOM_FIELD_ID_START = 10090
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.fields = [{'id': 'summary', 'name': 'Summary', 'custom': False}, {'id': 'description', 'name': 'Description', 'custom': False}]
+        self.options = {}
+        self.projects = {}
+        self.issues = {}
+        self.next_issue_id = 10000
+        self.next_project_id = 10000
+        # bulk edit task id -> {'polls', 'result'}
+        self.tasks = {}
+
+    def add_project(self, key, name):
+
+        with self.lock:
+            self.next_project_id += 1
+            project = {'id': str(self.next_project_id), 'key': key, 'name': name, 'counter': 0}
+            self.projects[key] = project
+            return project
+
+    def add_field(self, name, field_type=None):
+
+        with self.lock:
+            field = {'id': 'customfield_' + str(self.CUSTOM_FIELD_ID_START + len(self.fields)), 'name': name, 'custom': True, 'schema': {'custom': field_type}}
+            self.fields.append(field)
+            return field
+
+    def add_options(self, field_id, values):
+
+        with self.lock:
+            options = self.options.setdefault(field_id, [])
+            added = []
+            for value in values:
+                added.append({'id': str(20000 + sum(len(o) for o in self.options.values())), 'value': value, 'disabled': False})
+                options.append(added[-1])
+            return added
+
+    def update_options(self, field_id, updates):
+
+        with self.lock:
+            options = {option['id']: option for option in self.options.get(field_id, [])}
+            for update in updates:
+                options[update['id']]['disabled'] = update['disabled']
+            return [options[update['id']] for update in updates]
+
+    def record_history(self, issue, fields):
+
+        # changelog entry for the select fields (Maturity, Tactic) a PUT changes
+        items = []
+        for field_id, value in fields.items():
+            if isinstance(value, dict) and 'value' in value:
+                previous = (issue['fields'].get(field_id) or {}).get('value')
+                if previous != value['value']:
+                    name = next((field['name'] for field in self.fields if field['id'] == field_id), field_id)
+                    items.append({'field': name, 'fieldId': field_id, 'fromString': previous, 'toString': value['value']})
+        if items:
+            issue['histories'].append({'id': str(len(issue['histories']) + 1), 'created': format_time(time.time()), 'items': items})
+
+    def bulk_edit(self, issue_ids, field_id, option_id):
+
+        # edits the issues at once; the task reports RUNNING on its first poll
+        with self.lock:
+            value = next((option['value'] for option in self.options.get(field_id, []) if option['id'] == option_id), None)
+            processed, failed, invalid = [], {}, 0
+            for issue in self.issues.values():
+                if issue['id'] in issue_ids or issue['key'] in issue_ids:
+                    if value is None:
+                        failed[issue['id']] = ["Option " + str(option_id) + " does not exist"]
+                        continue
+                    self.record_history(issue, {field_id: {'value': value}})
+                    issue['fields'][field_id] = {'value': value}
+                    issue['updated_ts'] = time.time()
+                    processed.append(int(issue['id']))
+            invalid = len(issue_ids) - len(processed) - len(failed)
+            task_id = str(len(self.tasks) + 10000)
+            self.tasks[task_id] = {'polls': 0, 'result': {'taskId': task_id, 'status': 'COMPLETE', 'progressPercent': 100, 'processedAccessibleIssues': processed,
+                                                          'failedAccessibleIssues': failed, 'invalidOrInaccessibleIssueCount': invalid}}
+            return task_id
+
+    def poll_task(self, task_id):
+
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if not task:
+                return None
+            task['polls'] += 1
+            if task['polls'] == 1:
+                return {'taskId': task_id, 'status': 'RUNNING', 'progressPercent': 50}
+            return task['result']
+
+    def field_id(self, name):
+
+        for field in self.fields:
+            if field['name'] == name:
+                return field['id']
+        return None
+
+    def add_issue(self, fields):
+
+        project_key = (fields.get('project') or {}).get('key')
+        with self.lock:
+            project = self.projects.get(project_key)
+            if not project:
+                return None, "project " + str(project_key) + " does not exist"
+            self.next_issue_id += 1
+            project['counter'] += 1
+            issue = {'id': str(self.next_issue_id), 'key': project_key + "-" + str(project['counter']), 'fields': dict(fields), 'updated_ts': time.time(), 'created_ts': time.time(), 'histories': []}
+            issue['fields']['labels'] = issue['fields'].get('labels') or []
+            self.issues[issue['key']] = issue
+            return issue, None
+
+
+class MockJiraMetrics:
+
+    # endpoint template -> {requests, throttled, bytes_in, bytes_out}
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+
+        with self.lock:
+            self.endpoints = {}
+
+    def record(self, method, path, status, bytes_in, bytes_out):
+
+        endpoint = method + " " + endpoint_template(path)
+        with self.lock:
+            entry = self.endpoints.setdefault(endpoint, {'requests': 0, 'throttled': 0, 'bytes_in': 0, 'bytes_out': 0})
+            entry['requests'] += 1
+            entry['throttled'] += 1 if status == 429 else 0
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+
+    def snapshot(self):
+
+        with self.lock:
+            return {endpoint: dict(entry) for endpoint, entry in self.endpoints.items()}
+
+
+class RateLimiter:
+
+    # token bucket; the mock answers 429 when it is empty
+    def __init__(self, rate, burst):
+
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def headers(self):
+
+        # the rate limit headers of Jira Cloud, minus X-RateLimit-Reset
+        with self.lock:
+            tokens = self.tokens
+        headers = {'X-RateLimit-Limit': str(int(self.capacity)), 'X-RateLimit-Remaining': str(int(tokens))}
+        if tokens < 0.2 * self.capacity:
+            headers['X-RateLimit-NearLimit'] = 'true'
+        return headers
+
+
+def match_jql(issue, jql, id_field):
+
+    # the JQL subset JiraHandler sends: project =/in, Id ~, relative updated >=
+    match = re.search(r'project\s*(?:=\s*"?([A-Z0-9]+)"?|in\s*\(([^)]*)\))', jql)
+    if match:
+        keys = [match.group(1)] if match.group(1) else [k.strip().strip('"') for k in match.group(2).split(',')]
+        if issue['key'].rsplit('-', 1)[0] not in keys:
+            return False
+    match = re.search(r'"Id\[Short text\]"\s*~\s*"([^"]+)"', jql)
+    if match and match.group(1) not in (issue['fields'].get(id_field) or ""):
+        return False
+    match = re.search(r'updated\s*>=\s*"-(\d+)m"', jql)
+    if match and issue['updated_ts'] < time.time() - int(match.group(1)) * 60:
+        return False
+    return True
+
+
+class MockJiraHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would add ~40ms per response
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def reply(self, status, data=None, headers=None):
+
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        # recorded before answering, so the request counts of an action are
+        # complete as soon as the client has its last response
+        self.mock.metrics.record(self.command, self.route_path, status, len(self.body), len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.mock.limiter:
+            headers = dict(self.mock.limiter.headers(), **(headers or {}))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_method(self):
+
+        url = urllib.parse.urlparse(self.path)
+        self.route_path = url.path
+        self.query = urllib.parse.parse_qs(url.query)
+        payload = self.read_body()
+        config = self.mock.config
+
+        if config.latency:
+            time.sleep(config.latency)
+        if self.mock.is_throttled():
+            return self.reply(429, {'errorMessages': ["Rate limit exceeded."]}, {'Retry-After': str(config.retry_after)})
+        try:
+            self.route(self.command, url.path, payload)
+        except Exception as ex:
+            self.reply(500, {'errorMessages': [str(ex)]})
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+    def route(self, method, path, payload):
+
+        state = self.mock.state
+        query = self.query
+
+        if path == '/rest/api/2/issue/createmeta':
+            return self.reply(200, {'projects': []})
+
+        if path == '/rest/api/3/field':
+            if method == 'GET':
+                return self.reply(200, state.fields)
+            return self.reply(201, state.add_field(payload['name'], payload.get('type')))
+
+        match = re.match(r'^/rest/globalconfig/1/customfieldoptions/(customfield_\d+)$', path)
+        if match and method == 'POST':
+            state.add_options(match.group(1), [option['name'] for option in payload])
+            return self.reply(204)
+
+        # every field has one global context, numbered after the field
+        match = re.match(r'^/rest/api/3/field/(customfield_(\d+))/context$', path)
+        if match and method == 'GET':
+            return self.reply(200, {'values': [{'id': str(int(match.group(2)) + 10000), 'name': "Default Configuration Scheme", 'isGlobalContext': True}], 'startAt': 0, 'total': 1, 'isLast': True})
+
+        match = re.match(r'^/rest/api/3/field/(customfield_\d+)/context/\d+/option$', path)
+        if match:
+            if method == 'GET':
+                options = state.options.get(match.group(1), [])
+                start = int(query.get('startAt', ['0'])[0])
+                count = min(100, int(query.get('maxResults', ['100'])[0]))
+                page = options[start:start + count]
+                return self.reply(200, {'values': page, 'startAt': start, 'maxResults': count, 'total': len(options), 'isLast': start + count >= len(options)})
+            if len(payload['options']) > 1000:
+                return self.reply(400, {'errorMessages': ["At most 1000 options per request."]})
+            if method == 'POST':
+                values = [option['value'] for option in payload['options']]
+                existing = [option['value'] for option in state.options.get(match.group(1), [])]
+                if any(value in existing for value in values):
+                    return self.reply(400, {'errorMessages': ["The option already exists."]})
+                return self.reply(200, {'options': state.add_options(match.group(1), values)})
+            if method == 'PUT':
+                return self.reply(200, {'options': state.update_options(match.group(1), payload['options'])})
+
+        if path == '/rest/simplified/latest/project' and method == 'POST':
+            if payload['key'] in state.projects:
+                return self.reply(400, {'errors': {'projectKey': "Project already exists."}})
+            project = state.add_project(payload['key'], payload['name'])
+            return self.reply(200, {'projectId': project['id'], 'projectKey': project['key']})
+
+        if path == '/rest/api/3/project/search':
+            return self.reply(200, {'values': [{'id': p['id'], 'key': p['key'], 'name': p['name']} for p in state.projects.values()], 'isLast': True})
+
+        match = re.match(r'^/rest/api/3/project/([A-Z][A-Z0-9]*)$', path)
+        if match and method == 'GET':
+            project = state.projects.get(match.group(1))
+            if not project:
+                return self.reply(404, {'errorMessages': ["No project could be found with key '" + match.group(1) + "'."]})
+            return self.reply(200, {'id': project['id'], 'key': project['key'], 'name': project['name']})
+
+        if re.match(r'^/rest/api/2/project/[^/]+/properties/', path) or path.startswith('/rest/issuedetailslayout/'):
+            return self.reply(200, {})
+
+        if path == '/rest/api/3/issuetypescreenscheme/project/':
+            project_id = query.get('projectId', [''])[0]
+            return self.reply(200, {'values': [{'issueTypeScreenScheme': {'id': str(int(project_id) + 1000)}, 'projectIds': [project_id]}]})
+
+        if path in ('/rest/api/2/issuetypescreenscheme/mapping', '/rest/api/3/issuetypescreenscheme/mapping'):
+            scheme_id = query.get('issueTypeScreenSchemeId', ['0'])[0]
+            return self.reply(200, {'values': [{'issueTypeScreenSchemeId': scheme_id, 'issueTypeId': 'default', 'screenSchemeId': str(int(scheme_id) + 1000)}]})
+
+        if path == '/rest/api/2/screenscheme':
+            scheme_id = query.get('id', ['0'])[0]
+            return self.reply(200, {'values': [{'id': int(scheme_id), 'screens': {'default': int(scheme_id) + 1000}}]})
+
+        if path == '/rest/api/3/screens' and method == 'GET':
+            return self.reply(200, {'values': [{'id': int(p['id']) + 3000, 'name': p['key'] + ": Default Issue Screen"} for p in state.projects.values()]})
+
+        match = re.match(r'^/rest/api/3/screens/(\d+)/tabs(/\d+/fields)?$', path)
+        if match:
+            if match.group(2):
+                return self.reply(200, {'id': payload['fieldId']})
+            return self.reply(200, [{'id': int(match.group(1)) + 1000, 'name': "Field Tab"}])
+
+        if path == '/rest/api/3/bulk/issues/fields' and method == 'POST':
+            issue_ids = [str(issue_id) for issue_id in payload.get('selectedIssueIdsOrKeys', [])]
+            if len(issue_ids) > 1000:
+                return self.reply(400, {'errorMessages': ["Bulk edit accepts at most 1000 issues."]})
+            selects = payload.get('editedFieldsInput', {}).get('singleSelectCustomFields', [])
+            if len(selects) != 1:
+                return self.reply(400, {'errorMessages': ["The mock only bulk edits one single select field."]})
+            task_id = state.bulk_edit(issue_ids, selects[0]['fieldId'], str(selects[0]['option']['optionId']))
+            return self.reply(201, {'taskId': task_id})
+
+        match = re.match(r'^/rest/api/3/bulk/queue/(\d+)$', path)
+        if match:
+            task = state.poll_task(match.group(1))
+            if not task:
+                return self.reply(404, {'errorMessages': ["Task does not exist"]})
+            return self.reply(200, task)
+
+        if path == '/rest/api/2/issue' and method == 'POST':
+            issue, error = state.add_issue(payload['fields'])
+            if not issue:
+                return self.reply(400, {'errorMessages': [error], 'errors': {}})
+            return self.reply(201, {'id': issue['id'], 'key': issue['key'], 'self': self.mock.url + '/rest/api/2/issue/' + issue['id']})
+
+        if path == '/rest/api/2/issue/bulk' and method == 'POST':
+            updates = payload.get('issueUpdates', [])
+            if len(updates) > 50:
+                return self.reply(400, {'errorMessages': ["Bulk create accepts at most 50 issues."]})
+            issues, errors = [], []
+            for i, update in enumerate(updates):
+                issue, error = state.add_issue(update['fields'])
+                if issue:
+                    issues.append({'id': issue['id'], 'key': issue['key'], 'self': self.mock.url + '/rest/api/2/issue/' + issue['id']})
+                else:
+                    errors.append({'status': 400, 'elementErrors': {'errorMessages': [error], 'errors': {}}, 'failedElementNumber': i})
+            return self.reply(201, {'issues': issues, 'errors': errors})
+
+        match = re.match(r'^/rest/api/2/issue/([A-Z][A-Z0-9]*-\d+)(/transitions)?$', path)
+        if match:
+            issue = state.issues.get(match.group(1))
+            if not issue:
+                return self.reply(404, {'errorMessages': ["Issue does not exist"]})
+            if match.group(2):
+                if method == 'GET':
+                    return self.reply(200, {'transitions': [{'id': '11', 'name': "To Do"}, {'id': '21', 'name': "In Progress"}, {'id': '31', 'name': "Done"}]})
+                return self.reply(204)
+            if method == 'PUT':
+                with state.lock:
+                    state.record_history(issue, payload.get('fields', {}))
+                    issue['fields'].update(payload.get('fields', {}))
+                    for operation in payload.get('update', {}).get('labels', []):
+                        if 'add' in operation and operation['add'] not in issue['fields']['labels']:
+                            issue['fields']['labels'].append(operation['add'])
+                        if 'remove' in operation and operation['remove'] in issue['fields']['labels']:
+                            issue['fields']['labels'].remove(operation['remove'])
+                    issue['updated_ts'] = time.time()
+                return self.reply(204)
+            return self.reply(200, self.render_issue(issue, None))
+
+        if path in ('/rest/api/2/search', '/rest/api/3/search'):
+            jql = query.get('jql', [''])[0]
+            start = int(query.get('startAt', ['0'])[0])
+            max_results = min(int(query.get('maxResults', ['50'])[0]), self.mock.config.page_size)
+            fields = query.get('fields', [''])[0].split(',') if query.get('fields') else None
+            id_field = state.field_id('Id')
+            with state.lock:
+                hits = [issue for issue in state.issues.values() if match_jql(issue, jql, id_field)]
+            hits.sort(key=lambda issue: int(issue['id']))
+            expand = query.get('expand', [''])[0].split(',')
+            return self.reply(200, {'startAt': start, 'maxResults': max_results, 'total': len(hits), 'issues': [self.render_issue(issue, fields, 'changelog' in expand) for issue in hits[start:start + max_results]]})
+
+        match = re.match(r'^/rest/api/3/issue/(\d+)/changelog$', path)
+        if match:
+            issue = next((issue for issue in state.issues.values() if issue['id'] == match.group(1)), None)
+            if not issue:
+                return self.reply(404, {'errorMessages': ["Issue does not exist"]})
+            start = int(query.get('startAt', ['0'])[0])
+            max_results = min(int(query.get('maxResults', ['50'])[0]), 100)
+            values = issue['histories'][start:start + max_results]
+            return self.reply(200, {'startAt': start, 'maxResults': max_results, 'total': len(issue['histories']), 'isLast': start + len(values) >= len(issue['histories']), 'values': values})
+
+        return self.reply(404, {'errorMessages': ["Not implemented by the mock: " + method + " " + path]})
+
+    def render_issue(self, issue, fields, changelog=False):
+
+        data = dict(issue['fields'])
+        data['updated'] = format_time(issue['updated_ts'])
+        data['created'] = format_time(issue['created_ts'])
+        if fields:
+            data = {name: data.get(name) for name in fields}
+        rendered = {'id': issue['id'], 'key': issue['key'], 'fields': data}
+        if changelog:
+            # like Jira, the search only embeds the latest CHANGELOG_SEARCH_LIMIT histories
+            histories = issue['histories'][-CHANGELOG_SEARCH_LIMIT:]
+            rendered['changelog'] = {'startAt': 0, 'maxResults': len(histories), 'total': len(issue['histories']), 'histories': histories}
+        return rendered
+
+
+class MockJira:
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+
+        self.config = config or MockJiraConfig()
+        self.state = MockJiraState()
+        self.metrics = MockJiraMetrics()
+        self.limiter = RateLimiter(self.config.rate_limit, self.config.burst) if self.config.rate_limit else None
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+        handler = type('BoundMockJiraHandler', (MockJiraHandler,), {'mock': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = "http://" + host + ":" + str(self.server.server_port)
+        self.thread = None
+
+    def is_throttled(self):
+
+        with self.count_lock:
+            self.request_count += 1
+            count = self.request_count
+        if self.config.fail_every and count % self.config.fail_every == 0:
+            return True
+        return self.limiter is not None and not self.limiter.acquire()
+
+    def start(self):
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description='Local mock of the Jira Cloud endpoints used by attack2jira')
+    parser.add_argument('-port', type=int, default=8089)
+    parser.add_argument('-latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('-page-size', dest='page_size', type=int, default=100, help='Max issues per search page.')
+    parser.add_argument('-rate-limit', dest='rate_limit', type=float, default=0, help='Requests per second before answering 429.')
+    parser.add_argument('-retry-after', dest='retry_after', type=int, default=1, help='Retry-After seconds of 429 responses.')
+    parser.add_argument('-fail-every', dest='fail_every', type=int, default=0, help='Answer 429 to every Nth request.')
+    options = parser.parse_args()
+    mock = MockJira(MockJiraConfig(options.latency, options.page_size, options.rate_limit, None, options.retry_after, options.fail_every), port=options.port)
+    print("[*] Mock Jira listening on " + mock.url)
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[!] Exiting mock Jira")
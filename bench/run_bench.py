@@ -0,0 +1,162 @@
+import os, sys, io, json, time, argparse, tempfile, contextlib, logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attack2jira import Attack2Jira
+from lib.attackdata import AttackKnowledgeBase
+from bench.mockjira import MockJira, MockJiraConfig
+from bench.fixtures import write_bundle
+
+# Runs initialize, update (-update with a newer ATT&CK release), sync and export
+# against a local mock Jira and a fixed ATT&CK fixture, recording wall time,
+# requests per endpoint and bytes transferred for each action. With -baseline,
+# any action or endpoint making more requests than the baseline fails the run.
+#
+#   python3 bench/run_bench.py -latency 0.02 -bulk -baseline bench/baseline.json
+
+PROJECT = "Mitre Attack Framework"
+KEY = "ATTACK"
+
+
+def run_actions(mock, bundle_v1, bundle_v2, options, workdir):
+
+    knowledge_bases = {version: AttackKnowledgeBase(path) for version, path in (('1.0', bundle_v1), ('2.0', bundle_v2))}
+    for knowledge_base in knowledge_bases.values():
+        with contextlib.redirect_stdout(io.StringIO()):
+            knowledge_base.load()
+
+    # every action builds its own Attack2Jira, like a separate run of the tool
+    def new_run(version):
+        return Attack2Jira(mock.url, "bench@example.com", "token", concurrency=options.concurrency, knowledge_base=knowledge_bases[version])
+
+    # -update and sync first bring the custom field options up to date, as the CLI does
+    def update(run):
+        run.sync_custom_field_options()
+        run.create_attack_issues(KEY, options.bulk, options.concurrency)
+
+    def sync(run):
+        run.sync_custom_field_options()
+        run.sync_attack_techniques(KEY, options.bulk, options.concurrency)
+
+    actions = [
+        ('initialize', lambda: new_run('1.0').set_up_jira_automated(PROJECT, KEY, options.bulk, options.concurrency)),
+        ('update', lambda: update(new_run('2.0'))),
+        ('sync', lambda: sync(new_run('2.0'))),
+        ('export', lambda: new_run('2.0').generate_json_layer(False, KEY, output=os.path.join(workdir, 'attack2jira.json'))),
+    ]
+    results = {}
+    for name, run in actions:
+        mock.metrics.reset()
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if options.verbose else output):
+            run()
+        elapsed = time.perf_counter() - start
+        endpoints = mock.metrics.snapshot()
+        results[name] = {
+            'seconds': round(elapsed, 3),
+            'requests': sum(e['requests'] for e in endpoints.values()),
+            'throttled': sum(e['throttled'] for e in endpoints.values()),
+            'bytes_in': sum(e['bytes_in'] for e in endpoints.values()),
+            'bytes_out': sum(e['bytes_out'] for e in endpoints.values()),
+            'endpoints': endpoints,
+        }
+    return results
+
+
+def print_results(results):
+
+    print("[*] Results:")
+    print("\t" + "action".ljust(12) + "time(s)".rjust(9) + "requests".rjust(10) + "429s".rjust(7) + "sent(KB)".rjust(11) + "recv(KB)".rjust(11))
+    for name, result in results.items():
+        print("\t" + name.ljust(12) + ("%.2f" % result['seconds']).rjust(9) + str(result['requests']).rjust(10) + str(result['throttled']).rjust(7)
+              + ("%.1f" % (result['bytes_in'] / 1024.0)).rjust(11) + ("%.1f" % (result['bytes_out'] / 1024.0)).rjust(11))
+        for endpoint in sorted(result['endpoints']):
+            print("\t\t" + endpoint.ljust(70) + str(result['endpoints'][endpoint]['requests']).rjust(6))
+
+
+def get_baseline_options(options):
+
+    # request counts only compare between runs with the same shape
+    return {'bulk': options.bulk, 'concurrency': options.concurrency, 'page_size': options.page_size, 'techniques': options.techniques}
+
+
+def compare_to_baseline(results, baseline):
+
+    # only request counts are compared, timings depend too much on the machine;
+    # retries of throttled requests are left out so -rate-limit runs compare too
+    regressions = []
+    for name, result in results.items():
+        expected = baseline['actions'].get(name)
+        if not expected:
+            continue
+        requests = result['requests'] - result['throttled']
+        if requests > expected['requests']:
+            regressions.append(name + ": " + str(requests) + " requests, baseline " + str(expected['requests']))
+        for endpoint, entry in result['endpoints'].items():
+            allowed = expected['endpoints'].get(endpoint, 0)
+            if entry['requests'] - entry['throttled'] > allowed:
+                regressions.append(name + ": " + endpoint + " " + str(entry['requests'] - entry['throttled']) + " requests, baseline " + str(allowed))
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark attack2jira against a local mock Jira')
+    parser.add_argument('-latency', type=float, default=0.0, help='Seconds the mock adds to every response.(default=0)')
+    parser.add_argument('-page-size', dest='page_size', type=int, default=100, help='Max issues per search page.(default=100)')
+    parser.add_argument('-rate-limit', dest='rate_limit', type=float, default=0, help='Requests per second before the mock answers 429.(default=unlimited)')
+    parser.add_argument('-retry-after', dest='retry_after', type=int, default=1, help='Retry-After seconds of 429 responses.(default=1)')
+    parser.add_argument('-fail-every', dest='fail_every', type=int, default=0, help='Answer 429 to every Nth request.(default=never)')
+    parser.add_argument('-techniques', type=int, default=200, help='Techniques in the ATT&CK fixture.(default=200)')
+    parser.add_argument('-bulk', action='store_true', help='Create issues through the bulk endpoint.')
+    parser.add_argument('-concurrency', type=int, default=1, help='Issues created in parallel.(default=1)')
+    parser.add_argument('-o', dest='output', type=str, default=None, help='Write the results as JSON to this file.')
+    parser.add_argument('-baseline', type=str, default=None, help='Fail when request counts exceed this results file.')
+    parser.add_argument('-save-baseline', dest='save_baseline', type=str, default=None, help='Save the request counts as a new baseline.')
+    parser.add_argument('-verbose', action='store_true', help='Show the output of the actions.')
+    options = parser.parse_args()
+
+    if not options.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    config = MockJiraConfig(options.latency, options.page_size, options.rate_limit, None, options.retry_after, options.fail_every)
+    mock = MockJira(config).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        bundle_v1 = write_bundle(workdir, "1.0", options.techniques)
+        bundle_v2 = write_bundle(workdir, "2.0", options.techniques)
+        print("[*] Benchmarking against mock Jira " + mock.url + " (latency " + str(options.latency) + "s, page size " + str(options.page_size) + ")...")
+        try:
+            results = run_actions(mock, bundle_v1, bundle_v2, options, workdir)
+        finally:
+            mock.stop()
+
+    print_results(results)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    if options.save_baseline:
+        baseline = {
+            'options': get_baseline_options(options),
+            'actions': {name: {'requests': r['requests'] - r['throttled'], 'endpoints': {e: v['requests'] - v['throttled'] for e, v in r['endpoints'].items()}} for name, r in results.items()},
+        }
+        with open(options.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        print("[*] Baseline saved to " + options.save_baseline)
+    if options.baseline:
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['options'] != get_baseline_options(options):
+            print("[!] The baseline was recorded with " + json.dumps(baseline['options']) + ", rerun with the same options.")
+            sys.exit(1)
+        regressions = compare_to_baseline(results, baseline)
+        if regressions:
+            print("[!] Request count regressions against " + options.baseline + ":")
+            for regression in regressions:
+                print("\t[!] " + regression)
+            sys.exit(1)
+        print("[!] No request count regressions against " + options.baseline)
+
+
+if __name__ == '__main__':
+    main()
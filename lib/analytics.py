@@ -0,0 +1,195 @@
+import csv, json
+from lib.maturity import MATURITY_LEVELS
+
+# Coverage analytics for the 'analyze' action. The ATT&CK catalogue becomes dense
+# 0/1 matrices, technique x data source and technique x tactic, plus a vector of
+# maturity levels. Every report is then a matrix product or a reduction over
+# them, instead of a loop per technique. NumPy is optional: only 'analyze' needs
+# it (pip3 install numpy).
+
+
+def require_numpy():
+
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        print("[!] NumPy is required for the 'analyze' action: pip3 install numpy")
+        raise SystemExit(1)
+
+
+def build_matrices(techniques, maturity):
+
+    # techniques: Technique list; maturity: ttp_id -> {'value': level, ...} as
+    # returned by get_maturity(). Techniques without an issue count as Not Tracked.
+    np = require_numpy()
+    ttp_ids = [technique.ttp_id for technique in techniques]
+    datasources = sorted(set(ds for technique in techniques for ds in technique.datasources))
+    tactics = []
+    for technique in techniques:
+        for tactic in technique.tactics:
+            if tactic not in tactics:
+                tactics.append(tactic)
+    datasource_index = {ds: i for i, ds in enumerate(datasources)}
+    tactic_index = {tactic: i for i, tactic in enumerate(tactics)}
+
+    by_datasource = np.zeros((len(techniques), len(datasources)), dtype=np.int32)
+    by_tactic = np.zeros((len(techniques), len(tactics)), dtype=np.int32)
+    rows, columns = [], []
+    for row, technique in enumerate(techniques):
+        for ds in technique.datasources:
+            rows.append(row)
+            columns.append(datasource_index[ds])
+    by_datasource[rows, columns] = 1
+    # a technique counts towards every tactic it belongs to
+    rows, columns = [], []
+    for row, technique in enumerate(techniques):
+        for tactic in technique.tactics:
+            rows.append(row)
+            columns.append(tactic_index[tactic])
+    by_tactic[rows, columns] = 1
+
+    level_index = {level: i for i, level in enumerate(MATURITY_LEVELS)}
+    levels = np.array([level_index.get((maturity.get(ttp_id) or {}).get('value'), 0) for ttp_id in ttp_ids], dtype=np.int32)
+    return {
+        'ttp_ids': ttp_ids,
+        'datasources': datasources,
+        'tactics': tactics,
+        'by_datasource': by_datasource,
+        'by_tactic': by_tactic,
+        'levels': levels,
+        # one-hot technique x maturity level
+        'level_matrix': (levels[:, None] == np.arange(len(MATURITY_LEVELS))[None, :]).astype(np.int32),
+        'subtechnique': np.array([technique.is_subtechnique for technique in techniques], dtype=bool),
+    }
+
+
+def level_counts(row):
+    return {level: int(count) for level, count in zip(MATURITY_LEVELS, row)}
+
+
+def coverage_by_tactic(m):
+
+    # techniques, tracked techniques (any level above Not Tracked), coverage and
+    # mean maturity (0-4) per tactic, lowest coverage first
+    np = require_numpy()
+    counts = m['by_tactic'].T @ m['level_matrix']
+    totals = counts.sum(axis=1)
+    tracked = totals - counts[:, 0]
+    scores = m['by_tactic'].T @ m['levels']
+    safe_totals = np.maximum(totals, 1)
+    report = []
+    for i, tactic in enumerate(m['tactics']):
+        report.append({
+            'tactic': tactic,
+            'techniques': int(totals[i]),
+            'tracked': int(tracked[i]),
+            'coverage': round(float(tracked[i] / safe_totals[i]), 4),
+            'mean_maturity': round(float(scores[i] / safe_totals[i]), 3),
+            'levels': level_counts(counts[i]),
+        })
+    report.sort(key=lambda r: (r['coverage'], r['tactic']))
+    return report
+
+
+def datasource_lift(m):
+
+    # For each data source, the Not Tracked techniques that collecting it would
+    # let a detection start on, and how many of those have no other data source
+    # (exclusive). Highest lift first.
+    np = require_numpy()
+    not_tracked = (m['levels'] == 0).astype(np.int32)
+    sources_per_technique = m['by_datasource'].sum(axis=1)
+    lift = m['by_datasource'].T @ not_tracked
+    exclusive = m['by_datasource'].T @ (not_tracked * (sources_per_technique == 1))
+    techniques = m['by_datasource'].sum(axis=0)
+    tracked = techniques - lift
+    order = np.lexsort((-exclusive, -lift))
+    report = []
+    for i in order:
+        report.append({
+            'datasource': m['datasources'][i],
+            'not_tracked': int(lift[i]),
+            'exclusive': int(exclusive[i]),
+            'techniques': int(techniques[i]),
+            'tracked': int(tracked[i]),
+        })
+    return report
+
+
+def subtechniques_vs_parents(m):
+
+    # maturity distribution of parent techniques and of sub-techniques
+    np = require_numpy()
+    groups = np.stack([~m['subtechnique'], m['subtechnique']]).astype(np.int32)
+    counts = groups @ m['level_matrix']
+    totals = counts.sum(axis=1)
+    scores = groups @ m['levels']
+    report = []
+    for i, name in enumerate(['techniques', 'sub-techniques']):
+        total = max(int(totals[i]), 1)
+        report.append({
+            'group': name,
+            'count': int(totals[i]),
+            'tracked': int(totals[i] - counts[i][0]),
+            'coverage': round(float((totals[i] - counts[i][0]) / total), 4),
+            'mean_maturity': round(float(scores[i] / total), 3),
+            'levels': level_counts(counts[i]),
+            'distribution': {level: round(float(count / total), 4) for level, count in zip(MATURITY_LEVELS, counts[i])},
+        })
+    return report
+
+
+def analyze(techniques, maturity):
+
+    m = build_matrices(techniques, maturity)
+    tracked = int((m['levels'] > 0).sum())
+    return {
+        'summary': {
+            'techniques': len(m['ttp_ids']),
+            'datasources': len(m['datasources']),
+            'tactics': len(m['tactics']),
+            'tracked': tracked,
+            'coverage': round(tracked / max(len(m['ttp_ids']), 1), 4),
+            'levels': level_counts(m['level_matrix'].sum(axis=0)),
+        },
+        'tactics': coverage_by_tactic(m),
+        'datasources': datasource_lift(m),
+        'subtechniques': subtechniques_vs_parents(m),
+    }
+
+
+def write_reports(report, root):
+
+    # <root>.json with every report, and one CSV per report: <root>-tactics.csv, ...
+    with open(root + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    paths = [root + '.json']
+    for name in ('tactics', 'datasources', 'subtechniques'):
+        rows = report[name]
+        path = root + '-' + name + '.csv'
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            columns = [column for column in rows[0].keys() if column not in ('levels', 'distribution')] if rows else []
+            if rows and 'levels' in rows[0]:
+                columns += MATURITY_LEVELS
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([row['levels'][column] if column in MATURITY_LEVELS else row[column] for column in columns])
+        paths.append(path)
+    return paths
+
+
+def print_report(report, top=5):
+
+    summary = report['summary']
+    print("[*] " + str(summary['tracked']) + " of " + str(summary['techniques']) + " techniques tracked (" + "%.1f" % (summary['coverage'] * 100) + "%)")
+    print("[*] Lowest coverage tactics:")
+    for row in report['tactics'][:top]:
+        print("\t" + row['tactic'].ljust(28) + ("%.1f%%" % (row['coverage'] * 100)).rjust(7) + "  " + str(row['tracked']) + "/" + str(row['techniques']))
+    print("[*] Data sources lifting the most Not Tracked techniques:")
+    for row in report['datasources'][:top]:
+        print("\t" + row['datasource'].ljust(40) + str(row['not_tracked']).rjust(5) + " (" + str(row['exclusive']) + " exclusive)")
+    print("[*] Techniques vs sub-techniques:")
+    for row in report['subtechniques']:
+        print("\t" + row['group'].ljust(16) + ("%.1f%%" % (row['coverage'] * 100)).rjust(7) + "  mean maturity " + "%.2f" % row['mean_maturity'])
@@ -0,0 +1,216 @@
+import requests
+import sys, os, re, traceback
+from lib.stixstream import iter_attack_objects, iter_bundle_objects, is_retired
+
+
+class Technique:
+
+    # Compact record holding only what the Jira payloads and the exporter need,
+    # built in a single pass over a STIX attack-pattern.
+
+    __slots__ = ('ttp_id', 'name', 'description', 'url', 'tactics', 'datasources', 'is_subtechnique')
+
+    def __init__(self, ttp_id, name, description, url, tactics, datasources, is_subtechnique):
+
+        self.ttp_id = ttp_id
+        self.name = name
+        self.description = description
+        self.url = url
+        # every tactic (kill chain phase) of the technique, in STIX order
+        self.tactics = tactics
+        self.datasources = datasources
+        self.is_subtechnique = is_subtechnique
+
+    @classmethod
+    def from_stix(cls, obj):
+
+        ttp_id = url = None
+        for reference in obj.get('external_references', []):
+            if reference.get('source_name') == 'mitre-attack':
+                ttp_id = reference['external_id']
+                url = reference.get('url')
+                break
+        phases = obj.get('kill_chain_phases', [])
+        return cls(
+            ttp_id,
+            obj['name'],
+            obj.get('description', ""),
+            url,
+            tuple(phase['phase_name'] for phase in phases),
+            tuple(str(ds).title() for ds in obj.get('x_mitre_data_sources', [])),
+            obj.get('x_mitre_is_subtechnique', False),
+        )
+
+    @property
+    def tactic(self):
+        # the single-select Tactic field of the issue holds the first one
+        return self.tactics[0] if self.tactics else None
+
+    @property
+    def parent_id(self):
+        return self.ttp_id.split('.')[0] if self.is_subtechnique else None
+
+    def __repr__(self):
+        return "Technique(" + str(self.ttp_id) + ")"
+
+
+class AttackKnowledgeBase:
+
+    # Loads the STIX bundle of one ATT&CK domain (Enterprise by default) once per
+    # run and serves tactics, techniques and data sources from memory. Downloaded
+    # bundles are kept in a local cache, one file per domain and ATT&CK version,
+    # so repeat runs stay offline.
+
+    STIX_DATA_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master"
+    DOMAIN = "enterprise-attack"
+    DOMAINS = {
+        'enterprise': "enterprise-attack",
+        'mobile': "mobile-attack",
+        'ics': "ics-attack",
+    }
+    DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "attack2jira")
+
+    def __init__(self, bundle_path=None, cache_dir=None, version=None, refresh=False, domain=None):
+
+        self.domain = self.DOMAINS.get(domain, domain) or self.DOMAIN
+        self.bundle_path = bundle_path
+        self.cache_dir = cache_dir or self.DEFAULT_CACHE_DIR
+        self.version = version
+        self.refresh = refresh
+        self.loaded = False
+        self.techniques = []
+        self.tactics = []
+        # ttp_id -> 'revoked' or 'deprecated', only ids are kept for these
+        self.retired = {}
+
+    def load(self):
+
+        if self.loaded:
+            return
+        try:
+            path = self.bundle_path or self.get_cached_bundle()
+            print("[*] Loading ATT&CK's " + self.domain + " STIX bundle from " + path + "...")
+            # only techniques, tactics and the collection are kept, see stixstream
+            self.read_objects(iter_attack_objects(path, include_retired=True))
+            self.loaded = True
+            print("[!] Done! ATT&CK version " + str(self.version))
+
+        except SystemExit:
+            raise
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            print("[!] Error loading ATT&CK's STIX bundle !")
+            sys.exit(1)
+
+    def read_objects(self, objects):
+
+        for obj in objects:
+            if obj['type'] == 'attack-pattern' and is_retired(obj):
+                ttp_id = Technique.from_stix(obj).ttp_id
+                if ttp_id:
+                    self.retired[ttp_id] = 'revoked' if obj.get('revoked', False) else 'deprecated'
+            elif obj['type'] == 'attack-pattern':
+                technique = Technique.from_stix(obj)
+                if technique.ttp_id:
+                    self.techniques.append(technique)
+            elif obj['type'] == 'x-mitre-tactic':
+                self.tactics.append(obj)
+            elif obj['type'] == 'x-mitre-collection':
+                self.version = obj.get('x_mitre_version', self.version)
+
+    def get_cached_bundle(self):
+
+        # Returns the path of the cached bundle for the requested (or latest cached)
+        # version, downloading it only when missing or when a refresh finds a newer one.
+        cached = self.get_cached_versions()
+        version = self.version
+        if version is None and self.refresh:
+            version = self.get_latest_version()
+        if version is None and cached:
+            version = cached[-1]
+
+        if version is not None and version in cached:
+            self.version = version
+            return self.get_cache_path(version)
+        return self.download_bundle(version)
+
+    def get_cache_path(self, version):
+        return os.path.join(self.cache_dir, self.domain + "-" + version + ".json")
+
+    def get_cached_versions(self):
+
+        if not os.path.isdir(self.cache_dir):
+            return []
+        pattern = re.compile("^" + re.escape(self.domain) + r"-(\d+(?:\.\d+)*)\.json$")
+        versions = []
+        for name in os.listdir(self.cache_dir):
+            match = pattern.match(name)
+            if match:
+                versions.append(match.group(1))
+        return sorted(versions, key=lambda v: [int(n) for n in v.split('.')])
+
+    def get_latest_version(self):
+
+        # index.json lists every released version of each ATT&CK domain
+        print("[*] Checking the latest ATT&CK version...")
+        r = requests.get(self.STIX_DATA_URL + "/index.json", timeout=60)
+        r.raise_for_status()
+        domain_name = self.domain.split('-')[0]
+        for collection in r.json()['collections']:
+            if collection['name'].lower().startswith(domain_name):
+                versions = [v['version'] for v in collection['versions']]
+                return max(versions, key=lambda v: [int(n) for n in v.split('.')])
+        return None
+
+    def download_bundle(self, version):
+
+        if version:
+            url = self.STIX_DATA_URL + "/" + self.domain + "/" + self.domain + "-" + version + ".json"
+        else:
+            url = self.STIX_DATA_URL + "/" + self.domain + "/" + self.domain + ".json"
+        print("[*] Downloading ATT&CK's STIX bundle from " + url + "...")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, self.domain + ".json.part")
+
+        with requests.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+
+        if not version:
+            version = self.read_bundle_version(tmp_path)
+        path = self.get_cache_path(version)
+        os.replace(tmp_path, path)
+        self.version = version
+        return path
+
+    def read_bundle_version(self, path):
+
+        for obj in iter_bundle_objects(path):
+            if obj['type'] == 'x-mitre-collection':
+                return obj['x_mitre_version']
+        raise ValueError("No x-mitre-collection object found in " + path)
+
+    def get_techniques(self):
+        self.load()
+        return self.techniques
+
+    def get_retired(self):
+
+        # an id can be revoked in one object and live in another; the live one wins
+        self.load()
+        live = set(technique.ttp_id for technique in self.techniques)
+        return {ttp_id: status for ttp_id, status in self.retired.items() if ttp_id not in live}
+
+    def get_tactics(self):
+        self.load()
+        return self.tactics
+
+    def get_datasources(self):
+
+        self.load()
+        datasources = set()
+        for technique in self.techniques:
+            datasources.update(technique.datasources)
+        return sorted(datasources)
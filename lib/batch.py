@@ -0,0 +1,92 @@
+import os, json, time, threading, traceback, sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+# Runs one action against many Jira instances/projects described in an inventory:
+#
+#   defaults:
+#     action: export
+#   targets:
+#     - name: bu1
+#       url: https://bu1.atlassian.net
+#       user: soc@bu1.com
+#       token_env: BU1_JIRA_TOKEN
+#       project: Mitre Attack Framework
+#       key: ATTACK
+#
+# YAML inventories need PyYAML, JSON ones work with the standard library.
+
+REQUIRED_KEYS = ('url', 'user', 'token_env')
+
+
+def load_inventory(path):
+
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                print("[!] PyYAML is required for YAML inventories: pip3 install pyyaml")
+                sys.exit(1)
+            inventory = yaml.safe_load(f)
+        else:
+            inventory = json.load(f)
+
+    defaults = inventory.get('defaults', {})
+    targets = []
+    for i, entry in enumerate(inventory.get('targets', [])):
+        target = dict(defaults)
+        target.update(entry)
+        missing = [k for k in REQUIRED_KEYS if not target.get(k)]
+        if missing:
+            print("[!] Inventory target #" + str(i + 1) + " is missing: " + ", ".join(missing))
+            sys.exit(1)
+        target.setdefault('name', target.get('key', 'ATTACK') + "@" + urllib.parse.urlparse(target['url']).netloc)
+        targets.append(target)
+    return targets
+
+
+def run_batch(targets, run_target, max_workers=4, per_host=1):
+
+    # run_target(target, token) does the work for one target. Targets run in
+    # parallel, at most `per_host` at a time against the same Jira host.
+    host_locks = {}
+    for target in targets:
+        host = urllib.parse.urlparse(target['url']).netloc
+        host_locks.setdefault(host, threading.BoundedSemaphore(per_host))
+
+    def run(target):
+        result = {'name': target['name'], 'url': target['url'], 'key': target.get('key'), 'action': target.get('action'), 'status': 'failed', 'error': None, 'elapsed': 0.0}
+        token = os.environ.get(target['token_env'])
+        if not token:
+            result['error'] = "environment variable " + target['token_env'] + " is not set"
+            return result
+        with host_locks[urllib.parse.urlparse(target['url']).netloc]:
+            start = time.time()
+            try:
+                run_target(target, token)
+                result['status'] = 'ok'
+            except SystemExit as ex:
+                # JiraHandler exits on fatal API errors, keep the other targets going
+                result['error'] = "exited with status " + str(ex.code)
+            except Exception as ex:
+                traceback.print_exc(file=sys.stdout)
+                result['error'] = str(ex)
+            result['elapsed'] = time.time() - start
+        logging.info(f"Batch target {result['name']} finished: {result['status']}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(run, targets))
+
+
+def print_batch_summary(results):
+
+    print("[*] Batch summary:")
+    width = max([len(r['name']) for r in results] + [6])
+    print("\t" + "target".ljust(width) + "  action      status  time(s)  error")
+    for r in results:
+        print("\t" + r['name'].ljust(width) + "  " + str(r['action']).ljust(10) + "  " + r['status'].ljust(6) + "  " + ("%.1f" % r['elapsed']).rjust(7) + "  " + (r['error'] or ""))
+    failed = len([r for r in results if r['status'] != 'ok'])
+    print("[!] " + str(len(results) - failed) + " targets succeeded, " + str(failed) + " failed.")
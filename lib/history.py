@@ -0,0 +1,281 @@
+import array, csv, json, sqlite3, threading, time
+from datetime import datetime, timezone
+from lib.maturity import MATURITY_LEVELS
+
+# Maturity history of the tracked projects, kept in a local SQLite file whose
+# rows are keyed by Jira instance and project. Each project has a technique
+# index: ttp_ids in the order they were first seen, which never changes. A
+# snapshot is then one byte per technique of that index, the position of its
+# maturity in MATURITY_LEVELS (or ABSENT when it had no issue yet), so every
+# export only appends a few hundred bytes. Delta layers and trend reports are computed from it without Jira.
+
+ABSENT = 255
+PERIODS = ('month', 'quarter', 'year')
+
+
+def parse_jira_time(value):
+
+    # '2024-03-01T10:15:30.000+0000' -> epoch seconds
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z').timestamp()
+
+
+def parse_date(value):
+
+    # -since accepts a date or a date and time, taken as UTC
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_time(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+
+
+def level_code(value):
+    return MATURITY_LEVELS.index(value) if value in MATURITY_LEVELS else 0
+
+
+def period_label(ts, period):
+
+    day = time.gmtime(ts)
+    if period == 'month':
+        return "%04d-%02d" % (day.tm_year, day.tm_mon)
+    if period == 'quarter':
+        return "%04d-Q%d" % (day.tm_year, (day.tm_mon - 1) // 3 + 1)
+    return "%04d" % day.tm_year
+
+
+def next_period(ts, period):
+
+    # start of the period following the one ts falls in
+    day = time.gmtime(ts)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[period]
+    first = (day.tm_mon - 1) // months * months
+    year, month = day.tm_year + (first + months) // 12, (first + months) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc).timestamp()
+
+
+class MaturityHistory:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS techniques (
+            instance TEXT NOT NULL,
+            project TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            ttp_id TEXT NOT NULL,
+            PRIMARY KEY (instance, project, position),
+            UNIQUE (instance, project, ttp_id)
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            instance TEXT NOT NULL,
+            project TEXT NOT NULL,
+            taken_at REAL NOT NULL,
+            source TEXT NOT NULL,
+            codes BLOB NOT NULL,
+            PRIMARY KEY (instance, project, taken_at)
+        );
+    """
+
+    def __init__(self, path, instance):
+
+        self.path = path
+        self.instance = instance
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()):
+
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def get_technique_ids(self, project):
+        return [row[0] for row in self.query("SELECT ttp_id FROM techniques WHERE instance = ? AND project = ? ORDER BY position", (self.instance, project))]
+
+    def encode(self, project, levels):
+
+        # levels: ttp_id -> maturity value. Unknown ttp_ids are appended to the
+        # index first; techniques missing from levels are ABSENT.
+        ttp_ids = self.get_technique_ids(project)
+        known = set(ttp_ids)
+        added = sorted(ttp_id for ttp_id in levels if ttp_id not in known)
+        if added:
+            with self.lock:
+                self.db.executemany("INSERT INTO techniques VALUES (?, ?, ?, ?)", [(self.instance, project, len(ttp_ids) + i, ttp_id) for i, ttp_id in enumerate(added)])
+                self.db.commit()
+            ttp_ids += added
+        return array.array('B', [level_code(levels[ttp_id]) if ttp_id in levels else ABSENT for ttp_id in ttp_ids])
+
+    def decode(self, project, codes, ttp_ids=None):
+
+        # -> ttp_id -> maturity value, without the ABSENT techniques
+        ttp_ids = ttp_ids if ttp_ids is not None else self.get_technique_ids(project)
+        return {ttp_id: MATURITY_LEVELS[code] for ttp_id, code in zip(ttp_ids, codes) if code != ABSENT}
+
+    def latest_codes(self, project):
+
+        rows = self.query("SELECT codes FROM snapshots WHERE instance = ? AND project = ? ORDER BY taken_at DESC LIMIT 1", (self.instance, project))
+        return array.array('B', rows[0][0]) if rows else None
+
+    def append(self, project, items, taken_at=None, source='export'):
+
+        # items: ttp_id -> {value, ...} as exported. A snapshot identical to the
+        # previous one is not stored again: the latest snapshot taken before a
+        # date is the state at that date. Returns False when nothing changed.
+        codes = self.encode(project, {ttp_id: item['value'] for ttp_id, item in items.items()})
+        latest = self.latest_codes(project)
+        if latest is not None and latest.tobytes() == codes.tobytes()[:len(latest)] and all(code == ABSENT for code in codes[len(latest):]):
+            return False
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", (self.instance, project, taken_at or time.time(), source, codes.tobytes()))
+            self.db.commit()
+        return True
+
+    def backfill(self, project, changelog):
+
+        # Rebuilds the snapshots preceding the first exported one from the
+        # Maturity changelog of every issue (see JiraHandler.get_maturity_changelog):
+        # one snapshot per day with a change, as of the last change of that day
+        # made before the first export. A previous backfill of the project is
+        # replaced.
+        events = []
+        for ttp_id, issue in changelog.items():
+            changes = sorted(issue['changes'])
+            initial = changes[0][1] if changes else issue['value']
+            events.append((issue['created'], ttp_id, initial or 'Not Tracked'))
+            events += [(changed_at, ttp_id, to_value or 'Not Tracked') for changed_at, _, to_value in changes]
+        events.sort()
+
+        rows = self.query("SELECT MIN(taken_at) FROM snapshots WHERE instance = ? AND project = ? AND source != 'backfill'", (self.instance, project))
+        first_export = rows[0][0] if rows and rows[0][0] is not None else None
+        levels, snapshots = {}, []
+        if first_export is not None:
+            events = [event for event in events if event[0] < first_export]
+        for i, (changed_at, ttp_id, value) in enumerate(events):
+            levels[ttp_id] = value
+            last_of_day = i + 1 == len(events) or time.gmtime(events[i + 1][0])[:3] != time.gmtime(changed_at)[:3]
+            if last_of_day:
+                snapshots.append((changed_at, self.encode(project, levels)))
+
+        with self.lock:
+            self.db.execute("DELETE FROM snapshots WHERE instance = ? AND project = ? AND source = 'backfill'", (self.instance, project))
+            self.db.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, 'backfill', ?)", [(self.instance, project, taken_at, codes.tobytes()) for taken_at, codes in snapshots])
+            self.db.commit()
+        return len(snapshots)
+
+    def get_series(self, project):
+
+        # [(taken_at, codes)] oldest first; codes are padded to the current index
+        ttp_ids = self.get_technique_ids(project)
+        series = []
+        for taken_at, blob in self.query("SELECT taken_at, codes FROM snapshots WHERE instance = ? AND project = ? ORDER BY taken_at", (self.instance, project)):
+            codes = array.array('B', blob)
+            codes.extend([ABSENT] * (len(ttp_ids) - len(codes)))
+            series.append((taken_at, codes))
+        return ttp_ids, series
+
+
+def state_at(series, ts):
+
+    # codes of the latest snapshot taken at or before ts, None before the first one
+    state = None
+    for taken_at, codes in series:
+        if taken_at > ts:
+            break
+        state = (taken_at, codes)
+    return state
+
+
+def summarize(codes):
+
+    present = [code for code in codes if code != ABSENT]
+    counts = [present.count(level) for level in range(len(MATURITY_LEVELS))]
+    tracked = len(present) - counts[0]
+    return {
+        'techniques': len(present),
+        'tracked': tracked,
+        'coverage': round(tracked / max(len(present), 1), 4),
+        'mean_maturity': round(sum(present) / max(len(present), 1), 3),
+        'levels': dict(zip(MATURITY_LEVELS, counts)),
+    }
+
+
+def compare(before, after):
+
+    # improved / regressed technique positions; no issue counts as Not Tracked
+    improved, regressed = [], []
+    for position, code in enumerate(after):
+        previous = before[position] if before is not None and position < len(before) else ABSENT
+        previous = 0 if previous == ABSENT else previous
+        code = 0 if code == ABSENT else code
+        if code > previous:
+            improved.append(position)
+        elif code < previous:
+            regressed.append(position)
+    return improved, regressed
+
+
+def compute_trend(series, period='quarter', now=None):
+
+    # One row per period from the first snapshot to now: the state at the end
+    # of the period and the techniques that improved or regressed during it.
+    if not series:
+        return []
+    now = now or time.time()
+    rows = []
+    previous = None
+    start = series[0][0]
+    while start <= now:
+        end = next_period(start, period)
+        taken_at, codes = state_at(series, min(end, now + 1) - 0.001)
+        improved, regressed = compare(previous, codes)
+        row = {'period': period_label(start, period), 'as_of': format_time(taken_at)}
+        row.update(summarize(codes))
+        row['improved'] = len(improved)
+        row['regressed'] = len(regressed)
+        rows.append(row)
+        previous = codes
+        start = end
+    return rows
+
+
+def compute_delta(ttp_ids, series, since):
+
+    # ttp_id -> {'from': level, 'to': level} of the techniques whose maturity is
+    # higher in the latest snapshot than it was at `since`
+    if not series:
+        return {}
+    before = state_at(series, since)
+    latest = series[-1][1]
+    improved, _ = compare(before[1] if before else None, latest)
+    delta = {}
+    for position in improved:
+        previous = before[1][position] if before and before[1][position] != ABSENT else 0
+        delta[ttp_ids[position]] = {'from': MATURITY_LEVELS[previous], 'to': MATURITY_LEVELS[latest[position]]}
+    return delta
+
+
+def write_trend(rows, root):
+
+    # <root>.json and <root>.csv
+    with open(root + '.json', 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=4)
+    with open(root + '.csv', 'w', encoding='utf-8', newline='') as f:
+        columns = [column for column in rows[0].keys() if column != 'levels'] + MATURITY_LEVELS if rows else []
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row['levels'][column] if column in MATURITY_LEVELS else row[column] for column in columns])
+    return [root + '.json', root + '.csv']
+
+
+def print_trend(rows):
+
+    for row in rows:
+        print("\t" + row['period'].ljust(9) + ("%.1f%%" % (row['coverage'] * 100)).rjust(7) + "  " + str(row['tracked']) + "/" + str(row['techniques'])
+              + "  mean maturity " + "%.2f" % row['mean_maturity'] + "  +" + str(row['improved']) + " -" + str(row['regressed']))
@@ -1,9 +1,10 @@
-from attackcti import attack_client
-import requests
-import sys, traceback, json, re
+from lib.transport import JiraTransport
+from lib.history import parse_jira_time
+from lib.maturity import MATURITY_LEVELS
+import sys, os, traceback, json, re, time, threading
 import urllib3
-import urllib.parse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging to output to both stdout and a file.
 logging.basicConfig(
@@ -22,17 +23,51 @@ class JiraHandler:
     apitoken=""
     url=""
 
-    def __init__(self, url, username, password):
-
+    # maximum number of issues accepted by /rest/api/2/issue/bulk
+    BULK_CREATE_SIZE = 50
+    # maximum page size honored by /rest/api/3/search
+    SEARCH_PAGE_SIZE = 100
+    # pages of a search fetched at the same time
+    SEARCH_CONCURRENCY = 8
+    # screen topology GETs sent at the same time
+    SCREEN_CONCURRENCY = 8
+    # custom fields created and used by attack2jira
+    CUSTOM_FIELD_NAMES = ['Tactic','Maturity','Url','Datasources','Id','Sub-Technique of']
+    # the select fields among them, whose options attack2jira manages
+    OPTION_FIELD_NAMES = ['Maturity', 'Tactic', 'Datasources']
+    # options read / created per request by the field context option endpoints
+    FIELD_OPTIONS_PAGE_SIZE = 100
+    FIELD_OPTIONS_CREATE_SIZE = 1000
+    # serializes the read-modify-write of the field cache file, which the
+    # targets of a -batch run share
+    FIELD_CACHE_LOCK = threading.Lock()
+    # issues per bulk edit task, and seconds between polls of the tasks
+    BULK_EDIT_SIZE = 1000
+    BULK_EDIT_POLL_INTERVAL = 1.0
+    BULK_EDIT_TIMEOUT = 600
+    # options of the Maturity field, lowest to highest
+    MATURITY_OPTIONS = MATURITY_LEVELS
+
+    def __init__(self, url, username, password, field_cache=None, pool_size=10, metrics=None):
+
+        # custom field ids are looked up once and reused; field_cache optionally
+        # persists them to disk, keyed by instance url, across runs.
+        self.custom_fields = None
+        # project key -> screen topology, see get_screen_topology()
+        self.screen_topologies = {}
+        self.field_cache = field_cache
+        self.pool_size = pool_size
+        self.metrics = metrics
         self.login(url, username, password)
 
     def login(self, url, username, apitoken):
 
-        headers = {'Content-Type': 'application/json'}
+        # every request goes through this transport so connections are reused
+        self.transport = JiraTransport(url, username, apitoken, pool_size=self.pool_size, metrics=self.metrics)
 
         try:
             print("[*] Authenticating to " + url + "...")
-            r = requests.get(url + '/rest/api/2/issue/createmeta', headers=headers,auth=(username,apitoken), verify=False)
+            r = self.transport.request('GET', '/rest/api/2/issue/createmeta')
 
             if r.status_code == 200:
                 self.username=username
@@ -54,7 +89,6 @@ class JiraHandler:
         #https://developer.atlassian.com/cloud/jira/platform/rest/v3/#api-rest-api-3-project-post -> this did not work for me.
         #found this endpoint using chrome dev tools.
         print("[*] Creating the Att&ck project...")
-        headers = {'Content-Type': 'application/json'}
 
         project_dict = {
             'key': key,
@@ -62,7 +96,7 @@ class JiraHandler:
             'templateKey': "com.pyxis.greenhopper.jira:gh-simplified-basic",
         }
         try:
-            r = requests.post(self.url + '/rest/simplified/latest/project', json=project_dict, headers=headers, auth=(self.username, self.apitoken), verify=False)
+            r = self.transport.request('POST', '/rest/simplified/latest/project', json=project_dict)
             if r.status_code == 200:
                 print("[!] Success!")
 
@@ -84,7 +118,6 @@ class JiraHandler:
         # avoid creating the custom fields more than once
         if not self.do_custom_fields_exist():
             print("[*] Creating custom fields ...")
-            headers = {'Content-Type': 'application/json'}
             try:
 
                 custom_fields=[]
@@ -137,8 +170,7 @@ class JiraHandler:
                 custom_fields.append(custom_field6_dict)
 
                 for custom_field in custom_fields:
-                    r = requests.post(self.url + '/rest/api/3/field', json=custom_field, headers=headers, auth=(self.username, self.apitoken), verify=False)
-
+                    r = self.transport.request('POST', '/rest/api/3/field', json=custom_field)
                     if r.status_code == 201:
                         print("\t [!] Successfully created \'"+custom_field['name']+"\' custom field.")
 
@@ -150,6 +182,7 @@ class JiraHandler:
                         print ("[!] Error creating custom fields")
                         sys.exit(1)
 
+                self.invalidate_custom_fields()
 
             except Exception as ex:
                 traceback.print_exc(file=sys.stdout)
@@ -158,47 +191,201 @@ class JiraHandler:
         else:
             print('[!] Found custom fields')
 
-    def add_custom_field_options(self):
+    def add_custom_field_options(self, knowledge_bases, disable_stale=False):
 
-        custom_fields = self.get_custom_fields()
-        headers = {'Content-Type': 'application/json'}
+        # knowledge_bases: one AttackKnowledgeBase per tracked ATT&CK domain. The
+        # custom fields are global, so their options cover every domain. The three
+        # fields are independent and synchronized at the same time.
+        self.get_custom_fields()
+        field_options = {
+            'Maturity': self.MATURITY_OPTIONS,
+            'Tactic': [option['name'] for option in self.get_attack_tactics(knowledge_bases)],
+            'Datasources': [option['name'] for option in self.get_attack_datasources(knowledge_bases)],
+        }
+        with ThreadPoolExecutor(max_workers=len(field_options)) as executor:
+            list(executor.map(lambda item: self.sync_field_options(item[0], item[1], disable_stale), field_options.items()))
+
+    def sync_field_options(self, field_name, options, disable_stale=False):
+
+        # Reads the options of the field once and only adds the missing ones, in a
+        # single request; disabled options that are wanted again are re-enabled and,
+        # with disable_stale, options no longer in `options` are disabled (never
+        # deleted, issues may still use them). Rerunning it changes nothing.
+        # https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-issue-custom-field-options/
+        field_id = self.get_custom_fields()[field_name]
         try:
+            context_id = self.get_field_context_id(field_id)
+            path = '/rest/api/3/field/' + field_id + '/context/' + str(context_id) + '/option'
+            existing = self.get_field_options(path)
+
+            missing = [option for option in options if option not in existing]
+            wanted = set(options)
+            updates = [{'id': existing[option]['id'], 'disabled': False} for option in options if option in existing and existing[option]['disabled']]
+            if disable_stale:
+                updates += [{'id': item['id'], 'disabled': True} for value, item in existing.items() if value not in wanted and not item['disabled']]
+
+            for start in range(0, len(missing), self.FIELD_OPTIONS_CREATE_SIZE):
+                chunk = missing[start:start + self.FIELD_OPTIONS_CREATE_SIZE]
+                r = self.transport.request('POST', path, json={'options': [{'value': option, 'disabled': False} for option in chunk]})
+                if r.status_code != 200:
+                    print("[!] Error creating options for the " + field_name.lower() + " custom field: " + r.text)
+                    sys.exit(1)
+            if updates:
+                r = self.transport.request('PUT', path, json={'options': updates})
+                if r.status_code != 200:
+                    print("[!] Error updating options of the " + field_name.lower() + " custom field: " + r.text)
+                    sys.exit(1)
 
-            # maturity field options
-            payload=[{"name":"Not Tracked"},{"name":"Initial"},{"name":"Defined"},{"name":"Resilient"},{"name":"Optimized"}]
-            r=requests.post(self.url + '/rest/globalconfig/1/customfieldoptions/'+custom_fields['Maturity'], headers=headers, json= payload, auth=(self.username, self.apitoken),verify=False)
-            if r.status_code != 204:
-                print("[!] Error creating options for the maturity custom field.")
-                sys.exit()
+            disabled = len([update for update in updates if update['disabled']])
+            print("[!] " + field_name + " options: " + str(len(missing)) + " added, " + str(len(updates) - disabled) + " re-enabled, " + str(disabled) + " disabled, " + str(len(existing)) + " existing.")
+            return missing, updates
 
-            # tactic field options
-            payload = self.get_attack_tactics()
-            r = requests.post(self.url + '/rest/globalconfig/1/customfieldoptions/' + custom_fields['Tactic'], headers=headers, json=payload, auth=(self.username, self.apitoken), verify=False)
-            if r.status_code != 204:
-                print("[!] Error creating options for the tactic custom field.")
-                sys.exit()
+        except SystemExit:
+            raise
+        except Exception as ex:
+            traceback.print_exc(file=sys.stdout)
+            sys.exit(1)
 
-            # data source field options
-            payload = self.get_attack_datasources()
-            r = requests.post(self.url + '/rest/globalconfig/1/customfieldoptions/' + custom_fields['Datasources'], headers=headers, json=payload, auth=(self.username, self.apitoken), verify=False)
-            if r.status_code != 204:
-                print("[!] Error creating options for the datasources custom field.")
-                sys.exit()
+    def get_field_context_id(self, field_id):
+
+        # fields created by attack2jira have a single, global context; one is
+        # created when Jira did not add it
+        r = self.transport.request('GET', '/rest/api/3/field/' + field_id + '/context')
+        if r.status_code != 200:
+            raise RuntimeError("Error reading the contexts of " + field_id + ": " + r.text)
+        contexts = r.json().get('values', [])
+        for context in contexts:
+            if context.get('isGlobalContext'):
+                return context['id']
+        if contexts:
+            return contexts[0]['id']
+        r = self.transport.request('POST', '/rest/api/3/field/' + field_id + '/context', json={'name': "Default Configuration Scheme", 'issueTypeIds': [], 'projectIds': []})
+        if r.status_code not in (200, 201):
+            raise RuntimeError("Error creating a context for " + field_id + ": " + r.text)
+        return r.json()['id']
+
+    def get_custom_field_options(self):
+
+        # field name -> enabled option values of the Maturity, Tactic and
+        # Datasources fields, for the 'capture' action
+        def read_options(field_name):
+            field_id = self.get_custom_fields()[field_name]
+            path = '/rest/api/3/field/' + field_id + '/context/' + str(self.get_field_context_id(field_id)) + '/option'
+            return sorted(value for value, item in self.get_field_options(path).items() if not item['disabled'])
 
+        try:
+            self.get_custom_fields()
+            with ThreadPoolExecutor(max_workers=len(self.OPTION_FIELD_NAMES)) as executor:
+                return dict(zip(self.OPTION_FIELD_NAMES, executor.map(read_options, self.OPTION_FIELD_NAMES)))
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            print("[!] Error reading custom field options!")
+            sys.exit(1)
+
+    def get_field_options(self, path):
+
+        # value -> {'id', 'disabled'} of every option of a field context
+        options = {}
+        startAt = 0
+        while True:
+            r = self.transport.request('GET', path, params={'startAt': startAt, 'maxResults': self.FIELD_OPTIONS_PAGE_SIZE})
+            if r.status_code != 200:
+                raise RuntimeError("Error reading options: " + r.text)
+            page = r.json()
+            for option in page.get('values', []):
+                options[option['value']] = {'id': option['id'], 'disabled': option.get('disabled', False)}
+            startAt += len(page.get('values', []))
+            if page.get('isLast', True) or not page.get('values'):
+                return options
+
+    def get_select_option_ids(self, field_name):
+
+        # value -> option id of a select custom field
+        field_id = self.get_custom_fields()[field_name]
+        context_id = self.get_field_context_id(field_id)
+        options = self.get_field_options('/rest/api/3/field/' + field_id + '/context/' + str(context_id) + '/option')
+        return {value: item['id'] for value, item in options.items()}
+
+    def bulk_edit_select_field(self, field_name, issue_ids_by_value):
+
+        # Sets a single select custom field on many issues through Jira Cloud's
+        # bulk edit: one task per value (and per BULK_EDIT_SIZE issues), all
+        # submitted first and then polled together. Returns issue id -> error of
+        # the issues that failed, or None when the instance has no bulk edit API
+        # (e.g. Data Center) and the caller should PUT the issues instead.
+        # https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-issue-bulk-operations/
+        field_id = self.get_custom_fields()[field_name]
+        try:
+            option_ids = self.get_select_option_ids(field_name)
+            tasks = {}
+            failed = {}
+            for value, issue_ids in issue_ids_by_value.items():
+                if value not in option_ids:
+                    failed.update({issue_id: "no " + field_name + " option '" + value + "'" for issue_id in issue_ids})
+                    continue
+                for start in range(0, len(issue_ids), self.BULK_EDIT_SIZE):
+                    chunk = issue_ids[start:start + self.BULK_EDIT_SIZE]
+                    payload = {
+                        'selectedIssueIdsOrKeys': chunk,
+                        'selectedActions': [field_id],
+                        'editedFieldsInput': {'singleSelectCustomFields': [{'fieldId': field_id, 'option': {'optionId': str(option_ids[value])}}]},
+                        'sendBulkNotification': False,
+                    }
+                    r = self.transport.request('POST', '/rest/api/3/bulk/issues/fields', json=payload)
+                    if r.status_code in (404, 405) and not tasks:
+                        return None
+                    if r.status_code not in (200, 201):
+                        failed.update({issue_id: "HTTP " + str(r.status_code) + ": " + r.text for issue_id in chunk})
+                        continue
+                    tasks[r.json()['taskId']] = chunk
+            print("[*] Waiting for " + str(len(tasks)) + " bulk edit tasks...")
+
+            deadline = time.monotonic() + self.BULK_EDIT_TIMEOUT
+            while tasks:
+                for task_id, chunk in list(tasks.items()):
+                    r = self.transport.request('GET', '/rest/api/3/bulk/queue/' + str(task_id))
+                    if r.status_code != 200:
+                        raise RuntimeError("Error reading bulk edit task " + str(task_id) + ": " + r.text)
+                    task = r.json()
+                    if task.get('status') in ('ENQUEUED', 'RUNNING'):
+                        continue
+                    del tasks[task_id]
+                    if task.get('status') != 'COMPLETE':
+                        failed.update({issue_id: "bulk edit task " + str(task.get('status')).lower() for issue_id in chunk})
+                        continue
+                    for issue_id, errors in (task.get('failedAccessibleIssues') or {}).items():
+                        failed[issue_id] = "; ".join(str(error) for error in errors) or "failed"
+                    processed = set(str(issue_id) for issue_id in task.get('processedAccessibleIssues') or [])
+                    for issue_id in chunk:
+                        if str(issue_id) not in processed and str(issue_id) not in failed:
+                            failed[str(issue_id)] = "not edited (inaccessible issue)"
+                if tasks:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("Bulk edit tasks still running after " + str(self.BULK_EDIT_TIMEOUT) + "s: " + ", ".join(str(task_id) for task_id in tasks))
+                    time.sleep(self.BULK_EDIT_POLL_INTERVAL)
+            return failed
 
         except Exception as ex:
             traceback.print_exc(file=sys.stdout)
-            sys.exit()
+            print("[!] Error bulk editing the " + field_name.lower() + " custom field!")
+            sys.exit(1)
 
     def get_custom_fields(self):
 
+        if self.custom_fields is not None:
+            return self.custom_fields
+
+        cached = self.load_cached_custom_fields()
+        if cached:
+            self.custom_fields = cached
+            return self.custom_fields
+
         #print("[*] Getting custom field ids ...")
-        custom_fields=['Tactic','Maturity','Url','Datasources','Id','Sub-Technique of']
-        headers = {'Content-Type': 'application/json'}
+        custom_fields=self.CUSTOM_FIELD_NAMES
         resp = {}
 
         try:
-            r = requests.get(self.url + '/rest/api/3/field', headers=headers, auth=(self.username, self.apitoken), verify=False)
+            r = self.transport.request('GET', '/rest/api/3/field')
             if r.status_code == 200:
                 results = r.json()
                 for r in results:
@@ -211,6 +398,10 @@ class JiraHandler:
 
             #logging.info(f"Custom fields: {custom_fields}")
 
+            self.custom_fields = resp
+            # only persist a complete set, the missing fields are about to be created
+            if len(resp) == len(custom_fields):
+                self.save_cached_custom_fields(resp)
             return resp
 
 
@@ -218,11 +409,53 @@ class JiraHandler:
             traceback.print_exc(file=sys.stdout)
             sys.exit(1)
 
+    def load_cached_custom_fields(self):
+
+        if not self.field_cache or not os.path.exists(self.field_cache):
+            return None
+        try:
+            with open(self.field_cache, encoding='utf-8') as f:
+                cached = json.load(f).get(self.url)
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable custom field cache {self.field_cache}")
+            return None
+        if not cached or len(cached) != len(self.CUSTOM_FIELD_NAMES):
+            return None
+        logging.info(f"Using cached custom field ids for {self.url} from {self.field_cache}")
+        return cached
+
+    def save_cached_custom_fields(self, custom_fields):
+
+        if not self.field_cache:
+            return
+        try:
+            with self.FIELD_CACHE_LOCK:
+                cache = {}
+                if os.path.exists(self.field_cache):
+                    with open(self.field_cache, encoding='utf-8') as f:
+                        cache = json.load(f)
+                if custom_fields is None:
+                    cache.pop(self.url, None)
+                else:
+                    cache[self.url] = custom_fields
+                # readers never see a partly written file
+                tmp_path = self.field_cache + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=4)
+                os.replace(tmp_path, self.field_cache)
+        except (OSError, ValueError):
+            logging.warning(f"Could not update custom field cache {self.field_cache}")
+
+    def invalidate_custom_fields(self):
+
+        # called whenever fields are created so the next lookup sees the new ids
+        self.custom_fields = None
+        self.save_cached_custom_fields(None)
+
     def hide_unwanted_fields_old(self,key):
     # Deprecated, keeping in just in case.
         print("[*] Hiding unnecessary fields from ATTACK's issue layout...")
         screen_tab_ids = self.get_screen_tabs(key)
-        headers = {'Content-Type': 'application/json'}
 
         #json_string = u'{"contextItemsCategories":{"primary":[{"id":"assignee","type":"FIELD"},{"id":"labels","type":"FIELD"}],"secondary":[{"id":"priority","type":"FIELD"}],"alwaysHidden":[{"id":"reporter","type":"FIELD"},{"id":"devSummary","type":"DEV_SUMMARY"},{"id":"releases","type":"RELEASES_PANEL"},{"id":"customfield_10041","type":"FIELD"},{"id":"timeoriginalestimate","type":"FIELD"},{"id":"customfield_10014","type":"FIELD"},{"id":"components","type":"FIELD"},{"id":"fixVersions","type":"FIELD"},{"id":"duedate","type":"FIELD"},{"id":"customfield_10011","type":"FIELD"},{"id":"timetracking","type":"FIELD"}]},"contentItemsCategories":{"visible":[{"id":"description","type":"FIELD"}],"alwaysHidden":[]}}'
         #json_string = u'{"contextItemsCategories":{"primary":[{"id":"assignee","type":"FIELD"}],"secondary":[{"id":"priority","type":"FIELD"},{"id":"labels","type":"FIELD"}],"alwaysHidden":[{"id":"reporter","type":"FIELD"},{"id":"devSummary","type":"DEV_SUMMARY"},{"id":"releases","type":"RELEASES_PANEL"},{"id":"customfield_10041","type":"FIELD"},{"id":"timeoriginalestimate","type":"FIELD"},{"id":"customfield_10014","type":"FIELD"},{"id":"components","type":"FIELD"},{"id":"fixVersions","type":"FIELD"},{"id":"duedate","type":"FIELD"},{"id":"customfield_10011","type":"FIELD"},{"id":"timetracking","type":"FIELD"}]},"contentItemsCategories":{"visible":[{"id":"description","type":"FIELD"}],"alwaysHidden":[]}}'
@@ -230,7 +463,7 @@ class JiraHandler:
 
         try:
             for screen_tab_id in screen_tab_ids:
-                r = requests.put(self.url + '/rest/api/2/project/'+key+'/properties/viewScreenId-'+str(screen_tab_id[0]), data=json_string, headers=headers, auth=(self.username, self.apitoken), verify=False)
+                r = self.transport.request('PUT', '/rest/api/2/project/'+key+'/properties/viewScreenId-'+str(screen_tab_id[0]), data=json_string)
             print("[!] Done.")
 
         except Exception as ex:
@@ -246,11 +479,9 @@ class JiraHandler:
 
         print("[*] Hiding unnecessary fields from ATTACK's issue layout...")
         #screen_tab_ids = self.get_screen_tabs(key)
-        project_id=self.get_project_id(key)
-        screen_ids = self.get_screen_ids(project_id)
+        screen_ids = self.get_screen_topology(key)['screens']
         custom_Fields = self.get_custom_fields()
 
-        headers = {'Content-Type': 'application/json'}
 
         #json_string = u'{"context":{"primary":[{"id":"assignee","type":"FIELD"},{"id":"reporter","type":"FIELD"},{"id":"devSummary","type":"DEV_SUMMARY"},{"id":"customfield_10094","type":"FIELD"},{"id":"customfield_10092","type":"FIELD"},{"id":"customfield_10090","type":"FIELD"},{"id":"customfield_10093","type":"FIELD"},{"id":"customfield_10091","type":"FIELD"},{"id":"labels","type":"FIELD"}],"secondary":[{"id":"priority","type":"FIELD"}],"alwaysHidden":[{"id":"timeoriginalestimate","type":"FIELD"},{"id":"timetracking","type":"FIELD"},{"id":"components","type":"FIELD"},{"id":"fixVersions","type":"FIELD"},{"id":"customfield_10014","type":"FIELD"},{"id":"duedate","type":"FIELD"},{"id":"customfield_10011","type":"FIELD"},{"id":"customfield_10026","type":"FIELD"}]},"content":{"visible":[{"id":"description","type":"FIELD"}],"alwaysHidden":[]}}'
         json_string = u'{"context":{"primary":[{"id":"assignee","type":"FIELD"},{"id":"reporter","type":"FIELD"},{"id":"labels","type":"FIELD"},{"id":"MATURITY_CUSTOMFIELD","type":"FIELD"},{"id":"DATASOURCE_CUSTOMFIELD","type":"FIELD"}],"secondary":[{"id":"priority","type":"FIELD"}],"alwaysHidden":[{"id":"timeoriginalestimate","type":"FIELD"},{"id":"timetracking","type":"FIELD"},{"id":"components","type":"FIELD"},{"id":"fixVersions","type":"FIELD"},{"id":"customfield_10014","type":"FIELD"},{"id":"duedate","type":"FIELD"},{"id":"customfield_10011","type":"FIELD"},{"id":"customfield_10026","type":"FIELD"},{"id":"devSummary","type":"DEV_SUMMARY"}]},"content":{"visible":[{"id":"TACTIC_CUSTOMFIELD","type":"FIELD"},{"id":"ID_CUSTOMFIELD","type":"FIELD"},{"id":"URL_CUSTOMFIELD","type":"FIELD"},{"id":"SUBTECHNIQUE_CUSTOMFIELD","type":"FIELD"},{"id":"description","type":"FIELD"}],"alwaysHidden":[]}}'        
@@ -263,8 +494,9 @@ class JiraHandler:
         json_string = json_string.replace("SUBTECHNIQUE_CUSTOMFIELD", custom_Fields['Sub-Technique of'])
 
         try:
-            for screen_id in screen_ids:
-                r = requests.put(self.url + '/rest/issuedetailslayout/config/classic/screen?projectIdOrKey='+key+'&screenId='+str(screen_id), data=json_string, headers=headers, auth=(self.username, self.apitoken), verify=False)
+            # one layout per screen, independent of each other
+            with ThreadPoolExecutor(max_workers=max(1, min(self.SCREEN_CONCURRENCY, self.pool_size, len(screen_ids)))) as executor:
+                list(executor.map(lambda screen_id: self.transport.request('PUT', '/rest/issuedetailslayout/config/classic/screen?projectIdOrKey='+key+'&screenId='+str(screen_id), data=json_string), screen_ids))
             print("[!] Done.")
 
         except Exception as ex:
@@ -278,7 +510,7 @@ class JiraHandler:
         custom_fields = self.get_custom_fields()
 
         ## TODO: Need to perform better checks but this works for now.
-        if len(custom_fields.keys()) == 6:
+        if len(custom_fields.keys()) == len(self.CUSTOM_FIELD_NAMES):
             return True
         else:
             return False
@@ -287,10 +519,8 @@ class JiraHandler:
     def create_issue(self, issue_dict, id):
 
         # good examples https://developer.atlassian.com/server/jira/platform/jira-rest-api-examples/#creating-an-issue-examples
-        headers = {'Content-Type': 'application/json'}
         try:
-            r = requests.post(self.url + '/rest/api/2/issue', json=issue_dict, headers=headers, auth=(self.username, self.apitoken), verify=False)
-
+            r = self.transport.request('POST', '/rest/api/2/issue', json=issue_dict)
             if r.status_code == 201:
                 print ("\t[!] Successfully created Jira issue for "+id)
                 return json.loads(r.text)
@@ -305,14 +535,115 @@ class JiraHandler:
             traceback.print_exc(file=sys.stdout)
             sys.exit()
 
+    def try_create_issue(self, issue_dict, id):
+
+        # Same as create_issue() but returns (issue, error) instead of exiting, so
+        # callers creating many issues can keep going and report failures at the end.
+        try:
+            r = self.transport.request('POST', '/rest/api/2/issue', json=issue_dict)
+            if r.status_code == 201:
+                print ("\t[!] Successfully created Jira issue for "+id)
+                return r.json(), None
+            print ("\t[!] Error creating Jira issue for "+id)
+            return None, "HTTP " + str(r.status_code) + ": " + r.text
+
+        except Exception as ex:
+            logging.error(f"Error creating Jira issue for {id}: {str(ex)}")
+            return None, str(ex)
+
+    def update_issue(self, issue_key, payload):
+
+        # PUT of only the given fields/updates, returns (success, error)
+        try:
+            r = self.transport.request('PUT', '/rest/api/2/issue/' + issue_key, json=payload)
+            if r.status_code == 204:
+                return True, None
+            return False, "HTTP " + str(r.status_code) + ": " + r.text
+
+        except Exception as ex:
+            logging.error(f"Error updating Jira issue {issue_key}: {str(ex)}")
+            return False, str(ex)
+
+    def transition_issue(self, issue_key, transition_name):
+
+        # moves the issue through the workflow transition with the given name
+        try:
+            r = self.transport.request('GET', '/rest/api/2/issue/' + issue_key + '/transitions')
+            if r.status_code != 200:
+                return False, "HTTP " + str(r.status_code) + ": " + r.text
+            for transition in r.json().get('transitions', []):
+                if transition['name'].lower() == transition_name.lower():
+                    r = self.transport.request('POST', '/rest/api/2/issue/' + issue_key + '/transitions', json={'transition': {'id': transition['id']}})
+                    if r.status_code == 204:
+                        return True, None
+                    return False, "HTTP " + str(r.status_code) + ": " + r.text
+            return False, "no '" + transition_name + "' transition available"
+
+        except Exception as ex:
+            logging.error(f"Error transitioning Jira issue {issue_key}: {str(ex)}")
+            return False, str(ex)
+
+    def create_issues_bulk(self, issue_dicts, ids, workers=1):
+
+        # https://developer.atlassian.com/cloud/jira/platform/rest/v2/api-group-issues/#api-rest-api-2-issue-bulk-post
+        # Jira accepts up to 50 issues per request; with workers > 1 several requests
+        # are sent at the same time. Unlike create_issue(), errors are collected per
+        # issue and returned instead of aborting the run.
+        created = {}
+        errors = {}
+
+        def create_chunk(start):
+            chunk = issue_dicts[start:start + self.BULK_CREATE_SIZE]
+            chunk_ids = ids[start:start + self.BULK_CREATE_SIZE]
+            chunk_created = {}
+            chunk_errors = {}
+            try:
+                r = self.transport.request('POST', '/rest/api/2/issue/bulk', json={'issueUpdates': chunk})
+                resp = r.json()
+            except Exception as ex:
+                traceback.print_exc(file=sys.stdout)
+                for id in chunk_ids:
+                    chunk_errors[id] = str(ex)
+                return chunk_created, chunk_errors
+
+            # Jira only returns the issues that were created, in request order, and
+            # reports the rest by their position in the request.
+            failed = {}
+            for error in resp.get('errors', []):
+                failed[error['failedElementNumber']] = error.get('elementErrors', {})
+            if not failed and r.status_code not in (200, 201):
+                failed = {i: resp for i in range(len(chunk))}
+
+            issues = iter(resp.get('issues', []))
+            for i, id in enumerate(chunk_ids):
+                if i in failed:
+                    element_errors = failed[i]
+                    messages = element_errors.get('errorMessages', []) + list(element_errors.get('errors', {}).values())
+                    chunk_errors[id] = "; ".join(messages) or "HTTP " + str(r.status_code)
+                    print("\t[!] Error creating Jira issue for " + id + ": " + chunk_errors[id])
+                    continue
+                issue = next(issues, None)
+                if issue is None:
+                    chunk_errors[id] = "missing from bulk response"
+                    continue
+                chunk_created[id] = issue
+                print("\t[!] Successfully created Jira issue for " + id)
+            return chunk_created, chunk_errors
+
+        starts = range(0, len(issue_dicts), self.BULK_CREATE_SIZE)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, self.pool_size, len(starts) or 1))) as executor:
+            for chunk_created, chunk_errors in executor.map(create_chunk, starts):
+                created.update(chunk_created)
+                errors.update(chunk_errors)
+
+        return created, errors
+
 
     def get_attack_screens(self, key):
 
-        headers = {'Content-Type': 'application/json'}
         screen_ids=[]
         try:
-            r = requests.get(self.url + '/rest/api/3/screens', headers=headers, auth=(self.username, self.apitoken), verify=False)
-
+            r = self.transport.request('GET', '/rest/api/3/screens')
             if r.status_code == 200:
                 results = r.json()['values']
                 for r in results:
@@ -331,13 +662,12 @@ class JiraHandler:
     def get_screen_tabs(self, key):
 
         # deprecated, keeping it in codebase just in case.
-        headers = {'Content-Type': 'application/json'}
         screen_ids = self.get_attack_screens(key)
         screen_tab_ids=[]
         try:
             for screen_id in screen_ids:
 
-                r = requests.get(self.url + '/rest/api/3/screens/'+str(screen_id)+'/tabs', headers=headers, auth=(self.username, self.apitoken), verify=False)
+                r = self.transport.request('GET', '/rest/api/3/screens/'+str(screen_id)+'/tabs')
                 if r.status_code == 200:
                     for result in r.json():
                         screen_tab_ids.append([screen_id, result['id']])
@@ -356,7 +686,6 @@ class JiraHandler:
         # deprecated. keeping it in codebase just in case
 
         print("[*] Adding custom fields to ATTACK's default screen tab ...")
-        headers = {'Content-Type': 'application/json'}
         screen_tab_ids = self.get_screen_tabs(key)
         custom_fields = self.get_custom_fields()
 
@@ -365,101 +694,140 @@ class JiraHandler:
                 for screen_tab_id in screen_tab_ids:
                     custom_field_dict = {'fieldId': custom_fields[key]}
                     #print (self.url + '/rest/api/2/screens/'+str(screen_tab_id[0])+'/tabs/'+str(screen_tab_id[1])+'/fields')
-                    r = requests.post(self.url + '/rest/api/3/screens/'+str(screen_tab_id[0])+'/tabs/'+str(screen_tab_id[1])+'/fields', json = custom_field_dict, headers=headers, auth=(self.username, self.apitoken), verify=False)
-
+                    r = self.transport.request('POST', '/rest/api/3/screens/'+str(screen_tab_id[0])+'/tabs/'+str(screen_tab_id[1])+'/fields', json = custom_field_dict)
             print("[!] Done!.")
 
         except Exception as ex:
             traceback.print_exc(file=sys.stdout)
             sys.exit()
 
-    def get_technique_maturity(self):
+    def get_technique_maturity(self, project_key="ATTACK", updated_within=None):
+        return self.get_technique_maturity_by_project([project_key], updated_within).get(project_key, {})
 
-        print("[*] Getting issues from the ATTACK project...")
-        custom_fields = self.get_custom_fields()
-        headers = {'Content-Type': 'application/json'}
-        read_issues=0
-        startAt=0
-        res_dict=dict()
+    def get_technique_maturity_by_project(self, project_keys, updated_within=None):
 
-        try:
-
-            while(True):
-                #print("Entering while loop. startAt is "+str(startAt))
-                r = requests.get(self.url + '/rest/api/3/search?jql=project%20%3D%20ATTACK&startAt='+str(startAt), headers=headers, auth=(self.username, self.apitoken), verify=False)
-                resp_dict = r.json()
-                for issue in resp_dict['issues']:
-                    technique_id = issue['fields'][custom_fields['Id']]
-                    #print (issue['fields']['summary']," ",issue['fields'][custom_fields['maturity']] )
-                    #print(technique_id, " ", issue['fields'][custom_fields['maturity']])
-                    res_dict.update({technique_id:issue['fields'][custom_fields['Maturity']]})
-                read_issues+=50
-                startAt+=50
-                if (read_issues>=r.json()['total']):
-                    break
-
-            return res_dict
+        # Returns project_key -> ttp_id -> {key, id, value, updated} for all the given
+        # projects from a single search. Only the Id, Maturity and updated fields are
+        # requested and pages are fetched in parallel. updated_within (minutes)
+        # restricts the scan to recently updated issues; relative JQL dates avoid
+        # any dependency on the Jira user's timezone.
+        custom_fields = self.get_custom_fields()
+        id_field = custom_fields['Id']
+        maturity_field = custom_fields['Maturity']
+        if len(project_keys) == 1:
+            jql = 'project = ' + project_keys[0]
+        else:
+            jql = 'project in (' + ", ".join(project_keys) + ')'
+        projects = ", ".join(project_keys)
+        if updated_within is None:
+            print("[*] Getting issues from the " + projects + " project(s)...")
+        else:
+            print("[*] Getting issues updated in the last " + str(updated_within) + " minutes from the " + projects + " project(s)...")
+            jql += ' AND updated >= "-' + str(updated_within) + 'm"'
+        res_dict = {project_key: {} for project_key in project_keys}
+
+        for issue in self.search_issues(jql + ' ORDER BY id ASC', [id_field, maturity_field, 'updated']):
+            technique_id = issue['fields'].get(id_field)
+            # issue keys are <PROJECT>-<number>
+            project_key = issue['key'].rsplit('-', 1)[0]
+            if technique_id and project_key in res_dict:
+                maturity = issue['fields'].get(maturity_field) or {}
+                res_dict[project_key][technique_id] = {'key': issue['key'], 'id': issue['id'], 'value': maturity.get('value', 'Not Tracked'), 'updated': issue['fields'].get('updated')}
+
+        return res_dict
+
+    def get_maturity_changelog(self, project_keys):
+
+        # Returns project_key -> ttp_id -> {key, id, created, value, changes} where
+        # changes lists the (timestamp, from, to) Maturity changes of the issue.
+        # A single search with expand=changelog brings the histories of every
+        # issue; only issues with more histories than the search embeds (100)
+        # have the rest of their changelog paged in, concurrently.
+        custom_fields = self.get_custom_fields()
+        id_field = custom_fields['Id']
+        maturity_field = custom_fields['Maturity']
+        jql = 'project in (' + ", ".join(project_keys) + ') ORDER BY id ASC'
+        print("[*] Getting the Maturity changelog of the " + ", ".join(project_keys) + " project(s)...")
+        res_dict = {project_key: {} for project_key in project_keys}
+        truncated = []
+
+        for issue in self.search_issues(jql, [id_field, maturity_field, 'created'], expand='changelog'):
+            technique_id = issue['fields'].get(id_field)
+            project_key = issue['key'].rsplit('-', 1)[0]
+            if not technique_id or project_key not in res_dict:
+                continue
+            changelog = issue.get('changelog') or {}
+            histories = changelog.get('histories', [])
+            entry = {'key': issue['key'], 'id': issue['id'], 'created': parse_jira_time(issue['fields']['created']),
+                     'value': (issue['fields'].get(maturity_field) or {}).get('value', 'Not Tracked'),
+                     'changes': self.get_maturity_changes(histories, maturity_field)}
+            res_dict[project_key][technique_id] = entry
+            if changelog.get('total', len(histories)) > len(histories):
+                truncated.append(entry)
+
+        def get_full_changelog(entry):
+            histories, start = [], 0
+            while True:
+                r = self.transport.request('GET', '/rest/api/3/issue/' + entry['id'] + '/changelog', params={'startAt': start, 'maxResults': self.SEARCH_PAGE_SIZE})
+                if r.status_code != 200:
+                    raise RuntimeError("Error getting the changelog of " + entry['key'] + ": " + r.text)
+                page = r.json()
+                histories += page.get('values', [])
+                start += len(page.get('values', []))
+                if page.get('isLast', True) or not page.get('values'):
+                    return histories
+
+        if truncated:
+            print("[*] Paging the changelog of " + str(len(truncated)) + " issues with long histories...")
+            try:
+                workers = max(1, min(self.SEARCH_CONCURRENCY, self.pool_size, len(truncated)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for entry, histories in zip(truncated, executor.map(get_full_changelog, truncated)):
+                        entry['changes'] = self.get_maturity_changes(histories, maturity_field)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                print("[!] Error getting issue changelogs!")
+                sys.exit(1)
 
-        except Exception as ex:
-            traceback.print_exc(file=sys.stdout)
-            sys.exit()
+        return res_dict
 
+    @staticmethod
+    def get_maturity_changes(histories, maturity_field):
 
-    def get_attack_datasources(self):
-    
-        try:
-            datasource_payload=[]
-            client = attack_client()
-
-            #the datasources obtained via the line below do not correspond with the data sources being present in get_attack_techniques()
-            #datasources = client.get_data_sources()
-
-            #this is likely a temporary workaround
-            data_sources_legacy = []
-            techniques = client.get_techniques()
-            for technique in techniques:
-                try:
-                    data_sources_field = technique['x_mitre_data_sources']
-                except:
-                    pass
-                for ds in data_sources_field:
-                    data_sources_legacy.append(str(ds).title())
-            #making data_sources_legacy records unique
-            data_sources_legacy = list(set(data_sources_legacy))
-            # end of the workaround
-            for datasource in data_sources_legacy:
-                d = {'name': datasource}
-                datasource_payload.append(d)
-            return datasource_payload
+        changes = []
+        for history in histories:
+            for item in history.get('items', []):
+                if item.get('fieldId') == maturity_field or item.get('field') == 'Maturity':
+                    changes.append((parse_jira_time(history['created']), item.get('fromString'), item.get('toString')))
+        return sorted(changes)
 
-        except:
-            traceback.print_exc(file=sys.stdout)
-            print ("[!] Error connecting obtaining datasources from Att&ck's API !")
-            sys.exit()
+    @staticmethod
+    def get_attack_datasources(knowledge_bases):
 
-    def get_attack_tactics(self):
+        # data sources as listed on the techniques themselves, see AttackKnowledgeBase
+        datasources = set()
+        for knowledge_base in knowledge_bases:
+            datasources.update(knowledge_base.get_datasources())
+        return [{'name': datasource} for datasource in sorted(datasources)]
 
-        try:
-            tactics_payload=[]
-            client = attack_client()
-            enterprise_tactics = client.get_enterprise()
-            tactics = [tactic['name'].lower().replace(" ", "-") for tactic in enterprise_tactics['tactics']]
-            for tactic in tactics:
-                tactics_payload.append({"name": tactic})
-            return tactics_payload
+    @staticmethod
+    def get_attack_tactics(knowledge_bases):
 
-        except:
-            traceback.print_exc(file=sys.stdout)
-            print ("[!] Error connecting obtaining tactics from Att&ck's API !")
-            sys.exit()
+        # tactics shared by several domains (e.g. initial-access) are listed once
+        tactics = []
+        for knowledge_base in knowledge_bases:
+            for tactic in knowledge_base.get_tactics():
+                name = tactic['name'].lower().replace(" ", "-")
+                if name not in tactics:
+                    tactics.append(name)
+        return [{"name": tactic} for tactic in tactics]
 
     def add_custom_fields_to_screen(self, key):
 
         print("[*] Adding custom fields to ATTACK's default screen tab ...")
-        headers = {'Content-Type': 'application/json'}
-        project_id=self.get_project_id(key)
-        screen_tab_ids = self.get_screen_tab_ids(project_id)
-        screen_ids = self.get_screen_ids(project_id)
+        topology = self.get_screen_topology(key)
+        screen_ids = topology['screens']
+        screen_tab_ids = [topology['tabs'][screen_id] for screen_id in screen_ids]
         custom_fields = self.get_custom_fields()
 
         try:
@@ -467,8 +835,7 @@ class JiraHandler:
                 for i in range(1):
                     custom_field_dict = {'fieldId': custom_fields[key]}
                     #print (self.url + '/rest/api/2/screens/'+str(screen_tab_id[0])+'/tabs/'+str(screen_tab_id[1])+'/fields')
-                    r = requests.post(self.url + '/rest/api/3/screens/'+str(screen_ids[i])+'/tabs/'+str(screen_tab_ids[i])+'/fields', json = custom_field_dict, headers=headers, auth=(self.username, self.apitoken), verify=False)
-
+                    r = self.transport.request('POST', '/rest/api/3/screens/'+str(screen_ids[i])+'/tabs/'+str(screen_tab_ids[i])+'/fields', json = custom_field_dict)
             print("[!] Done!.")
 
         except Exception as ex:
@@ -476,64 +843,79 @@ class JiraHandler:
             sys.exit()
 
     def get_project_id(self,key):
-        headers = {'Content-Type': 'application/json'}
+
+        # looked up directly instead of listing (one page of) every project
         try:
-            r = requests.get(self.url + '/rest/api/3/project/search', headers=headers, auth=(self.username, self.apitoken), verify=False)
-            resp_dict = r.json()
-            for project in resp_dict['values']:
-                if project['key'] == key:
-                    return project['id']
-            return 0
-                
+            r = self.transport.request('GET', '/rest/api/3/project/' + key)
+            if r.status_code == 404:
+                return 0
+            return r.json()['id']
+
         except:
             traceback.print_exc(file=sys.stdout)
             print ("[!] Error obtaining project id!")
             sys.exit()
 
-    def get_screen_ids(self, project_id):
-        headers = {'Content-Type': 'application/json'}
-        screen_scheme_ids = self.get_screen_scheme_ids(project_id)
-        screen_ids = []
+    def get_screen_topology(self, key):
+
+        # Resolves the project's screen graph once and caches it for the screen and
+        # layout setup steps: project -> issue type screen schemes -> screen schemes
+        # -> default screens -> first tab of each screen. The GETs of each level do
+        # not depend on each other and are sent concurrently; ids shared by several
+        # issue types are only resolved once.
+        if key in self.screen_topologies:
+            return self.screen_topologies[key]
+
+        project_id = self.get_project_id(key)
+        issue_type_screen_scheme_ids = self.get_project_issue_type_screen_scheme_ids(project_id)
+        workers = max(1, min(self.SCREEN_CONCURRENCY, self.pool_size))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            screen_scheme_ids = []
+            for ids in executor.map(self.get_screen_scheme_ids, issue_type_screen_scheme_ids):
+                screen_scheme_ids += [id for id in ids if id not in screen_scheme_ids]
+            screen_ids = []
+            for screen_id in executor.map(self.get_default_screen_id, screen_scheme_ids):
+                if screen_id not in screen_ids:
+                    screen_ids.append(screen_id)
+            tab_ids = list(executor.map(self.get_screen_tab_id, screen_ids))
+
+        topology = {
+            'project_id': project_id,
+            'issue_type_screen_schemes': issue_type_screen_scheme_ids,
+            'screen_schemes': screen_scheme_ids,
+            'screens': screen_ids,
+            'tabs': dict(zip(screen_ids, tab_ids)),
+        }
+        self.screen_topologies[key] = topology
+        return topology
+
+    def get_default_screen_id(self, screen_scheme_id):
         try:
-            for item in screen_scheme_ids:
-                r = requests.get(self.url +'/rest/api/2/screenscheme?id='+item, headers=headers, auth=(self.username, self.apitoken),verify=False)
-                r_dict = r.json()
-                screen_ids.append(list(r_dict['values'][0]['screens'].values())[0])
-            return screen_ids
+            r = self.transport.request('GET', '/rest/api/2/screenscheme?id='+str(screen_scheme_id))
+            r_dict = r.json()
+            return list(r_dict['values'][0]['screens'].values())[0]
 
         except:
             traceback.print_exc(file=sys.stdout)
             print ("[!] Error obtaining screen ids!")
             sys.exit()
 
-
-    def get_screen_scheme_ids(self, project_id):
-        headers = {'Content-Type': 'application/json'}
-        issue_type_screen_scheme_ids = self.get_project_issue_type_screen_scheme_ids(project_id)
-        request_items=[]
-        screen_scheme_ids=[]
+    def get_screen_scheme_ids(self, issue_type_screen_scheme_id):
         try:
-            for item in issue_type_screen_scheme_ids:
-                r = requests.get(self.url +'/rest/api/2/issuetypescreenscheme/mapping?issueTypeScreenSchemeId=' + item, headers=headers, auth=(self.username, self.apitoken), verify=False)
-                r_dict=r.json()
-                request_items.append(r_dict)
-            for item in request_items:
-                for subitem in item['values']:
-                    screen_scheme_ids.append(subitem['screenSchemeId'])
-            return  screen_scheme_ids
-        
+            r = self.transport.request('GET', '/rest/api/2/issuetypescreenscheme/mapping?issueTypeScreenSchemeId=' + str(issue_type_screen_scheme_id))
+            r_dict = r.json()
+            return [item['screenSchemeId'] for item in r_dict['values']]
+
         except:
             traceback.print_exc(file=sys.stdout)
             print ("[!] Error obtaining screen scheme ids!")
             sys.exit()
 
-    
     def get_project_issue_type_screen_scheme_ids(self, project_id):
-        headers = {'Content-Type': 'application/json'}
         query={'projectId': project_id}
         issue_type_screen_scheme_ids=[]
         try:
-            r = requests.get(self.url +'/rest/api/3/issuetypescreenscheme/project/', headers=headers, params=query, auth=(self.username, self.apitoken), verify=False) 
+            r = self.transport.request('GET', '/rest/api/3/issuetypescreenscheme/project/', params=query)
             resp_dict = r.json()
             for item in resp_dict['values']:
                 issue_type_screen_scheme_ids.append(item['issueTypeScreenScheme']['id'])
@@ -544,27 +926,10 @@ class JiraHandler:
             traceback.print_exc(file=sys.stdout)
             print ("[!] Error obtaining issue type screen scheme ids!")
             sys.exit()
-    
-    
-    def get_screen_tab_ids(self, project_id):
-        screen_ids = self.get_screen_ids(project_id)
-        screen_tab_ids = []
-        try:
-            for item in screen_ids:
-                screen_tab_id = self.get_screen_tab_id(item)
-                screen_tab_ids.append(screen_tab_id)
-            return screen_tab_ids
-
-        except:
-            traceback.print_exc(file=sys.stdout)
-            print ("[!] Error obtaining screen tab ids!")
-            sys.exit()
-
 
     def get_screen_tab_id(self, screen_id):
-        headers = {'Content-Type': 'application/json'}
         try:
-            r = requests.get(self.url +'/rest/api/3/screens/'+str(screen_id)+'/tabs', headers=headers, auth=(self.username, self.apitoken), verify=False) 
+            r = self.transport.request('GET', '/rest/api/3/screens/'+str(screen_id)+'/tabs')
             resp_dict = r.json()
             return resp_dict[0]['id']
 
@@ -576,10 +941,9 @@ class JiraHandler:
             
     def get_project_screen_tab_ids(self, project_id):
     #legacy - not used in the current version
-        headers = {'Content-Type': 'application/json'}
         screen_tab_ids=[]
         try:
-            r = requests.get(self.url +'/rest/api/3/issuetypescreenscheme/mapping?issueTypeScreenSchemeId='+project_id,headers=headers, auth=(self.username, self.apitoken), verify=False) 
+            r = self.transport.request('GET', '/rest/api/3/issuetypescreenscheme/mapping?issueTypeScreenSchemeId='+project_id)
             resp_dict = r.json()
             for screen in resp_dict['values']:
                 screen_tab_ids.append([screen['screenSchemeId'], self.get_screen_tab_id(screen['screenSchemeId'])])
@@ -591,62 +955,72 @@ class JiraHandler:
             print ("[!] Error obtaining screen/tab ids!")
             sys.exit()
 
-    def issue_exists(self, ttp_id, project_key):
+    def search_issues(self, jql, fields, api_version=3, expand=None):
+
+        # Pages through /rest/api/<api_version>/search only requesting the given fields.
+        # v2 returns descriptions as plain text instead of the v3 document format.
+        # The first page gives the total, the remaining pages are fetched concurrently,
+        # so callers should order the JQL to keep the offsets stable.
+        path = '/rest/api/' + str(api_version) + '/search'
+
+        def get_page(startAt, maxResults):
+            query = {'jql': jql, 'fields': ",".join(fields), 'startAt': startAt, 'maxResults': maxResults}
+            if expand:
+                query['expand'] = expand
+            r = self.transport.request('GET', path, params=query)
+            if r.status_code != 200:
+                raise RuntimeError("Error searching issues: " + r.text)
+            return r.json()
+
         try:
-            print(f"Called issue_exists for {ttp_id}")  # Debug print
-            # Build a JQL query that looks for the technique id in the custom field "Id"
-            jql = f'project = {project_key} AND "Id[Short text]" ~ "{ttp_id}"'
-            #logging.info(f"Executing JQL: {jql}")
-            headers = {'Content-Type': 'application/json'}
-            # URL-encode the JQL string
-            jql_encoded = urllib.parse.quote(jql)
-            url = f"{self.url}/rest/api/3/search?jql={jql_encoded}"
-            r = requests.get(url, headers=headers, auth=(self.username, self.apitoken), verify=False)
-            if r.status_code == 200:
-                data = r.json()
-                logging.info(f"Search result: {data.get('total', 0)} issues found for {ttp_id}")
-                return data.get('total', 0) > 0
-            else:
-                print(f"[!] Error searching for existing issues: {r.text}")
-                # Optionally, decide if you want to fail here or assume no issue exists
-                return False
-        except:
+            first_page = get_page(0, self.SEARCH_PAGE_SIZE)
+            issues = first_page['issues']
+            # Jira may return fewer issues per page than requested
+            page_size = len(issues) or self.SEARCH_PAGE_SIZE
+            offsets = range(len(issues), first_page['total'], page_size)
+            if not issues or not offsets:
+                return issues
+
+            workers = max(1, min(self.SEARCH_CONCURRENCY, self.pool_size, len(offsets)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for page in executor.map(lambda startAt: get_page(startAt, page_size), offsets):
+                    issues.extend(page['issues'])
+            return issues
+
+        except Exception as ex:
             traceback.print_exc(file=sys.stdout)
-            print ("[!] Error checking for existing TTPs!")
-            sys.exit()
+            print("[!] Error searching issues!")
+            sys.exit(1)
 
-    def get_issue_by_ttp(self, ttp_id, project_key):
-        """
-        Returns the parent issue for a given TTP ID.
-        If the fuzzy search returns several issues (e.g., T1234, T1234.001, T1234.002),
-        this method filters out sub-techniques (those with a dot in their Id field)
-        and returns the issue that exactly matches the parent's TTP ID.
-        """
-        # Build JQL with fuzzy operator since exact match isn't accepted.
-        jql = f'project = {project_key} AND "Id[Short text]" ~ "{ttp_id}"'
-        logging.info(f"Executing JQL to get issue: {jql}")
-        
-        headers = {'Content-Type': 'application/json'}
-        jql_encoded = urllib.parse.quote(jql)
-        url = f"{self.url}/rest/api/3/search?jql={jql_encoded}"
-        
-        r = requests.get(url, headers=headers, auth=(self.username, self.apitoken), verify=False)
-        if r.status_code == 200:
-            data = r.json()
-            issues = data.get('issues', [])
-            if issues:
-                custom_fields = self.get_custom_fields()
-                id_field = custom_fields.get('Id')
-                # Filter issues: only return the one that has no dot in the Id (i.e., the parent)
-                for issue in issues:
-                    issue_id_value = issue['fields'].get(id_field, "")
-                    # Only consider issues where the custom field exactly equals ttp_id and has no dot.
-                    if '.' not in issue_id_value and issue_id_value == ttp_id:
-                        logging.info(f"Found parent issue for {ttp_id}: {issue['key']}")
-                        return issue
-                logging.info(f"No parent issue found for {ttp_id} among returned issues.")
-        else:
-            logging.error(f"[!] Error searching for issue by TTP: {r.text}")
-        return None
+    def get_project_index(self, project_key, detailed=False):
 
+        # Builds a ttp_id -> {key, id, maturity} index of the project with a single
+        # scan, so existence checks and parent lookups do not need a search each.
+        # detailed=True also reads the ATT&CK-managed fields, for the sync action.
+        print("[*] Indexing issues from the " + project_key + " project...")
+        custom_fields = self.get_custom_fields()
+        id_field = custom_fields['Id']
+        maturity_field = custom_fields['Maturity']
+        fields = [id_field, maturity_field]
+        if detailed:
+            fields += ['summary', 'description', 'labels', custom_fields['Tactic'], custom_fields['Datasources'], custom_fields['Url']]
+        index = {}
+
+        for issue in self.search_issues('project = ' + project_key + ' ORDER BY id ASC', fields, api_version=2 if detailed else 3):
+            ttp_id = issue['fields'].get(id_field)
+            if not ttp_id:
+                continue
+            maturity = issue['fields'].get(maturity_field) or {}
+            index[ttp_id] = {'key': issue['key'], 'id': issue['id'], 'maturity': maturity.get('value')}
+            if detailed:
+                index[ttp_id]['fields'] = {
+                    'summary': issue['fields'].get('summary'),
+                    'description': issue['fields'].get('description') or "",
+                    'labels': issue['fields'].get('labels') or [],
+                    'tactic': (issue['fields'].get(custom_fields['Tactic']) or {}).get('value'),
+                    'datasources': sorted(ds['value'] for ds in issue['fields'].get(custom_fields['Datasources']) or []),
+                    'url': issue['fields'].get(custom_fields['Url']),
+                }
 
+        logging.info(f"Indexed {len(index)} issues from project {project_key}")
+        return index
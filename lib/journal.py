@@ -0,0 +1,208 @@
+import sqlite3, threading, time
+
+
+class StateJournal:
+
+    # SQLite store recording what a run already did against a Jira instance:
+    # completed setup steps, the ttp_id -> issue index of each project and its
+    # maturity values. Reruns resume from it without asking Jira what exists,
+    # and export uses it as its maturity snapshot.
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS steps (
+            instance TEXT NOT NULL,
+            project TEXT NOT NULL,
+            step TEXT NOT NULL,
+            completed_at REAL NOT NULL,
+            PRIMARY KEY (instance, project, step)
+        );
+        CREATE TABLE IF NOT EXISTS issues (
+            instance TEXT NOT NULL,
+            project TEXT NOT NULL,
+            ttp_id TEXT NOT NULL,
+            issue_key TEXT NOT NULL,
+            issue_id TEXT,
+            maturity TEXT,
+            updated TEXT,
+            PRIMARY KEY (instance, project, ttp_id)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            instance TEXT NOT NULL,
+            project TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (instance, project, name)
+        );
+    """
+
+    def __init__(self, path, instance, full_every=24 * 3600):
+
+        self.path = path
+        self.instance = instance
+        # seconds the issue index is trusted before the project is scanned again
+        self.full_every = full_every
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def execute(self, sql, params=()):
+
+        with self.lock:
+            cursor = self.db.execute(sql, params)
+            self.db.commit()
+            return cursor
+
+    def query(self, sql, params=()):
+
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    # setup steps
+
+    def is_step_done(self, project, step):
+        return bool(self.query("SELECT 1 FROM steps WHERE instance = ? AND project = ? AND step = ?", (self.instance, project, step)))
+
+    def mark_step_done(self, project, step):
+        self.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)", (self.instance, project, step, time.time()))
+
+    # meta values
+
+    def get_meta(self, project, name):
+
+        rows = self.query("SELECT value FROM meta WHERE instance = ? AND project = ? AND name = ?", (self.instance, project, name))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, project, name, value):
+        self.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?)", (self.instance, project, name, None if value is None else str(value)))
+
+    # issue index
+
+    def is_index_synced(self, project, now=None):
+
+        # True when the journal holds every technique issue of the project, either
+        # because the journal saw the project being created or after a full scan,
+        # less than full_every seconds ago: issues created or deleted outside
+        # attack2jira are picked up by the next scan
+        synced_at = self.get_meta(project, 'index_synced')
+        return synced_at is not None and (now or time.time()) - float(synced_at) < self.full_every
+
+    def record_issue(self, project, ttp_id, issue_key, issue_id=None, maturity=None, updated=None):
+
+        # keeps the known id/maturity when the caller does not provide them
+        self.execute("""
+            INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (instance, project, ttp_id) DO UPDATE SET
+                issue_key = excluded.issue_key,
+                issue_id = COALESCE(excluded.issue_id, issues.issue_id),
+                maturity = COALESCE(excluded.maturity, issues.maturity),
+                updated = COALESCE(excluded.updated, issues.updated)
+        """, (self.instance, project, ttp_id, issue_key, issue_id, maturity, updated))
+
+    def replace_index(self, project, index):
+
+        # index: ttp_id -> {key, id, maturity} as built by JiraHandler.get_project_index()
+        with self.lock:
+            self.db.execute("DELETE FROM issues WHERE instance = ? AND project = ?", (self.instance, project))
+            self.db.executemany("INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (self.instance, project, ttp_id, entry['key'], entry.get('id'), entry.get('maturity'), entry.get('updated'))
+                for ttp_id, entry in index.items()
+            ])
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, 'index_synced', ?)", (self.instance, project, str(time.time())))
+            self.db.commit()
+
+    def mark_index_synced(self, project):
+        self.set_meta(project, 'index_synced', time.time())
+
+    def wrap_index(self, project, index):
+
+        # journals future writes to an index that was just read from Jira
+        wrapped = JournaledIndex(self, project)
+        dict.update(wrapped, index)
+        return wrapped
+
+    def get_index(self, project):
+
+        rows = self.query("SELECT ttp_id, issue_key, issue_id, maturity FROM issues WHERE instance = ? AND project = ?", (self.instance, project))
+        index = JournaledIndex(self, project)
+        for ttp_id, issue_key, issue_id, maturity in rows:
+            dict.__setitem__(index, ttp_id, {'key': issue_key, 'id': issue_id, 'maturity': maturity})
+        return index
+
+    def get_snapshot(self, project, full_every=24 * 3600):
+        return JournalSnapshot(self, project, full_every)
+
+
+class JournaledIndex(dict):
+
+    # ttp_id -> {key, id, maturity} index that writes every new entry to the
+    # journal, so issues created by any creation path are recorded as they land.
+
+    def __init__(self, journal, project):
+
+        super().__init__()
+        self.journal = journal
+        self.project = project
+
+    def __setitem__(self, ttp_id, entry):
+
+        super().__setitem__(ttp_id, entry)
+        self.journal.record_issue(self.project, ttp_id, entry['key'], entry.get('id'), entry.get('maturity'), entry.get('updated'))
+
+
+class JournalSnapshot:
+
+    # Same interface as lib.snapshot.MaturitySnapshot, backed by the journal's
+    # issues table so export, update and initialize share one store.
+
+    def __init__(self, journal, project, full_every):
+
+        self.journal = journal
+        self.project_key = project
+        self.full_every = full_every
+        last_sync = journal.get_meta(project, 'last_sync')
+        last_full = journal.get_meta(project, 'last_full')
+        self.last_sync = float(last_sync) if last_sync else None
+        self.last_full = float(last_full) if last_full else None
+
+    @property
+    def items(self):
+
+        rows = self.journal.query("SELECT ttp_id, issue_key, issue_id, maturity, updated FROM issues WHERE instance = ? AND project = ?", (self.journal.instance, self.project_key))
+        return {ttp_id: {'key': issue_key, 'id': issue_id, 'value': maturity or 'Not Tracked', 'updated': updated} for ttp_id, issue_key, issue_id, maturity, updated in rows}
+
+    def needs_full_sync(self, now=None):
+
+        now = now or time.time()
+        return self.last_sync is None or self.last_full is None or now - self.last_full >= self.full_every
+
+    def replace(self, items, started):
+
+        self.journal.replace_index(self.project_key, {
+            ttp_id: {'key': item['key'], 'id': item.get('id'), 'maturity': item['value'], 'updated': item.get('updated')}
+            for ttp_id, item in items.items()
+        })
+        self.last_sync = started
+        self.last_full = started
+
+    def merge(self, items, started):
+
+        current = self.items
+        changed = 0
+        for ttp_id, item in items.items():
+            if ttp_id not in current or current[ttp_id]['value'] != item['value']:
+                changed += 1
+            self.journal.record_issue(self.project_key, ttp_id, item['key'], item.get('id'), item['value'], item.get('updated'))
+        self.last_sync = started
+        return changed
+
+    def update(self, ttp_id, item):
+        self.journal.record_issue(self.project_key, ttp_id, item['key'], item.get('id'), item['value'], item.get('updated'))
+
+    def save(self):
+
+        self.journal.set_meta(self.project_key, 'last_sync', self.last_sync)
+        self.journal.set_meta(self.project_key, 'last_full', self.last_full)
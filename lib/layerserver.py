@@ -0,0 +1,243 @@
+import json, sys, os, time, threading, traceback, hashlib
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import logging
+from lib.webhook import get_maturity_change, verify_signature
+
+# Serves the Navigator layer of a project over HTTP from an in-memory maturity
+# map that a background thread refreshes every `interval` seconds. Responses
+# carry an ETag and Last-Modified, so clients polling the layer mostly get 304s
+# and Jira is only read by the refresh thread, never per request. Jira webhooks
+# posted to /webhook update single techniques in between refreshes.
+#
+#   GET /attack2jira.json?hideDisabled=true&domain=mobile
+#   POST /webhook (jira:issue_updated)
+#
+# Without a Jira session (the 'webhook' action) the map is read from the
+# snapshot/journal, only webhooks change it and every change rewrites `output`.
+
+
+class LayerServer:
+
+    LAYER_PATHS = ('/', '/attack2jira.json', '/layer.json')
+
+    def __init__(self, attack2jira, key, hideDisabled=False, snapshot_path=None, full_every=24, interval=300, output=None, webhook_secret=None):
+
+        self.attack2jira = attack2jira
+        self.domain_keys = attack2jira.get_domain_keys(key)
+        self.default_domain = list(self.domain_keys.keys())[0]
+        self.hideDisabled = hideDisabled
+        self.interval = interval
+        self.output = output
+        self.webhook_secret = webhook_secret
+        self.offline = attack2jira.jirahandler is None
+        # incremental refreshes; without -snapshot/-journal the snapshot stays in memory
+        self.snapshots = attack2jira.open_snapshots(list(self.domain_keys.values()), snapshot_path, full_every, in_memory=True)
+        self.lock = threading.Lock()
+        # held while the snapshots are written, by refreshes and webhooks
+        self.snapshot_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.maturity = None
+        self.last_modified = None
+        # project key -> issue key -> ttp_id, for webhooks without the Id field
+        self.issue_keys = {}
+        # (domain, hideDisabled) -> (body, etag), dropped whenever the map changes
+        self.layers = {}
+        self.routes = {('GET', path): self.handle_layer for path in self.LAYER_PATHS}
+        self.routes[('POST', '/webhook')] = self.handle_webhook
+
+    def refresh(self):
+
+        with self.snapshot_lock:
+            if self.offline:
+                items = {key: snapshot.items for key, snapshot in self.snapshots.items()}
+            else:
+                items = self.attack2jira.refresh_snapshots(self.snapshots)
+            # snapshots update their items in place, keep a copy to compare against
+            maturity = {key: dict(project_items) for key, project_items in items.items()}
+        with self.lock:
+            if maturity != self.maturity:
+                self.maturity = maturity
+                self.issue_keys = {key: {item['key']: ttp_id for ttp_id, item in project_items.items()} for key, project_items in maturity.items()}
+                self.last_modified = time.time()
+                self.layers = {}
+                logging.info("Maturity map changed, layers will be rebuilt")
+
+    def refresh_forever(self):
+
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.refresh()
+            except (Exception, SystemExit):
+                # keep serving the last good layer until Jira answers again
+                traceback.print_exc(file=sys.stdout)
+                print("[!] Error refreshing the maturity map, serving the previous one.")
+
+    def get_layer(self, domain, hideDisabled):
+
+        with self.lock:
+            cached = self.layers.get((domain, hideDisabled))
+            if cached:
+                return cached + (self.last_modified,)
+            knowledge_base = self.attack2jira.knowledge_bases[domain]
+            layer_json = self.attack2jira.build_json_layer(self.maturity[self.domain_keys[domain]], hideDisabled, knowledge_base.domain, knowledge_base.version)
+            body = json.dumps(layer_json, ensure_ascii=False, indent=4).encode('utf-8')
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self.layers[(domain, hideDisabled)] = (body, etag)
+            return body, etag, self.last_modified
+
+    def handle_layer(self, request, query):
+
+        domain = query.get('domain', [self.default_domain])[0]
+        if domain not in self.domain_keys:
+            return request.send_json(400, {'error': "unknown domain '" + domain + "'"})
+        hideDisabled = self.hideDisabled
+        if 'hideDisabled' in query:
+            hideDisabled = query['hideDisabled'][0].lower() in ('1', 'true', 'yes')
+        body, etag, modified = self.get_layer(domain, hideDisabled)
+        last_modified = formatdate(modified, usegmt=True)
+
+        if request.is_not_modified(etag, modified):
+            request.send_response(304)
+            request.send_cache_headers(etag, last_modified)
+            request.end_headers()
+            return
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.send_cache_headers(etag, last_modified)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def handle_webhook(self, request, query):
+
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        if self.webhook_secret and not verify_signature(self.webhook_secret, body, request.headers.get('X-Hub-Signature')):
+            return request.send_json(401, {'error': "invalid signature"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return request.send_json(400, {'error': "invalid JSON"})
+
+        custom_fields = None if self.offline else self.attack2jira.jirahandler.get_custom_fields()
+        change = get_maturity_change(payload, custom_fields)
+        if not change:
+            return request.send_json(200, {'changed': False})
+        issue_key, issue_id, ttp_id, value, updated = change
+        project_key = (issue_key or "").rsplit('-', 1)[0]
+
+        with self.snapshot_lock, self.lock:
+            if project_key not in self.maturity:
+                return request.send_json(200, {'changed': False, 'reason': "project not served"})
+            ttp_id = ttp_id or self.issue_keys[project_key].get(issue_key)
+            if not ttp_id:
+                logging.warning(f"Webhook for unknown issue {issue_key}, it will be picked up by the next refresh")
+                return request.send_json(200, {'changed': False, 'reason': "unknown issue"})
+            current = self.maturity[project_key].get(ttp_id)
+            if current and current['value'] == value:
+                return request.send_json(200, {'changed': False})
+
+            item = {'key': issue_key, 'id': issue_id or (current or {}).get('id'), 'value': value, 'updated': updated}
+            self.maturity[project_key][ttp_id] = item
+            self.issue_keys[project_key][issue_key] = ttp_id
+            snapshot = self.snapshots.get(project_key)
+            if snapshot:
+                snapshot.update(ttp_id, item)
+                snapshot.save()
+            self.last_modified = time.time()
+            self.layers = {}
+        print("[!] " + ttp_id + " (" + issue_key + ") is now " + value)
+        if self.output:
+            self.write_layers()
+        request.send_json(200, {'changed': True, 'technique': ttp_id, 'maturity': value})
+
+    def write_layers(self):
+
+        # same file names as the export action
+        root, ext = os.path.splitext(self.output)
+        for domain in self.domain_keys:
+            body, etag, modified = self.get_layer(domain, self.hideDisabled)
+            output = self.output if len(self.domain_keys) == 1 else root + "-" + domain + ext
+            with open(output, 'wb') as f:
+                f.write(body)
+            logging.info(f"Layer {output} rewritten")
+
+    def serve(self, host='127.0.0.1', port=8080):
+
+        # the first refresh runs in the foreground so no request sees an empty map
+        self.refresh()
+        server = ThreadingHTTPServer((host, port), self.make_handler())
+        if not self.offline and self.interval > 0:
+            refresher = threading.Thread(target=self.refresh_forever, daemon=True)
+            refresher.start()
+            print("[*] Serving the Navigator layer on http://" + host + ":" + str(server.server_port) + "/attack2jira.json (refresh every " + str(self.interval) + "s)")
+        else:
+            print("[*] Serving the Navigator layer on http://" + host + ":" + str(server.server_port) + "/attack2jira.json (updated by webhooks only)")
+        print("[*] Jira webhooks are received on http://" + host + ":" + str(server.server_port) + "/webhook")
+        try:
+            server.serve_forever()
+        finally:
+            self.stop_event.set()
+            server.server_close()
+
+    def make_handler(self):
+
+        layer_server = self
+
+        class LayerRequestHandler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                logging.debug("%s - %s" % (self.address_string(), format % args))
+
+            def send_json(self, status, data):
+
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_cache_headers(self, etag, last_modified):
+
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Cache-Control', 'no-cache')
+                # the Navigator fetches layers from the browser
+                self.send_header('Access-Control-Allow-Origin', '*')
+
+            def is_not_modified(self, etag, last_modified):
+
+                # If-None-Match takes precedence over If-Modified-Since (RFC 7232)
+                if_none_match = self.headers.get('If-None-Match')
+                if if_none_match:
+                    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == '*'
+                if_modified_since = self.headers.get('If-Modified-Since')
+                if if_modified_since:
+                    try:
+                        return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                return False
+
+            def dispatch(self, method):
+
+                url = urllib.parse.urlparse(self.path)
+                route = layer_server.routes.get((method, url.path))
+                if not route:
+                    return self.send_json(404, {'error': "not found"})
+                try:
+                    route(self, urllib.parse.parse_qs(url.query))
+                except Exception:
+                    traceback.print_exc(file=sys.stdout)
+                    self.send_json(500, {'error': "internal error"})
+
+            def do_GET(self):
+                self.dispatch('GET')
+
+            def do_POST(self):
+                self.dispatch('POST')
+
+        return LayerRequestHandler
@@ -0,0 +1,3 @@
+# Options of the Maturity custom field, lowest to highest. The maturity history
+# stores levels as indexes into this list: new levels may only be appended.
+MATURITY_LEVELS = ['Not Tracked', 'Initial', 'Defined', 'Resilient', 'Optimized']
@@ -0,0 +1,159 @@
+import json, re, math, time, threading
+from contextlib import contextmanager
+
+# Per-endpoint HTTP statistics and phase timings of one run, filled by
+# JiraTransport and Attack2Jira when -metrics is given. The summary shows
+# p50/p95 latency per endpoint template; dump() writes JSON or, for .prom/.txt
+# files, the Prometheus text format.
+
+
+def endpoint_template(path):
+
+    # /rest/api/2/issue/ATTACK-12/transitions?x=1 -> /rest/api/2/issue/{key}/transitions
+    path = path.split('?', 1)[0]
+    path = re.sub(r'customfield_\d+', '{fieldId}', path)
+    path = re.sub(r'/issue/[A-Z][A-Z0-9]*-\d+', '/issue/{key}', path)
+    path = re.sub(r'/project/(?!search)[^/]+', '/project/{key}', path)
+    return re.sub(r'(?<!/api)(?<!/globalconfig)/\d+(?=/|$)', '/{id}', path)
+
+
+def percentile(values, fraction):
+
+    # nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1))
+    return values[index]
+
+
+class RunMetrics:
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # (method, endpoint) -> {'latencies', 'statuses', 'retries', 'bytes', 'phases'}
+        self.endpoints = {}
+        # phase -> seconds, in the order the phases ran
+        self.phases = {}
+        self.current_phase = None
+
+    def record_request(self, method, path, status, seconds, retries, size):
+
+        endpoint = (method, endpoint_template(path))
+        with self.lock:
+            entry = self.endpoints.setdefault(endpoint, {'latencies': [], 'statuses': {}, 'retries': 0, 'bytes': 0, 'phases': {}})
+            entry['latencies'].append(seconds)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['retries'] += retries
+            entry['bytes'] += size
+            phase = self.current_phase or 'other'
+            entry['phases'][phase] = entry['phases'].get(phase, 0) + 1
+
+    @contextmanager
+    def phase(self, name):
+
+        # phases run one after the other; requests made meanwhile, from any
+        # thread, are attributed to the current one
+        previous = self.current_phase
+        self.current_phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+            self.current_phase = previous
+
+    def summary(self):
+
+        endpoints = []
+        with self.lock:
+            for (method, path), entry in self.endpoints.items():
+                latencies = sorted(entry['latencies'])
+                endpoints.append({
+                    'method': method,
+                    'endpoint': path,
+                    'requests': len(latencies),
+                    'statuses': {str(status): count for status, count in sorted(entry['statuses'].items())},
+                    'errors': sum(count for status, count in entry['statuses'].items() if status >= 400),
+                    'retries': entry['retries'],
+                    'bytes': entry['bytes'],
+                    'seconds': sum(latencies),
+                    'p50': percentile(latencies, 0.50),
+                    'p95': percentile(latencies, 0.95),
+                    'max': latencies[-1],
+                    'phases': dict(entry['phases']),
+                })
+            phases = dict(self.phases)
+        endpoints.sort(key=lambda e: e['seconds'], reverse=True)
+        return {
+            'elapsed': time.time() - self.started,
+            'requests': sum(e['requests'] for e in endpoints),
+            'retries': sum(e['retries'] for e in endpoints),
+            'bytes': sum(e['bytes'] for e in endpoints),
+            'phases': phases,
+            'endpoints': endpoints,
+        }
+
+    def print_summary(self):
+
+        summary = self.summary()
+        print("[*] HTTP requests by endpoint (slowest total first):")
+        print("\t" + "endpoint".ljust(62) + "reqs".rjust(6) + "err".rjust(5) + "retry".rjust(6) + "p50(ms)".rjust(9) + "p95(ms)".rjust(9) + "total(s)".rjust(9) + "KB".rjust(9))
+        for e in summary['endpoints']:
+            print("\t" + (e['method'] + " " + e['endpoint']).ljust(62) + str(e['requests']).rjust(6) + str(e['errors']).rjust(5) + str(e['retries']).rjust(6)
+                  + ("%.1f" % (e['p50'] * 1000)).rjust(9) + ("%.1f" % (e['p95'] * 1000)).rjust(9) + ("%.2f" % e['seconds']).rjust(9) + ("%.1f" % (e['bytes'] / 1024.0)).rjust(9))
+        print("[*] Time per phase:")
+        for name, seconds in summary['phases'].items():
+            print("\t" + name.ljust(20) + ("%.2f" % seconds).rjust(9) + "s")
+        print("[!] " + str(summary['requests']) + " requests, " + str(summary['retries']) + " retries, " + "%.1f" % (summary['bytes'] / 1024.0) + " KB in " + "%.1f" % summary['elapsed'] + "s")
+
+    def to_prometheus(self):
+
+        summary = self.summary()
+        lines = [
+            "# HELP attack2jira_http_requests_total Jira requests by endpoint and status.",
+            "# TYPE attack2jira_http_requests_total counter",
+        ]
+        for e in summary['endpoints']:
+            for status, count in e['statuses'].items():
+                lines.append('attack2jira_http_requests_total{method="%s",endpoint="%s",status="%s"} %d' % (e['method'], e['endpoint'], status, count))
+        lines += [
+            "# HELP attack2jira_http_request_duration_seconds Jira request latency, retries included.",
+            "# TYPE attack2jira_http_request_duration_seconds summary",
+        ]
+        for e in summary['endpoints']:
+            labels = 'method="%s",endpoint="%s"' % (e['method'], e['endpoint'])
+            lines.append('attack2jira_http_request_duration_seconds{%s,quantile="0.5"} %f' % (labels, e['p50']))
+            lines.append('attack2jira_http_request_duration_seconds{%s,quantile="0.95"} %f' % (labels, e['p95']))
+            lines.append('attack2jira_http_request_duration_seconds_sum{%s} %f' % (labels, e['seconds']))
+            lines.append('attack2jira_http_request_duration_seconds_count{%s} %d' % (labels, e['requests']))
+        lines += [
+            "# HELP attack2jira_http_retries_total Retries made by the transport.",
+            "# TYPE attack2jira_http_retries_total counter",
+        ]
+        for e in summary['endpoints']:
+            lines.append('attack2jira_http_retries_total{method="%s",endpoint="%s"} %d' % (e['method'], e['endpoint'], e['retries']))
+        lines += [
+            "# HELP attack2jira_http_response_bytes_total Response body bytes received.",
+            "# TYPE attack2jira_http_response_bytes_total counter",
+        ]
+        for e in summary['endpoints']:
+            lines.append('attack2jira_http_response_bytes_total{method="%s",endpoint="%s"} %d' % (e['method'], e['endpoint'], e['bytes']))
+        lines += [
+            "# HELP attack2jira_phase_duration_seconds Wall time of each phase of the run.",
+            "# TYPE attack2jira_phase_duration_seconds gauge",
+        ]
+        for name, seconds in summary['phases'].items():
+            lines.append('attack2jira_phase_duration_seconds{phase="%s"} %f' % (name, seconds))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=4)
+        print("[*] Metrics written to " + path)
@@ -0,0 +1,131 @@
+import json, os, time
+from lib.attackdata import Technique
+from lib.sync import compute_sync_changes
+
+# Offline plans of the Jira changes an 'initialize' (or -update) and 'sync' run
+# would make. The 'capture' action saves the project state once: custom field ids
+# and the detailed issue index of every project. 'plan' diffs that state with the
+# cached ATT&CK bundles without a single Jira request and writes the ordered
+# operations to a plan file, which 'apply' then executes.
+#
+# Payloads in a plan name custom fields ('Tactic', 'Url', ...) instead of using
+# their ids, since fields created by the plan itself have no id yet; apply maps
+# them to the ids of the instance.
+
+STATE_FORMAT = 1
+PLAN_FORMAT = 1
+# fields whose names are replaced by ids in update payloads
+PAYLOAD_CUSTOM_FIELDS = ['Tactic', 'Datasources', 'Url']
+
+
+def load_json_file(path, kind):
+
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != (STATE_FORMAT if kind == 'state' else PLAN_FORMAT):
+        raise ValueError("Unsupported " + kind + " file format in " + path)
+    return data
+
+
+def load_state(path):
+    return load_json_file(path, 'state')
+
+
+def save_state(path, url, custom_fields, projects, options=None):
+
+    # projects: key -> detailed index (see JiraHandler.get_project_index), or None
+    # for a project that does not exist yet; options: field name -> enabled
+    # option values, None when the custom fields do not exist
+    state = {
+        'format': STATE_FORMAT,
+        'url': url,
+        'captured': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'custom_fields': custom_fields,
+        'options': options,
+        'projects': projects,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+
+
+def load_plan(path):
+    return load_json_file(path, 'plan')
+
+
+def save_plan(path, plan):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=1)
+
+
+def technique_from_operation(operation):
+    return Technique(operation['ttp_id'], operation['name'], operation['description'], operation['url'],
+                     (operation['tactic'],) if operation['tactic'] else (), tuple(operation['datasources']), operation['parent'] is not None)
+
+
+def map_custom_fields(payload, custom_fields):
+
+    # {'fields': {'Tactic': ...}} -> {'fields': {'customfield_10042': ...}}
+    mapped = dict(payload)
+    if 'fields' in payload:
+        mapped['fields'] = {custom_fields.get(name, name) if name in PAYLOAD_CUSTOM_FIELDS else name: value
+                            for name, value in payload['fields'].items()}
+    return mapped
+
+
+def plan_issue_operations(key, techniques, retired, index, retire_transition=None):
+
+    # Updates of the issues ATT&CK changed, then the issues to create: parent
+    # techniques before sub-techniques, which name their parent technique and,
+    # when it already exists, its issue.
+    operations = []
+    skipped = {}
+    names = {name: name for name in PAYLOAD_CUSTOM_FIELDS}
+    for change in compute_sync_changes(techniques, retired, index, names):
+        operation = {'op': 'update_issue', 'project': key, 'issue': change['key'], 'ttp_id': change['ttp_id'],
+                     'changed': change['changed'], 'payload': change['payload']}
+        if change['retired'] and retire_transition:
+            operation['transition'] = retire_transition
+        operations.append(operation)
+
+    missing = sorted((t for t in techniques if t.ttp_id not in index), key=lambda t: (t.is_subtechnique, t.ttp_id))
+    planned = set(t.ttp_id for t in missing if not t.is_subtechnique)
+    for technique in missing:
+        operation = {'op': 'create_issue', 'project': key, 'ttp_id': technique.ttp_id, 'name': technique.name,
+                     'description': technique.description, 'url': technique.url, 'tactic': technique.tactic,
+                     'datasources': list(technique.datasources), 'parent': technique.parent_id}
+        if technique.is_subtechnique:
+            parent_issue = index.get(technique.parent_id)
+            if parent_issue:
+                operation['parent_issue'] = parent_issue['key']
+            elif technique.parent_id not in planned:
+                skipped[technique.ttp_id] = "parent " + technique.parent_id + " not found"
+                continue
+        operations.append(operation)
+    return operations, skipped
+
+
+def plan_missing_options(wanted, captured):
+
+    # wanted: field name -> option values ATT&CK needs. Returns the values not
+    # enabled in the captured state; all of them when the state has no options
+    # (fields to create, or a state captured before options were recorded).
+    missing = {}
+    for field_name, values in wanted.items():
+        known = set((captured or {}).get(field_name) or [])
+        values = [value for value in values if value not in known]
+        if values:
+            missing[field_name] = values
+    return missing
+
+
+def count_operations(operations):
+
+    counts = {}
+    for operation in operations:
+        name = operation['op']
+        if name == 'create_issue' and operation['parent']:
+            name = 'create_subtask'
+        counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,176 @@
+import threading, time, logging
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Client side rate control of the requests sent to one Jira tenant, shared by all
+# the threads of a run. Requests start unpaced with up to `max_in_flight` in
+# flight. Every throttled response (429, or 503 with Retry-After) pauses all
+# requests for its Retry-After and halves both the request rate and the number
+# of requests in flight (AIMD). Both then grow back additively while Jira keeps
+# answering. Jira Cloud's X-RateLimit-* headers slow the run down before it
+# gets throttled: NearLimit trims the rate and an empty Remaining waits for Reset.
+# https://developer.atlassian.com/cloud/jira/platform/rate-limiting/
+
+
+def parse_retry_after(value):
+
+    # Retry-After is either seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value):
+
+    # X-RateLimit-Reset is an ISO 8601 timestamp
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if reset.tzinfo is None:
+            reset = reset.replace(tzinfo=timezone.utc)
+        return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return None
+
+
+class AdaptiveRateController:
+
+    THROTTLED_STATUSES = (429, 503)
+    # responses over this many seconds give the rate to start from on the first
+    # throttle, when no rate was set yet
+    WINDOW = 5.0
+    # fastest growth of the rate per second, relative to it
+    GROWTH = 0.05
+
+    def __init__(self, max_in_flight=10, min_rate=0.5, max_rate=None, increase=1.0, decrease=0.5, default_backoff=1.0, log_every=10.0):
+
+        self.condition = threading.Condition()
+        self.max_in_flight = max_in_flight
+        self.limit = float(max_in_flight)
+        self.in_flight = 0
+        # requests per second; None until Jira first pushes back (or max_rate)
+        self.rate = max_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.default_backoff = default_backoff
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_backoff = 0.0
+        self.last_trim = 0.0
+        self.completed = deque()
+        self.backoffs = 0
+        self.log_every = log_every
+        self.logged = time.monotonic()
+
+    def acquire(self):
+
+        # blocks until a request may be sent
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                    continue
+                if self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                    continue
+                if self.rate is not None:
+                    self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens < 1.0:
+                        self.condition.wait((1.0 - self.tokens) / self.rate)
+                        continue
+                    self.tokens -= 1.0
+                self.in_flight += 1
+                return
+
+    def release(self, status=None, headers=None):
+
+        # status/headers of the response, None when the request failed
+        headers = headers or {}
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            self.completed.append(now)
+            while self.completed and self.completed[0] < now - self.WINDOW:
+                self.completed.popleft()
+
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if status == 429 or (status in self.THROTTLED_STATUSES and retry_after is not None):
+                self.back_off(now, retry_after if retry_after is not None else self.default_backoff, "HTTP " + str(status))
+            elif headers.get('X-RateLimit-Remaining') == '0' and parse_reset(headers.get('X-RateLimit-Reset')):
+                self.back_off(now, parse_reset(headers.get('X-RateLimit-Reset')), "rate limit exhausted")
+            elif status is not None and status < 400:
+                if str(headers.get('X-RateLimit-NearLimit', '')).lower() == 'true':
+                    self.slow_down(now)
+                else:
+                    self.speed_up(now)
+
+            if now - self.logged >= self.log_every:
+                self.logged = now
+                logging.info("Jira rate controller: " + self.describe())
+            self.condition.notify_all()
+
+    def back_off(self, now, delay, reason):
+
+        # Concurrent requests throttled by the same burst only count once: the
+        # rate is cut at most once per pause.
+        self.backoffs += 1
+        self.paused_until = max(self.paused_until, now + delay)
+        self.tokens = 0.0
+        self.updated = self.paused_until
+        if now - self.last_backoff < max(delay, 1.0):
+            return
+        self.last_backoff = now
+        if self.rate is None:
+            self.rate = self.measured_rate(now)
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.limit = max(1.0, self.limit * self.decrease)
+        logging.warning("Jira throttled the run (" + reason + "): pausing " + ("%.1f" % delay) + "s, " + self.describe())
+
+    def slow_down(self, now):
+
+        # close to the limit: trim the rate, at most once per second
+        if now - self.last_trim < 1.0:
+            return
+        self.last_trim = now
+        if self.rate is None:
+            self.rate = self.measured_rate(now)
+        self.rate = max(self.min_rate, self.rate * 0.9)
+        logging.info("Jira reports the run is near its rate limit: " + self.describe())
+
+    def measured_rate(self, now):
+
+        # responses per second over the last WINDOW seconds (or since the first one)
+        if len(self.completed) < 2:
+            return self.min_rate
+        return max(self.min_rate, len(self.completed) / max(now - self.completed[0], 0.1))
+
+    def speed_up(self, now):
+
+        # additive increase: `increase` req/s (or GROWTH of the rate) more per
+        # second and one more request in flight per `limit` responses. The rate
+        # does not grow past twice the measured one, when it is not what holds
+        # the run back.
+        if self.rate is not None:
+            step = max(self.increase, self.rate * self.GROWTH)
+            self.rate = min(self.rate + step / max(self.rate, 1.0), max(self.rate, 2 * self.measured_rate(now)))
+            if self.max_rate:
+                self.rate = min(self.rate, self.max_rate)
+        self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+
+    def describe(self):
+        rate = "unpaced" if self.rate is None else "%.1f req/s" % self.rate
+        return rate + ", " + str(int(self.limit)) + " in flight max, " + str(self.backoffs) + " backoffs"
@@ -0,0 +1,105 @@
+import os, re
+from lib.maturity import MATURITY_LEVELS
+
+# Detection-as-code import for the 'import' action: Sigma (or any YAML) rules
+# tagged attack.tXXXX[.XXX] are counted per technique and status, and the
+# counts become a proposed Maturity level. Rules never lower a maturity an
+# analyst set: only techniques whose proposal is higher than their current
+# level are changed. PyYAML is optional: only 'import' needs it.
+
+TAG = re.compile(r'^attack\.(t\d{4}(?:\.\d{3})?)$', re.IGNORECASE)
+RULE_EXTENSIONS = ('.yml', '.yaml')
+# rules with these statuses do not detect anything anymore
+IGNORED_STATUSES = ('deprecated', 'unsupported')
+# stable rules a technique needs for each level; any other rule gives Initial.
+# Optimized is left to analysts.
+STABLE_RULES_FOR = [('Resilient', 3), ('Defined', 1)]
+
+
+def require_yaml():
+
+    try:
+        import yaml
+        return yaml
+    except ImportError:
+        print("[!] PyYAML is required for the 'import' action: pip3 install pyyaml")
+        raise SystemExit(1)
+
+
+def find_rule_files(root):
+
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.'))
+        paths += [os.path.join(directory, name) for name in sorted(files) if name.lower().endswith(RULE_EXTENSIONS)]
+    return paths
+
+
+def read_rules(root):
+
+    # -> [(path, {'title', 'status', 'techniques'})] of the rules tagged with at
+    # least one technique; a file may hold several YAML documents
+    yaml = require_yaml()
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    rules, unreadable = [], 0
+    for path in find_rule_files(root):
+        try:
+            with open(path, encoding='utf-8') as f:
+                # most rules of a big repository have no ATT&CK tag at all
+                text = f.read()
+                if 'attack.t' not in text.lower():
+                    continue
+                documents = list(yaml.load_all(text, Loader=loader))
+        except (OSError, UnicodeDecodeError, yaml.YAMLError):
+            unreadable += 1
+            continue
+        for document in documents:
+            if not isinstance(document, dict):
+                continue
+            techniques = sorted(set(match.group(1).upper() for match in (TAG.match(str(tag).strip()) for tag in document.get('tags') or []) if match))
+            if techniques:
+                rules.append((path, {'title': document.get('title'), 'status': str(document.get('status') or 'experimental').lower(), 'techniques': techniques}))
+    if unreadable:
+        print("[!] Skipped " + str(unreadable) + " unreadable rule files")
+    return rules
+
+
+def count_rules(rules):
+
+    # ttp_id -> status -> number of rules
+    counts = {}
+    for path, rule in rules:
+        if rule['status'] in IGNORED_STATUSES:
+            continue
+        for ttp_id in rule['techniques']:
+            by_status = counts.setdefault(ttp_id, {})
+            by_status[rule['status']] = by_status.get(rule['status'], 0) + 1
+    return counts
+
+
+def propose_maturity(by_status):
+
+    stable = by_status.get('stable', 0)
+    for level, needed in STABLE_RULES_FOR:
+        if stable >= needed:
+            return level
+    return 'Initial' if sum(by_status.values()) else 'Not Tracked'
+
+
+def diff_maturity(counts, current):
+
+    # current: ttp_id -> {key, id, value} as returned by get_maturity().
+    # Returns the changes raising a maturity ({ttp_id, key, id, from, to, rules})
+    # and the tagged techniques the project has no issue for.
+    changes, missing = [], []
+    for ttp_id in sorted(counts):
+        item = current.get(ttp_id)
+        if not item:
+            missing.append(ttp_id)
+            continue
+        proposed = propose_maturity(counts[ttp_id])
+        value = item['value'] if item['value'] in MATURITY_LEVELS else 'Not Tracked'
+        if MATURITY_LEVELS.index(proposed) > MATURITY_LEVELS.index(value):
+            changes.append({'ttp_id': ttp_id, 'key': item['key'], 'id': item.get('id'), 'from': value, 'to': proposed,
+                            'rules': sum(counts[ttp_id].values())})
+    return changes, missing
@@ -0,0 +1,77 @@
+import os, json, time
+import logging
+
+
+class MaturitySnapshot:
+
+    # Local copy of a project's maturity values: ttp_id -> {key, value, updated}.
+    # Exports merge in only the issues updated since the last sync and fall back
+    # to a full scan every `full_every` seconds, which also catches deleted issues.
+    # Without a path the snapshot only lives in memory, e.g. for the layer server.
+
+    def __init__(self, path, project_key, full_every=24 * 3600):
+
+        self.path = path
+        self.project_key = project_key
+        self.full_every = full_every
+        self.last_sync = None
+        self.last_full = None
+        self.items = {}
+        self.load()
+
+    def load(self):
+
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable maturity snapshot {self.path}")
+            return
+        if data.get('project') != self.project_key:
+            logging.warning(f"Snapshot {self.path} belongs to project {data.get('project')}, ignoring it")
+            return
+        self.last_sync = data.get('last_sync')
+        self.last_full = data.get('last_full')
+        self.items = data.get('items', {})
+
+    def save(self):
+
+        if not self.path:
+            return
+        data = {
+            'project': self.project_key,
+            'last_sync': self.last_sync,
+            'last_full': self.last_full,
+            'items': self.items,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def needs_full_sync(self, now=None):
+
+        now = now or time.time()
+        return self.last_sync is None or self.last_full is None or now - self.last_full >= self.full_every
+
+    def replace(self, items, started):
+
+        self.items = dict(items)
+        self.last_sync = started
+        self.last_full = started
+
+    def merge(self, items, started):
+
+        changed = 0
+        for ttp_id, item in items.items():
+            if self.items.get(ttp_id) != item:
+                changed += 1
+            self.items[ttp_id] = item
+        self.last_sync = started
+        return changed
+
+    def update(self, ttp_id, item):
+        # single change pushed by a webhook, the sync times are left alone
+        self.items[ttp_id] = item
@@ -0,0 +1,119 @@
+import json
+
+# Incremental reader for STIX 2.x bundles such as MITRE's enterprise-attack.json.
+# Objects are decoded one at a time from a buffered text stream, so only the
+# objects a caller keeps stay in memory, never the whole bundle.
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+
+class BundleReader:
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+
+        # drops the consumed part of the buffer and appends the next chunk
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of STIX bundle")
+
+    def expect(self, char):
+
+        if self.peek() != char:
+            raise ValueError("Expected '" + char + "' at offset " + str(self.pos) + " of STIX bundle")
+        self.pos += 1
+
+    def decode(self):
+
+        # decodes the next JSON value, reading more input until it is complete
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self.fill():
+                    raise
+                continue
+            # a number at the very end of the buffer may still be incomplete
+            if end == len(self.buffer) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_objects(self):
+
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            if key == 'objects':
+                yield from self.iter_array()
+            else:
+                self.decode()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def iter_array(self):
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def iter_bundle_objects(path, chunk_size=CHUNK_SIZE):
+
+    with open(path, encoding='utf-8') as f:
+        yield from BundleReader(f, chunk_size).iter_objects()
+
+
+def is_retired(obj):
+    return obj.get('revoked', False) or obj.get('x_mitre_deprecated', False)
+
+
+def iter_attack_objects(path, include_retired=False):
+
+    # Yields the x-mitre-collection, x-mitre-tactic and attack-pattern objects of
+    # an ATT&CK bundle; revoked and deprecated techniques are skipped by default.
+    for obj in iter_bundle_objects(path):
+        obj_type = obj.get('type')
+        if obj_type == 'attack-pattern':
+            if include_retired or not is_retired(obj):
+                yield obj
+        elif obj_type in ('x-mitre-tactic', 'x-mitre-collection'):
+            yield obj
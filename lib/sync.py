@@ -0,0 +1,65 @@
+# Field-by-field comparison between the ATT&CK catalogue and a project index
+# built with JiraHandler.get_project_index(key, detailed=True). Only the fields
+# MITRE manages are compared; Maturity and anything analysts edit is left alone.
+
+RETIRED_LABELS = ('revoked', 'deprecated')
+
+
+def normalize_text(text):
+    # Jira may rewrap descriptions, so whitespace differences are not changes
+    return " ".join((text or "").split())
+
+
+def diff_technique(technique, current, custom_fields):
+
+    # Returns the names of the changed fields and the matching "fields" payload.
+    changed = []
+    fields = {}
+    if technique.name != current['summary']:
+        changed.append('name')
+        fields['summary'] = technique.name
+    if normalize_text(technique.description) != normalize_text(current['description']):
+        changed.append('description')
+        fields['description'] = technique.description
+    if technique.tactic != current['tactic']:
+        changed.append('tactic')
+        fields[custom_fields['Tactic']] = {'value': technique.tactic}
+    if sorted(technique.datasources) != current['datasources']:
+        changed.append('datasources')
+        fields[custom_fields['Datasources']] = [{'value': ds} for ds in technique.datasources]
+    if technique.url != current['url']:
+        changed.append('url')
+        fields[custom_fields['Url']] = technique.url
+    return changed, fields
+
+
+def compute_sync_changes(techniques, retired, index, custom_fields):
+
+    # Returns one entry per issue needing an update:
+    # {'ttp_id', 'key', 'changed': [...], 'payload': {...}, 'retired': status or None}
+    changes = []
+
+    for technique in techniques:
+        current = index.get(technique.ttp_id)
+        if not current:
+            continue
+        changed, fields = diff_technique(technique, current['fields'], custom_fields)
+        payload = {}
+        if fields:
+            payload['fields'] = fields
+        # a technique that came back to life loses its retired label
+        stale_labels = [label for label in RETIRED_LABELS if label in current['fields']['labels']]
+        if stale_labels:
+            changed.append('labels')
+            payload['update'] = {'labels': [{'remove': label} for label in stale_labels]}
+        if payload:
+            changes.append({'ttp_id': technique.ttp_id, 'key': current['key'], 'changed': changed, 'payload': payload, 'retired': None})
+
+    for ttp_id in sorted(retired):
+        current = index.get(ttp_id)
+        status = retired[ttp_id]
+        if not current or status in current['fields']['labels']:
+            continue
+        changes.append({'ttp_id': ttp_id, 'key': current['key'], 'changed': [status], 'payload': {'update': {'labels': [{'add': status}]}}, 'retired': status})
+
+    return changes
@@ -0,0 +1,104 @@
+import requests, time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lib.ratecontrol import AdaptiveRateController
+import logging
+
+
+class JiraRetry(Retry):
+
+    # Idempotent calls are retried on 429 and 5xx. A 429 means Jira rejected the
+    # request before doing any work, so it is also safe to retry issue POSTs on it.
+    # Without 429/503 in status_forcelist, throttled requests are left to the
+    # caller, even with a Retry-After urllib3 would otherwise honor.
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return bool(self.total) and status_code in (self.status_forcelist or ())
+        if status_code == 503 and status_code not in (self.status_forcelist or ()):
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class JiraTransport:
+
+    # Single HTTP entry point for JiraHandler: one pooled keep-alive session carrying
+    # auth and default headers, with exponential backoff that honors Retry-After.
+    # With a rate controller (the default) every request, creations, searches and
+    # updates alike, waits for its turn and throttled requests (429, and 503 for
+    # idempotent calls) are retried here, so the controller sees each attempt;
+    # urllib3 only retries the other 5xx.
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    THROTTLED_STATUSES = (429, 503)
+    # (connect, read) seconds: a stalled connection raises instead of blocking
+    # the run forever, and idempotent calls are then retried
+    DEFAULT_TIMEOUT = (10, 60)
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+    def __init__(self, url, username, apitoken, pool_size=10, retries=5, backoff_factor=0.5, metrics=None, adaptive=True, timeout=DEFAULT_TIMEOUT):
+
+        self.url = url
+        self.timeout = timeout
+        # optional lib.metrics.RunMetrics recording every request
+        self.metrics = metrics
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.controller = AdaptiveRateController(max_in_flight=pool_size) if adaptive else None
+        self.session = requests.Session()
+        self.session.auth = (username, apitoken)
+        self.session.verify = False
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+        retry = JiraRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[status for status in self.RETRY_STATUSES if not (self.controller and status in self.THROTTLED_STATUSES)],
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, path, **kwargs):
+
+        # path is relative to the Jira url, e.g. '/rest/api/3/field'
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if self.controller:
+                self.controller.acquire()
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, self.url + path, **kwargs)
+            except Exception:
+                if self.controller:
+                    self.controller.release()
+                raise
+            elapsed = time.perf_counter() - start
+            if self.controller:
+                self.controller.release(r.status_code, r.headers)
+            logging.debug(f"{method} {path} -> {r.status_code} in {elapsed:.3f}s")
+            if self.metrics:
+                # urllib3 keeps the attempts it retried on the final response
+                retries = getattr(r.raw, 'retries', None)
+                self.metrics.record_request(method, path, r.status_code, elapsed, (len(retries.history) if retries else 0) + (1 if attempt else 0), len(r.content))
+            if self.controller and attempt < self.retries and self.is_throttled(method, r):
+                # the controller already paused for Retry-After before the next
+                # attempt; a 503 without one backs off exponentially, as urllib3 would
+                if r.status_code == 503 and 'Retry-After' not in r.headers:
+                    time.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            return r
+
+    def is_throttled(self, method, r):
+        return r.status_code == 429 or (r.status_code == 503 and method.upper() in self.IDEMPOTENT_METHODS)
+
+    def close(self):
+        self.session.close()
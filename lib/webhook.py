@@ -0,0 +1,37 @@
+import hmac, hashlib
+
+# Parsing of Jira "jira:issue_updated" webhook payloads. Only changelog items of
+# the Maturity custom field matter; see samples/jira_issue_updated.json.
+
+MATURITY_FIELD = 'Maturity'
+
+
+def verify_signature(secret, body, signature):
+
+    # Jira Cloud signs webhooks registered with a secret: X-Hub-Signature: sha256=<hex>
+    if not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+
+def get_maturity_change(payload, custom_fields=None):
+
+    # Returns (issue_key, issue_id, ttp_id, value, updated) when the payload changes
+    # the Maturity field, None otherwise. ttp_id is None when the payload does not
+    # carry the Id field (or its id is unknown offline).
+    if payload.get('webhookEvent') != 'jira:issue_updated':
+        return None
+    maturity_field = (custom_fields or {}).get(MATURITY_FIELD)
+    value = None
+    for item in (payload.get('changelog') or {}).get('items', []):
+        if item.get('field') == MATURITY_FIELD or (maturity_field and item.get('fieldId') == maturity_field):
+            # clearing the field is the same as Not Tracked
+            value = item.get('toString') or 'Not Tracked'
+    if value is None:
+        return None
+
+    issue = payload.get('issue') or {}
+    fields = issue.get('fields') or {}
+    ttp_id = fields.get(custom_fields['Id']) if custom_fields and 'Id' in custom_fields else None
+    return issue.get('key'), issue.get('id'), ttp_id, value, fields.get('updated')